@@ -1,4 +1,5 @@
 import os
+import pwd
 
 from . import Feature, brew, feature, system
 
@@ -16,4 +17,12 @@ def main(env: Feature):
 def is_installed(env: Feature):
     return SHELL in env.run(
         'dscl', '.', '-read', os.getenv('HOME'), 'UserShell',
-        capture=True)
+        capture=True,
+        interactive=False)
+
+
+@main.watcher
+def watched(env: Feature):
+    # The user record is not readable, so the current login shell is watched
+    # by name instead
+    return [SHELL, pwd.getpwuid(os.getuid()).pw_shell]
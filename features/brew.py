@@ -1,7 +1,4 @@
-import os
-import stat
-
-from . import FEATURES, Feature, curl, feature, system
+from . import FEATURES, Feature, curl, feature, scheduler, system
 
 
 #: The Rust compiler.
@@ -14,8 +11,7 @@ URL = 'https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh'
 @feature('The Missing Package Manager for macOS', {curl})
 def main(env: Feature):
     with curl.get(env, URL) as script:
-        os.chmod(script, stat.S_IRWXU)
-        env.run('bash', '-c', script)
+        env.run('bash', script)
 
 
 @main.preparer
@@ -23,7 +19,19 @@ def prioritize(env: Feature):
     FEATURES.remove(env)
     FEATURES.insert(0, env)
 
+    # Packages are installed using Homebrew, so anything but its own
+    # dependencies must wait for it
+    required = scheduler.dependencies(env)
+    for feature in FEATURES:
+        if feature is not env and feature.name not in required:
+            feature.require(env)
+
 
 @main.checker
 def is_installed(env: Feature):
     return system.present(env, BIN)
+
+
+@main.downloader
+def artifacts(env: Feature):
+    return [URL]
@@ -1,7 +1,6 @@
 import os
-import shutil
 
-from . import Feature, curl, feature
+from . import Feature, curl, feature, staging
 
 
 #: The version of CFR to install.
@@ -24,8 +23,7 @@ TARGET = os.path.join(TARGET_DIR, JAR_FILE)
 @feature('A Java classfile decompiler', {curl})
 def main(env: Feature):
     with curl.get(env, SOURCE) as jar:
-        os.makedirs(TARGET_DIR, exist_ok=True)
-        shutil.copy(jar, TARGET)
+        staging.install(jar, TARGET)
 
 
 @main.checker
@@ -33,6 +31,16 @@ def is_installed(env: Feature):
     return os.path.isfile(TARGET)
 
 
+@main.watcher
+def watched(env: Feature):
+    return [TARGET]
+
+
+@main.downloader
+def artifacts(env: Feature):
+    return [SOURCE]
+
+
 @main.completer
 def complete(env: Feature):
     for jar in os.listdir(TARGET_DIR):
@@ -1,36 +1,127 @@
 import contextlib
 import os
+import sys
 import tempfile
 
-from . import Feature, system
+from typing import Dict, Optional, Tuple
 
+from . import CommandFailed, Feature, downloads, system, transfer
+
+
+#: The name of the built-in downloader, which may be selected by setting
+#: ``downloader`` in the ``commands`` section of the configuration.
+BUILTIN = 'builtin'
 
 main = system.package(__name__.rsplit('.')[-1])
 
 
 @contextlib.contextmanager
-def get(env: Feature, url: str) -> str:
-    """Fetches a resource, writes it to a temporary file and returns the path.
+def get(env: Feature, url: str, sha256: Optional[str] = None) -> str:
+    """Fetches a resource and returns the path to a cached copy.
+
+    Resources are kept in the download cache, so a resource that has not
+    changed since it was last downloaded is not downloaded again.
+
+    Resources are downloaded using ``curl``, unless it is not installed or the
+    built-in downloader is configured; see :data:`BUILTIN`. The built-in
+    downloader reuses connections, resumes interrupted downloads and reports
+    progress.
+
+    This function works as a context manager for compatibility; the cached
+    file remains once the context is exited, so it must not be modified.
+
+    :param env: The feature environment.
+
+    :param url: The source URL.
+
+    :param sha256: The expected hash of the resource, if known. If a resource
+        with this hash is cached, the server is not contacted at all.
+
+    :return: the path to a cached file
+    """
+    try:
+        path = downloads.CACHE.get(url, fetcher(env), sha256)
+    except downloads.DownloadFailed as e:
+        print('Failed to download {} for {}: {}'.format(url, env.name, e))
+        sys.exit(1)
+    yield path
 
-    This function works as a context manager: once the context is exited, the
-    temporary file is removed.
+
+def fetcher(env: Feature, report: bool = True) -> downloads.FetchCallback:
+    """Selects the function used to transfer resources.
+
+    ``curl`` is used unless it is not installed or the built-in downloader is
+    configured; see :data:`BUILTIN`.
+
+    :param env: The feature environment.
+
+    :param report: Whether the built-in downloader reports progress.
+
+    :return: a :data:`~dotfiles.features.downloads.FetchCallback`
+    """
+    if env.configuration['commands'].get('downloader') == BUILTIN \
+            or system.executable('curl') is None:
+        def fetch(url, target, headers):
+            return downloads.fetch(
+                url, target, headers,
+                transfer.reporter('Downloading {} for {}'.format(
+                    url, env.name)) if report else None)
+    else:
+        def fetch(url, target, headers):
+            return _fetch(env, url, target, headers)
+    return fetch
+
+
+def _fetch(
+        env: Feature, url: str, target: str,
+        headers: Dict[str, str]) -> Tuple[int, Dict[str, str], Optional[str]]:
+    """Transfers a resource to a file using ``curl``.
+
+    This is a :data:`~dotfiles.features.downloads.FetchCallback`.
 
     :param env: The feature environment.
 
     :param url: The source URL.
 
-    :return: the path to a temporary file
+    :param target: The target file name.
+
+    :param headers: Additional request headers.
+
+    :return: the tuple ``(status, headers, digest)``; the digest is never
+        calculated
+
+    :raises DownloadFailed: if ``curl`` fails
     """
-    target = tempfile.mktemp()
+    (fd, dump) = tempfile.mkstemp()
+    os.close(fd)
     try:
-        env.run(
-            'curl',
-            '--output', target,
-            '--location',
-            url,
-            check=True,
-            interactive=False,
-            silent=True)
-        yield target
+        try:
+            status = env.call(
+                'curl',
+                '--silent',
+                '--location',
+                '--output', target,
+                '--dump-header', dump,
+                '--write-out', '%{http_code}',
+                *(
+                    arg
+                    for (key, value) in headers.items()
+                    for arg in ('--header', '{}: {}'.format(key, value))),
+                url,
+                capture=True,
+                interactive=False)
+        except (CommandFailed, OSError) as e:
+            raise downloads.DownloadFailed(str(e))
+        with open(dump, encoding='latin-1') as f:
+            response = {}
+            for line in f:
+                # A new block starts for every response when following
+                # redirects; only the last one is relevant
+                if line.startswith('HTTP/'):
+                    response = {}
+                elif ':' in line:
+                    (key, value) = line.split(':', 1)
+                    response[key.strip().lower()] = value.strip()
+        return (int(status.strip() or 0), response, None)
     finally:
-        os.unlink(target)
+        os.unlink(dump)
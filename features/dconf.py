@@ -5,6 +5,12 @@ from typing import Sequence
 from . import Feature, system
 
 
+#: The database containing the settings of the current user.
+DATABASE = os.path.join(
+    os.environ.get('XDG_CONFIG_HOME', os.path.expanduser('~/.config')),
+    'dconf',
+    'user')
+
 main = system.package(__name__.rsplit('.')[-1])
 
 
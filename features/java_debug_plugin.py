@@ -1,7 +1,6 @@
 import os
-import shutil
 
-from . import Feature, curl, feature, jdtls
+from . import Feature, curl, feature, jdtls, staging
 
 
 #: The version to use.
@@ -12,9 +11,9 @@ VERSION = '0.49.0'
 BASE_NAME = 'com.microsoft.java.debug.plugin-{0}.jar'.format(VERSION)
 
 
-#: The URL of the i202309281329ckagenstallation script.
+#: The URL of the plugin JAR.
 URL = 'https://repo1.maven.org/maven2/com/microsoft/java/' \
-    'com.microsoft.java.debug.plugin/{0}/' + BASE_NAME
+    'com.microsoft.java.debug.plugin/{0}/{1}'.format(VERSION, BASE_NAME)
 
 #: The target path.
 TARGET = os.path.join(
@@ -25,9 +24,19 @@ TARGET = os.path.join(
 @feature('Microsoft Java Debugger', {curl, jdtls})
 def main(env: Feature):
     with curl.get(env, URL) as archive:
-        shutil.copy(archive, TARGET)
+        staging.install(archive, TARGET)
 
 
 @main.checker
 def is_installed(env: Feature):
     return os.path.exists(TARGET)
+
+
+@main.watcher
+def watched(env: Feature):
+    return [TARGET]
+
+
+@main.downloader
+def artifacts(env: Feature):
+    return [URL]
@@ -1,6 +1,6 @@
 import os
 
-from . import Feature, curl, feature
+from . import Feature, curl, feature, staging
 
 
 #: The version to use.
@@ -17,18 +17,29 @@ URL = 'https://www.eclipse.org/downloads/download.php?' \
 #: The target path.
 TARGET = os.path.expanduser('~/.local/lib/jdtls')
 
+#: The core plugin of the installed version.
+CORE = os.path.join(
+    TARGET,
+    'plugins',
+    'org.eclipse.jdt.ls.core_{}.{}.jar'.format(VERSION, DATE))
+
 
 @feature('Eclipse JDT Language Server', {curl})
 def main(env: Feature):
     with curl.get(env, URL) as archive:
-        env.run('rm', '-rf', TARGET)
-        os.makedirs(TARGET)
-        env.run('tar', '--extract', '--file', archive, '--directory', TARGET)
+        staging.extract(archive, TARGET)
 
 
 @main.checker
 def is_installed(env: Feature):
-    return os.path.exists(os.path.join(
-        TARGET,
-        'plugins',
-        'org.eclipse.jdt.ls.core_{}.{}.jar'.format(VERSION, DATE)))
+    return os.path.exists(CORE)
+
+
+@main.watcher
+def watched(env: Feature):
+    return [CORE]
+
+
+@main.downloader
+def artifacts(env: Feature):
+    return [URL]
@@ -1,8 +1,12 @@
+import json
 import re
 import shlex
+import site
 import sys
+import sysconfig
+import threading
 
-from typing import Optional
+from typing import Optional, Sequence, Set
 
 from . import Feature, feature, system
 
@@ -10,6 +14,12 @@ from . import Feature, feature, system
 #: The pip module name.
 MOD = 'pip'
 
+#: The normalised names of installed packages, or ``None`` if not yet known.
+_INVENTORY = None
+
+#: A lock held while listing installed packages.
+_INVENTORY_LOCK = threading.Lock()
+
 
 @feature('Python package installer')
 def main(env):
@@ -27,6 +37,11 @@ def is_installed(env):
         silent=True)
 
 
+@main.watcher
+def watched(env):
+    return directories()
+
+
 def package(name: str, description: Optional[str] = None) -> Feature:
     """Defines a pip feature.
 
@@ -47,6 +62,12 @@ def package(name: str, description: Optional[str] = None) -> Feature:
             env,
             name)
 
+    installer.batcher(install_packages)
+
+    @installer.watcher
+    def watched(env: Feature):
+        return directories()
+
     return installer
 
 
@@ -57,6 +78,7 @@ def install_package(env: Feature, package: str):
 
     :param package: The package name.
     """
+    global _INVENTORY
     env.run(
         sys.executable, '-m', MOD, 'install', '--user', '--upgrade',
         *shlex.split(env.configuration['commands'].get(
@@ -65,6 +87,34 @@ def install_package(env: Feature, package: str):
         '${package}',
         interactive=False,
         package=package)
+    with _INVENTORY_LOCK:
+        _INVENTORY = None
+
+
+def install_packages(features: Sequence[Feature]):
+    """Installs the packages of several pip features using a single call to
+    ``pip``.
+
+    If the installation fails, the packages are installed one by one instead.
+
+    :param features: The pip features to install.
+    """
+    global _INVENTORY
+    env = features[0]
+    installed = env.run(
+        sys.executable, '-m', MOD, 'install', '--user', '--upgrade',
+        *shlex.split(env.configuration['commands'].get(
+            'pip_install_arguments',
+            '')),
+        '${packages}',
+        check=True,
+        interactive=False,
+        packages=[feature.name for feature in features])
+    with _INVENTORY_LOCK:
+        _INVENTORY = None
+    if not installed:
+        for feature in features:
+            install_package(feature, feature.name)
 
 
 def present(env: Feature, package: str):
@@ -76,12 +126,49 @@ def present(env: Feature, package: str):
 
     :return: whether the package is installed
     """
-    regex = re.compile(
-        r'(?i)^\s*{}\s+.*$'.format(
-            re.sub(r'[-_]', '[-_]', package)))
-    return any(
-        regex.match(line)
-        for line in env.run(
-            sys.executable, '-m', MOD, 'list',
-            capture=True,
-            interactive=False).splitlines())
+    return normalize(package) in inventory(env)
+
+
+def inventory(env: Feature) -> Set[str]:
+    """Lists all installed packages.
+
+    The packages are listed once and then cached until a package is installed.
+
+    :param env: The feature environment.
+
+    :return: the normalised names of all installed packages
+    """
+    global _INVENTORY
+    with _INVENTORY_LOCK:
+        if _INVENTORY is None:
+            _INVENTORY = {
+                normalize(item['name'])
+                for item in json.loads(env.run(
+                    sys.executable, '-m', MOD, 'list', '--format=json',
+                    capture=True,
+                    interactive=False))}
+        return _INVENTORY
+
+
+def normalize(package: str) -> str:
+    """Normalises a package name.
+
+    Package names are case insensitive, and runs of ``-``, ``_`` and ``.``
+    are equivalent.
+
+    :param package: The package name.
+
+    :return: a normalised name
+    """
+    return re.sub(r'[-_.]+', '-', package).lower()
+
+
+def directories() -> Sequence[str]:
+    """Lists the directories into which packages are installed.
+
+    These are modified whenever a package is installed or removed, so they are
+    used as feature watchers.
+
+    :return: a list of paths
+    """
+    return [site.getusersitepackages(), sysconfig.get_paths()['purelib']]
@@ -1,7 +1,7 @@
 from . import FEATURES, rust, system
 
 
-if any(f.name == 'rust' for f in FEATURES if not f.blacklisted):
+if FEATURES.get('rust') and not FEATURES.get('rust').blacklisted:
     main = rust.binary('rg', 'ripgrep')
 else:
     main = system.package('ripgrep', 'rg')
@@ -1,8 +1,10 @@
-import re
+import glob
+import json
 import os
+import threading
 import types
 
-from typing import Optional, Union
+from typing import Dict, Optional, Sequence, Set, Tuple, Union
 
 from . import Feature, curl, feature, system
 
@@ -16,14 +18,38 @@ BIN_RUSTUP = 'rustup'
 #: The cargo binary.
 BIN_CARGO = 'cargo'
 
+#: The URL of the rustup installation script.
+INSTALLER = 'https://sh.rustup.rs'
+
+#: A glob matching the files listing installed components of all toolchains.
+COMPONENTS = os.path.expanduser(
+    '~/.rustup/toolchains/*/lib/rustlib/components')
+
+#: The directory containing binaries installed by cargo.
+CARGO_BIN = os.path.expanduser('~/.cargo/bin')
+
+#: The file in which cargo records installed crates.
+CRATES = os.path.expanduser('~/.cargo/.crates2.json')
+
+#: The installed components, or ``None`` if not yet known.
+_COMPONENTS = None
+
+#: The installed crates, or ``None`` if not yet known.
+_CRATES = None
+
+#: A lock held while listing installed components and crates.
+_INVENTORY_LOCK = threading.Lock()
+
 
 @feature('The Rust programming language', {curl})
 def main(env: Feature):
     if env.configuration['env']['distribution'] == 'termux':
         system.install_package(env, 'rust')
     else:
-        with curl.get(env, 'https://sh.rustup.rs') as script:
-            env.run('sh', script, '-y', '--no-modify-path')
+        with curl.get(env, INSTALLER) as script:
+            env.run(
+                'sh', script, '-y', '--no-modify-path',
+                interactive=False)
 
 
 @main.checker
@@ -31,11 +57,25 @@ def is_installed(env: Feature):
     return system.present(env, BIN_RUSTC)
 
 
+@main.watcher
+def watched(env: Feature):
+    return system.which(BIN_RUSTC)
+
+
+@main.downloader
+def artifacts(env: Feature):
+    if env.configuration['env']['distribution'] == 'termux':
+        return []
+    else:
+        return [INSTALLER]
+
+
 def binary(
     name: str,
     crate: str,
     description: str=None,
     *args: Union[str, Feature, types.ModuleType],
+    version: Optional[str]=None,
 ) -> Feature:
     """Defines a cargo installable binary.
 
@@ -46,16 +86,38 @@ def binary(
     :param description: A description.
 
     :param args: Additional dependencies.
+
+    :param version: The version of the crate to install. If this is specified,
+        a binary installed by cargo from a different version is considered
+        outdated, and the feature missing.
     """
     @feature(description, {main} | set(args), name)
     def installer(env):
-        run(
-            env,
-            BIN_CARGO, 'install', crate)
+        if version is None:
+            run(
+                env,
+                BIN_CARGO, 'install', crate,
+                interactive=False)
+        else:
+            run(
+                env,
+                BIN_CARGO, 'install', '--version', version, crate,
+                interactive=False)
+        _invalidate()
 
     @installer.checker
     def is_installed(env):
-        return system.present(env, name)
+        installed = crates().get(crate)
+        if installed is not None and name in installed[1]:
+            return version is None or installed[0] == version
+        else:
+            return system.present(env, name)
+
+    @installer.watcher
+    def watched(env):
+        return [CRATES] + system.which(name)
+
+    return installer
 
 
 def component(
@@ -75,24 +137,102 @@ def component(
     def installer(env):
         run(
             env,
-            BIN_RUSTUP, 'component', 'add', name)
+            BIN_RUSTUP, 'component', 'add', name,
+            interactive=False)
+        _invalidate()
 
-    component_re = re.compile(
-        r'^\s*{}(-[^ ]+)?\s+\(\s*installed\s*\)\s*$'.format(re.escape(name)))
+    installer.batcher(add_components)
 
     @installer.checker
     def is_installed(env):
         return any(
-            component_re.match(line)
-            for line in run(
-                env,
-                BIN_RUSTUP, 'component', 'list',
-                capture=True,
-                interactive=False).splitlines())
+            installed == name
+            # Components for a specific target have the target triple appended
+            or installed.startswith(name + '-')
+            and installed[len(name) + 1:].count('-') >= 2
+            for installed in components(env))
+
+    @installer.watcher
+    def watched(env):
+        return sorted(glob.glob(COMPONENTS))
 
     return installer
 
 
+def add_components(features: Sequence[Feature]):
+    """Adds the components of several component features using a single call
+    to ``rustup``.
+
+    If this fails, the components are added one by one instead.
+
+    :param features: The component features to add.
+    """
+    env = features[0]
+    if not run(
+            env,
+            BIN_RUSTUP, 'component', 'add', '${names}',
+            check=True,
+            interactive=False,
+            names=[feature.name for feature in features]):
+        for feature in features:
+            run(
+                feature,
+                BIN_RUSTUP, 'component', 'add', feature.name,
+                interactive=False)
+    _invalidate()
+
+
+def components(env: Feature) -> Set[str]:
+    """Lists the installed components of the default toolchain.
+
+    The components are listed once and then cached until a component or crate
+    is installed.
+
+    :param env: The feature environment.
+
+    :return: the component names, including any target triple suffix
+    """
+    global _COMPONENTS
+    with _INVENTORY_LOCK:
+        if _COMPONENTS is None:
+            _COMPONENTS = {
+                line.strip()
+                for line in run(
+                    env,
+                    BIN_RUSTUP, 'component', 'list', '--installed',
+                    capture=True,
+                    interactive=False).splitlines()
+                if line.strip()}
+        return _COMPONENTS
+
+
+def crates() -> Dict[str, Tuple[str, Set[str]]]:
+    """Lists the crates installed by cargo.
+
+    The crates are read once and then cached until a component or crate is
+    installed.
+
+    :return: a mapping from crate name to the tuple ``(version, binaries)``
+    """
+    global _CRATES
+    with _INVENTORY_LOCK:
+        if _CRATES is None:
+            try:
+                with open(CRATES, encoding='utf-8') as f:
+                    installs = json.load(f).get('installs', {})
+            except (OSError, ValueError, AttributeError):
+                installs = {}
+            _CRATES = {}
+            for (key, value) in installs.items():
+                # The key is on the form "name version (source)"
+                try:
+                    (crate, version) = key.split()[:2]
+                    _CRATES[crate] = (version, set(value.get('bins', ())))
+                except (AttributeError, ValueError):
+                    continue
+        return _CRATES
+
+
 def run(env: Feature, binary: str, *args: str, **kwargs: str):
     """Executes a rust binary.
 
@@ -121,8 +261,13 @@ def _qualify(binary: str):
 
     :return: a path
     """
-    path = os.path.join(os.path.expanduser('~/.cargo/bin'), binary)
-    if os.access(path, os.X_OK):
-        return path
-    else:
-        return binary
+    return system.executable(binary, (CARGO_BIN,)) or binary
+
+
+def _invalidate():
+    """Discards the cached installed components and crates.
+    """
+    global _COMPONENTS, _CRATES
+    with _INVENTORY_LOCK:
+        _COMPONENTS = None
+        _CRATES = None
@@ -8,6 +8,9 @@ from . import Feature, feature
 #: The name of the current user.
 USER = pwd.getpwuid(os.getuid()).pw_name
 
+#: The file whose presence enables lingering for the current user.
+LINGER = os.path.join('/var/lib/systemd/linger', USER)
+
 
 @feature('Lingering user sessions')
 def main(env: Feature):
@@ -23,3 +26,8 @@ def is_installed(env: Feature):
             'loginctl', 'show-user', USER,
             capture=True,
             interactive=False).splitlines())
+
+
+@main.watcher
+def watched(env: Feature):
+    return [LINGER]
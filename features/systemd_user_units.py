@@ -1,3 +1,4 @@
+import glob
 import os
 
 from typing import Sequence
@@ -5,6 +6,13 @@ from typing import Sequence
 from . import Feature, feature
 
 
+#: The directory containing enabled user units.
+DIRECTORY = os.path.join(
+    os.environ.get('XDG_CONFIG_HOME', os.path.expanduser('~/.config')),
+    'systemd',
+    'user')
+
+
 @feature('Systemd user units')
 def main(env: Feature):
     for unit in (
@@ -21,6 +29,14 @@ def is_enabled(env: Feature):
         for unit in units(env))
 
 
+@main.watcher
+def watched(env: Feature):
+    # Enabling a unit adds a link to a .wants directory
+    return [source(env), DIRECTORY] \
+        + [os.path.join(source(env), unit) for unit in units(env)] \
+        + sorted(glob.glob(os.path.join(DIRECTORY, '*.wants')))
+
+
 def units(env: Feature) -> Sequence[str]:
     """Lists the names of all user units.
 
@@ -28,12 +44,22 @@ def units(env: Feature) -> Sequence[str]:
 
     :return: a list of unit names, including extension
     """
-    directory = os.path.join(env.source, '.config', 'systemd', 'user')
+    directory = source(env)
     return filter(
         lambda p: os.path.isfile(os.path.join(directory, p)),
         os.listdir(directory))
 
 
+def source(env: Feature) -> str:
+    """Determines the directory containing the user units to enable.
+
+    :param env: The feature environment.
+
+    :return: a path
+    """
+    return os.path.join(env.source, '.config', 'systemd', 'user')
+
+
 def enabled(env: Feature, unit: str) -> bool:
     """Determines whether a user unit file is enabled.
 
@@ -48,6 +74,7 @@ def enabled(env: Feature, unit: str) -> bool:
     return env.run(
         'systemctl', '--user', 'is-enabled', unit,
         check=True,
+        interactive=False,
         silent=True)
 
 
@@ -51,6 +51,11 @@ def is_installed(env: Feature):
     return len(list_missing(env)) == 0
 
 
+@main.watcher
+def watched(env: Feature):
+    return [dconf.DATABASE]
+
+
 def list_missing(env: Feature) -> [dict]:
     """Lists missing key bindings.
     """
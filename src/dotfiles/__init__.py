@@ -1,15 +1,27 @@
-import difflib
 import enum
 import errno
 import os
 import shutil
 
-from typing import Union
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from typing import Optional, Union
+
+from . import compare
+from .checks import Checks
+from .manifest import Manifest, digest
+from .registry import Registry
 
 
 #: The header to show before showing the next item.
 __HEADER = None
 
+#: The ``ioctl`` request used to clone a file on Linux.
+FICLONE = 0x40049409
+
 
 class CopyMethod(enum.Enum):
     """The methods used when installing dotfiles.
@@ -20,14 +32,39 @@ class CopyMethod(enum.Enum):
     #: Copy files.
     COPY = 'copy'
 
-    def changed(self, source: str, target: str, filename: str) -> bool:
+    #: Create symlinks to entire directories where the target directory does
+    #: not contain any foreign files, and to single files elsewhere.
+    TREE = 'tree'
+
+    #: Copy files sharing their data with the source files, if supported by
+    #: the file system, otherwise copy them.
+    REFLINK = 'reflink'
+
+    #: Create hard links, if the source and target are on the same file
+    #: system, otherwise copy files.
+    HARDLINK = 'hardlink'
+
+    @property
+    def links(self) -> bool:
+        """Whether this method installs symlinks.
+        """
+        return self in (CopyMethod.LINK, CopyMethod.TREE)
+
+    def changed(
+            self, source: str, target: str, filename: str,
+            manifest: Optional[Manifest] = None) -> bool:
         """Determines whether a file has been changed.
 
         :param source: The source directory.
 
         :param target: The target directory.
 
-        :param filename: The file name, relative to the source directory.
+        :param filename: The file name, relative to the source directory. For
+            :attr:`TREE`, this may also be the name of a directory.
+
+        :param manifest: A manifest of files known to be unchanged. If this is
+            specified, it is consulted before reading any file content, and it
+            is updated when files are found to be identical.
 
         :return: whether the file has changed
         """
@@ -37,43 +74,86 @@ class CopyMethod(enum.Enum):
         if not os.path.exists(target):
             return True
 
-        elif self == CopyMethod.LINK:
+        elif self.links:
             # The target file must be a symlink pointing to the source file
             try:
                 return os.readlink(target) != source
             except OSError:
                 return True
 
-        elif self == CopyMethod.COPY:
+        elif self == CopyMethod.HARDLINK and not os.path.islink(target) \
+                and os.path.samefile(source, target):
+            # A hard link shares its content with the source file; a symlink
+            # resolves to the same file, but must be replaced
+            return False
+
+        elif self in (
+                CopyMethod.COPY, CopyMethod.REFLINK, CopyMethod.HARDLINK):
             # The target file must be a non-link with the same content as the
             # source file
             if os.stat(source).st_size != os.stat(target).st_size:
                 return True
             elif os.path.islink(target):
                 return True
+            elif manifest is not None and manifest.unchanged(source, target):
+                return False
             else:
-                with open(source, 'rb') as s:
-                    with open(target, 'rb') as t:
-                        return s.read() != t.read()
+                content_hash = compare.identical(source, target)
+                if content_hash is None:
+                    return True
+                if manifest is not None:
+                    manifest.record(source, target, content_hash)
+                return False
 
         else:
             raise ValueError(self)
 
-    def copy(self, source: str, target: str, filename: str):
+    def copy(
+            self, source: str, target: str, filename: str,
+            manifest: Optional[Manifest] = None,
+            registry: Optional[Registry] = None) -> bool:
         """Copies a single file.
 
         This function is interactive if a conflict resolution by the user is
-        required.
+        required. If the user declines to overwrite an existing file, or no
+        terminal is available to ask, the file is not copied.
 
         :param source: The source directory.
 
         :param target: The target directory.
 
-        :param filename: The file name, relative to the source directory.
+        :param filename: The file name, relative to the source directory. For
+            :attr:`TREE`, this may also be the name of a directory.
+
+        :param manifest: A manifest of files known to be unchanged. If this is
+            specified, copied files are recorded in it.
+
+        :param registry: A registry of installed files. If this is specified,
+            the installed file is added to it.
+
+        :return: whether the file was copied
         """
         source = os.path.abspath(os.path.join(source, filename))
         target = os.path.abspath(os.path.join(target, filename))
 
+        # A parent directory may have been linked as a whole; the target would
+        # then resolve to the source file itself
+        (sparent, tparent) = (os.path.dirname(source), os.path.dirname(target))
+        while tparent != os.path.dirname(tparent):
+            if os.path.islink(tparent):
+                if os.readlink(tparent) == sparent:
+                    os.unlink(tparent)
+                break
+            (sparent, tparent) = (
+                os.path.dirname(sparent), os.path.dirname(tparent))
+
+        # A directory containing only links to the source directory may be
+        # replaced by a single link
+        if self == CopyMethod.TREE and os.path.isdir(source) \
+                and not os.path.islink(target) and os.path.isdir(target) \
+                and owned(source, target):
+            shutil.rmtree(target)
+
         # Make sure the target directory exists
         try:
             os.makedirs(os.path.dirname(target))
@@ -90,33 +170,103 @@ class CopyMethod(enum.Enum):
             if r == 'yes':
                 os.unlink(target)
                 break
-            elif r == 'no':
-                return
+            elif r == 'no' or r is None:
+                return False
             elif r == 'diff':
-                with open(source, encoding='utf-8') as f:
-                    sdata = f.readlines()
-                try:
-                    with open(target, encoding='utf-8') as f:
-                        tdata = f.readlines()
-                except FileNotFoundError:
-                    # The target file may be an invalid link
-                    tdata = ''
-                for line in difflib.unified_diff(
-                        sdata, tdata, fromfile=source, tofile=target):
-                    if line[0] == '+':
-                        print('\033[0;32m{}\033[0m'.format(line.rstrip()))
-                    elif line[0] == '-':
-                        print('\033[0;31m{}\033[0m'.format(line.rstrip()))
+                for line in compare.diff(source, target):
+                    if line[:1] == '+':
+                        print('\033[0;32m{}\033[0m'.format(line))
+                    elif line[:1] == '-':
+                        print('\033[0;31m{}\033[0m'.format(line))
                     else:
-                        print(line.rstrip())
+                        print(line)
 
-        if self == CopyMethod.LINK:
+        if self.links:
             os.symlink(source, target)
         elif self == CopyMethod.COPY:
             shutil.copy2(source, target)
+            if manifest is not None:
+                manifest.record(source, target, digest(source))
+        elif self == CopyMethod.REFLINK:
+            _clone(source, target)
+            if manifest is not None:
+                manifest.record(source, target)
+        elif self == CopyMethod.HARDLINK:
+            try:
+                os.link(source, target)
+            except OSError as e:
+                if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    _clone(source, target)
+                else:
+                    raise
+            if manifest is not None:
+                manifest.record(source, target)
         else:
             raise ValueError(self)
 
+        if registry is not None:
+            registry.add(target, source, self.links)
+        return True
+
+
+def _clone(source: str, target: str):
+    """Copies a file, sharing data with the source file if possible.
+
+    The file is first cloned using ``FICLONE``; if the file system does not
+    support this, the data is copied using :func:`os.copy_file_range`, which
+    lets the file system share or copy the data without passing it through
+    user space. As a last resort, the data is copied normally.
+
+    Like :func:`shutil.copy2`, the file metadata is copied as well.
+
+    :param source: The source file.
+
+    :param target: The target file. This must not exist.
+    """
+    with open(source, 'rb') as s:
+        with open(target, 'xb') as t:
+            try:
+                if fcntl is None:
+                    raise OSError(errno.EOPNOTSUPP, 'cloning not supported')
+                fcntl.ioctl(t.fileno(), FICLONE, s.fileno())
+            except OSError:
+                try:
+                    size = os.fstat(s.fileno()).st_size
+                    while os.copy_file_range(
+                            s.fileno(), t.fileno(), max(size, 1)) > 0:
+                        pass
+                except (AttributeError, OSError):
+                    s.seek(0)
+                    t.seek(0)
+                    t.truncate()
+                    shutil.copyfileobj(s, t)
+    shutil.copystat(source, target)
+
+
+def owned(source: str, target: str) -> bool:
+    """Determines whether a target directory contains only links to
+    corresponding files in a source directory.
+
+    :param source: The absolute path of the source directory.
+
+    :param target: The absolute path of the target directory.
+
+    :return: whether all files under ``target`` are links into ``source``
+    """
+    try:
+        with os.scandir(target) as entries:
+            for entry in entries:
+                path = os.path.join(source, entry.name)
+                if entry.is_symlink():
+                    if os.readlink(entry.path) != path:
+                        return False
+                elif not entry.is_dir() or not os.path.isdir(path) \
+                        or not owned(path, entry.path):
+                    return False
+    except OSError:
+        return False
+    return True
+
 
 def query(prompt: str, *args) -> Union[str, None]:
     """Queries the user for a string.
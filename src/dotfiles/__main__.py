@@ -1,24 +1,33 @@
 import argparse
+import concurrent.futures
 import fnmatch
 import os
 import sys
 
-from typing import Generator, Sequence, Set
+from typing import Generator, Iterable, List, Optional, Sequence, Set, Tuple
 
 from . import (
+    Checks,
     CopyMethod,
+    Manifest,
+    Registry,
+    changes,
     disabled,
     header,
     ignoring,
     installing,
+    owned,
+    patterns,
     platforms,
     query,
     removing,
+    walk,
 )
-from .features import *
-from .features import FEATURES
+from .features import FEATURES, Feature, discover, load
 
+from .features import downloads, scheduler
 from .features.configuration import Configuration
+from .plan import Plan
 
 
 #: The data root.
@@ -33,197 +42,722 @@ SOURCE = os.path.join(ROOT, 'home')
 #: The target directory.
 TARGET = os.path.expanduser('~/')
 
-#: Names of directories ignored when listing files to clean.
+#: The file containing the currently installed dotfile commit.
+TRACKER_FILE = os.path.join(ROOT, '.git', 'dotfiles-commit')
+
+#: The local configuration file.
+LOCAL_CONFIGURATION_FILE = os.path.join(ROOT, 'local.conf')
+
+#: The file containing the cache of feature checks.
+CHECKS_FILE = os.path.join(ROOT, '.git', 'dotfiles-checks')
+
+#: The time, in seconds, for which a cached feature check is valid.
+CHECK_TTL = 7 * 24 * 60 * 60
+
+#: The file containing the cached feature index.
+INDEX_FILE = os.path.join(ROOT, '.git', 'dotfiles-features')
+
+#: The file containing the manifest of copied files.
+MANIFEST_FILE = os.path.join(ROOT, '.git', 'dotfiles-manifest')
+
+#: The default file containing a computed plan.
+PLAN_FILE = os.path.join(ROOT, '.git', 'dotfiles-plan')
+
+#: The file containing the registry of installed files.
+REGISTRY_FILE = os.path.join(ROOT, '.git', 'dotfiles-registry')
+
+#: Git ignore rules for directories ignored when listing files to clean.
+#:
+#: Additional rules can be added to the ``pruned`` configuration section.
 IGNORED_DIRECTORIES = (
-    '.cache/jedi',
-    '.cache/pip',
-    '.cache/vim/swap',
-    '.cargo',
-    '.rustup',
-    '.vim/plugged',
-    '**/.git',
+    '/.cache/jedi',
+    '/.cache/pip',
+    '/.cache/vim/swap',
+    '/.cargo',
+    '/.rustup',
+    '/.vim/plugged',
+    '.git',
 )
 
+#: The files not copied or removed during this run, since the user declined
+#: or no terminal was available to ask.
+_DECLINED = []
+
 
 def main(
+    command: str,
     copy_method: CopyMethod,
     no_install_features: bool,
     no_clean: bool,
+    deep_clean: bool,
+    jobs: int,
+    previous_commit: Optional[str],
+    plan_file: str,
+    recheck: bool,
 ):
     # Generate a description of the system and then load the configuration
     (distribution, version) = platforms.current()
     configuration = Configuration(
         os.path.join(ROOT, 'configuration.conf'),
-        os.path.join(ROOT, 'local.conf'),
+        LOCAL_CONFIGURATION_FILE,
         d=lambda *parts: platforms.Distribution('', *parts),
         distribution=distribution,
         python_version=platforms.Version(tuple(sys.version_info[:3])),
         v=lambda s: platforms.Version(s),
         version=version)
 
-    # Apply the configuration
-    for feature in FEATURES:
-        feature.configuration = configuration
-        feature.source = SOURCE
+    # Apply the configuration; modules whose features are not in the index
+    # may inspect other features, so they are imported only once those have
+    # been configured
+    dynamic = discover(INDEX_FILE)
+    configured = set()
+    for modules in ((), dynamic):
+        load(modules)
+        for feature in FEATURES:
+            if feature not in configured:
+                feature.configuration = configuration
+                feature.source = SOURCE
+                configured.add(feature)
 
-    # Copy files, install features and then remove files removed from the
-    # repository
     header('Running on {}...'.format(distribution))
-    ignores = set(configuration.get('ignored', []))
-    copy_files(copy_method, ignores)
+    if command == 'apply':
+        apply(plan_file, jobs)
+        _complete()
+        return
+
+    # Copy files, install features and then remove files removed from the
+    # repository; when only planning, record the operations instead
+    dry_run = command == 'plan'
+    plan = Plan(changes.head(ROOT), copy_method.value)
+    plan.fingerprint(LOCAL_CONFIGURATION_FILE)
+    ignores = patterns.Matcher(configuration.get('ignored', []))
+    pruned = set(configuration.get('pruned', []))
+    trees = patterns.Matcher(configuration.get('trees', []))
+    (updated, _) = _changes(previous_commit) or (None, None)
+    plan.files = copy_files(
+        copy_method, ignores, jobs, updated, trees, dry_run)
     if not no_install_features:
-        install_features()
+        checks = Checks(CHECKS_FILE, configuration, CHECK_TTL, recheck)
+        plan.features = install_features(dry_run, jobs, checks)
     if not no_clean:
-        clean(ignores)
+        plan.stale = clean(ignores, deep_clean, pruned, dry_run)
+
+    if dry_run:
+        for filename in plan.files:
+            plan.fingerprint(os.path.join(TARGET, filename))
+        for (link, _) in plan.stale:
+            plan.fingerprint(link)
+        plan.save(plan_file)
+        print('Plan written to {}'.format(plan_file))
+    else:
+        _complete()
+
+
+def apply(plan_file: str, jobs: int):
+    """Applies a previously computed plan.
 
+    The plan is rejected if the repository or any file touched by the plan has
+    been modified since it was computed.
 
-def install_features():
+    :param plan_file: The file containing the plan.
+
+    :param jobs: The maximum number of worker threads. If this is ``None``, a
+        default value is used.
+    """
+    try:
+        plan = Plan.load(plan_file)
+        copy_method = CopyMethod(plan.copy_method)
+    except ValueError as e:
+        print('Invalid plan: {}'.format(e))
+        sys.exit(1)
+    invalid = plan.invalid(changes.head(ROOT))
+    if invalid:
+        print('The plan is no longer valid: {}'.format(invalid))
+        sys.exit(1)
+
+    header('Copying files')
+    manifest = Manifest(MANIFEST_FILE)
+    registry = Registry(REGISTRY_FILE)
+    for filename in plan.files:
+        installing(filename)
+    _copy(copy_method, plan.files, jobs, manifest, registry)
+    manifest.save()
+    registry.save()
+    print()
+
+    if plan.features:
+        header('Installing features')
+        _install(
+            (
+                feature
+                for feature in FEATURES
+                if feature.name in plan.features),
+            jobs=jobs)
+        print()
+
+    header('Removing deprecated files')
+    for (link, reason) in plan.stale:
+        removing(reason)
+        _remove(link, registry)
+    registry.save()
+    print()
+
+
+def install_features(
+        dry_run: bool = False, jobs: Optional[int] = None,
+        checks: Optional[Checks] = None) -> Sequence[str]:
     """Installs all features.
+
+    The presence of features is checked concurrently before any feature is
+    installed, and independent features are installed concurrently. Once all
+    features have been checked, the resources downloaded by missing features
+    are prefetched in the background.
+
+    :param dry_run: Whether to only list the missing features without
+        installing them.
+
+    :param jobs: The maximum number of concurrent checks and installations. If
+        this is ``None``, a default value is used.
+
+    :param checks: A cache of previous checks. Features known to be present
+        are not checked again, and the results of new checks are recorded.
+
+    :return: the names of the missing features
     """
     header('Installing features')
 
-    for feature in (f for f in FEATURES if not f.blacklisted):
-        feature.prepare()
-
     fmt = '{{description:{}}} \033[0;90m({{name}})'.format(
         max(len(f.description) for f in FEATURES))
-    for feature in FEATURES:
+    missing = []
+
+    cached = set()
+    if checks is not None:
+        for feature in (f for f in FEATURES if not f.blacklisted):
+            if checks.present(feature.name):
+                feature.present = True
+                cached.add(feature.name)
+
+    def status(feature):
         message = fmt.format(
             name=feature.name,
             description=feature.description)
         if feature.blacklisted:
             disabled(message)
+        elif dry_run and any(
+                dependency.name in missing
+                for dependency in feature.dependencies):
+            # The checker may rely on a dependency that is not yet installed
+            installing(message)
+            missing.append(feature.name)
         elif feature.present:
             ignoring(message)
+            if checks is not None and feature.name not in cached:
+                checks.record(feature.name, feature.watched)
         else:
             installing(message)
-            feature.install()
+            missing.append(feature.name)
+            if checks is not None:
+                checks.forget(feature.name)
+            return not dry_run
+        return False
+
+    downloader = concurrent.futures.ThreadPoolExecutor(
+        downloads.CONNECTIONS)
+
+    def prepared():
+        present = _check(FEATURES, jobs)
+        _prefetch(
+            [
+                feature
+                for feature in FEATURES
+                if not feature.blacklisted and feature.name not in present],
+            downloader)
 
-    for feature in reversed([f for f in FEATURES if not f.blacklisted]):
-        feature.complete()
+    try:
+        if dry_run:
+            _check(FEATURES, jobs)
+            for feature in scheduler.order(FEATURES):
+                status(feature)
+        else:
+            _install(FEATURES, status, prepared, jobs)
+    finally:
+        downloader.shutdown(cancel_futures=True)
+        if checks is not None:
+            checks.save()
 
     print()
+    return missing
 
 
-def copy_files(copy_method: CopyMethod, ignores: Set[str]):
+def copy_files(
+        copy_method: CopyMethod, ignores: patterns.Matcher, jobs: int,
+        filenames: Optional[Set[str]] = None,
+        trees: patterns.Matcher = patterns.Matcher(),
+        dry_run: bool = False) -> Sequence[str]:
     """Copies all files.
 
+    Files are checked and copied on a pool of worker threads. Files whose
+    target already exists may require user interaction, so they are copied on
+    the calling thread, in order.
+
     :param copy_method: The metod used to copy files.
 
-    :param ignores: A set of ignored files.
+    :param ignores: A matcher for ignored files.
+
+    :param jobs: The maximum number of worker threads. If this is ``None``, a
+        default value is used.
+
+    :param filenames: The files to consider, relative to the source directory.
+        If this is ``None``, all files in the source directory are considered.
+
+    :param trees: A matcher for directories that may be linked as a whole when
+        ``copy_method`` is :attr:`~dotfiles.CopyMethod.TREE`.
+
+    :param dry_run: Whether to only list the changed files without copying
+        them.
+
+    :return: the changed files
     """
     header('Copying files')
 
-    for filename in _collect_files(SOURCE):
-        if _ignored(filename, ignores):
-            disabled(filename)
-        elif not copy_method.changed(SOURCE, TARGET, filename):
-            ignoring(filename)
+    manifest = Manifest(MANIFEST_FILE)
+    registry = Registry(REGISTRY_FILE)
+
+    def status(filename: str):
+        if ignores.match(filename):
+            return disabled
+        elif not copy_method.changed(SOURCE, TARGET, filename, manifest):
+            registry.add(
+                os.path.abspath(os.path.join(TARGET, filename)),
+                os.path.abspath(os.path.join(SOURCE, filename)),
+                copy_method.links)
+            return ignoring
+        else:
+            return installing
+
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        if copy_method == CopyMethod.TREE:
+            # Whether a directory can be linked as a whole depends on all
+            # files in it, not only the changed ones
+            (filenames, unlinked) = _collect_trees(
+                _collect_files(SOURCE, ignores), ignores, trees,
+                None if filenames is None else sorted(filenames))
+            for directory in unlinked:
+                removing('{}/ can no longer be linked'.format(directory))
+        elif filenames is None:
+            filenames = _collect_files(SOURCE, ignores)
         else:
-            installing(filename)
-            copy_method.copy(SOURCE, TARGET, filename)
+            filenames = sorted(filenames)
+        changed = []
+        for (filename, action) in zip(
+                filenames, executor.map(status, filenames)):
+            action(filename)
+            if action is installing:
+                changed.append(filename)
+
+    if not dry_run:
+        _copy(copy_method, changed, jobs, manifest, registry)
+        manifest.save()
+        registry.save()
 
     print()
+    return changed
 
 
-def clean(ignores: Set[str]):
-    """Removes stale links from the home directory.
+def clean(
+        ignores: patterns.Matcher, deep: bool = False,
+        pruned: Set[str] = set(),
+        dry_run: bool = False) -> Sequence[Tuple[str, str]]:
+    """Removes stale files from the home directory.
 
-    A stale link is a link pointing into this repository that is either invalid
-    or points to an ignored file.
+    A stale file is a link pointing into this repository, or a copy of a file in
+    it, where the source file has been removed or is ignored.
 
-    :param ignores: A set of ignored files.
+    Only files in the registry of installed files are considered. All of them
+    are checked on every run, so that a stale file the user declined to remove
+    is reported again. If the target directory has never been scanned, or
+    ``deep`` is true, the entire target directory is first scanned for links
+    into this repository, which are then registered.
+
+    :param ignores: A matcher for ignored files.
+
+    :param deep: Whether to scan the entire target directory.
+
+    :param pruned: Git ignore rules for directories not to scan, in addition to
+        :attr:`IGNORED_DIRECTORIES`.
+
+    :param dry_run: Whether to only list the stale files without removing them.
+
+    :return: the stale files, as the tuples ``(target, reason)``
     """
     header('Removing deprecated files')
 
-    for (link, target) in _dotfile_links(ROOT_PATTERN, _all_files(TARGET)):
+    registry = Registry(REGISTRY_FILE)
+    if deep or not registry.scanned:
+        matcher = patterns.Matcher(
+            rules=IGNORED_DIRECTORIES + tuple(sorted(pruned)))
+        for (link, target) in _dotfile_links(ROOT_PATTERN, TARGET, matcher):
+            registry.add(link, target, True)
+        registry.scanned = True
+
+    stale = []
+    for (link, target) in registry.items():
         rel = os.path.relpath(target, SOURCE)
-        if _ignored(rel, ignores):
-            removing('{} is ignored'.format(rel))
-        elif not os.path.isfile(target):
-            removing('{} has been removed'.format(rel))
+        if not registry.owns(link):
+            registry.forget(link)
+            continue
+        elif ignores.match(rel):
+            reason = '{} is ignored'.format(rel)
+        elif not os.path.exists(target):
+            reason = '{} has been removed'.format(rel)
         else:
             continue
-        response = query(
-            'Remove {} from computer?'.format(link),
-            'yes', 'no')
-        if response == 'yes':
-            os.unlink(link)
-        elif response is None:
-            print('  Not removing as we are not running in a terminal.')
+        removing(reason)
+        stale.append((link, reason))
+        if not dry_run:
+            _remove(link, registry)
+    if not dry_run:
+        registry.save()
 
     print()
+    return stale
 
 
-def _collect_files(source: str) -> Sequence[str]:
-    """Returns a list of all files under ``source`` that are not in
-    ``.gitignore``.
+def _install(
+        features: Iterable[Feature], status=lambda feature: True,
+        prepared=lambda: None, jobs: Optional[int] = None):
+    """Prepares, installs and completes features.
 
-    The file names are relative to ``source``.
+    All non-blacklisted features are prepared before, and completed after,
+    installing. Features are installed in dependency order, and independent
+    features are installed concurrently.
 
-    :param source: The source directory.
+    :param features: The features to install.
+
+    :param status: A callback determining whether to install a feature. This
+        is called on the calling thread once all dependencies of the feature
+        have been installed.
 
-    :return: a generator of file names
+    :param prepared: A callback invoked once all features have been prepared.
+
+    :param jobs: The maximum number of features to install concurrently. If
+        this is ``None``, a default value is used.
     """
-    return sorted(
-        os.path.relpath(os.path.join(root, filename), source)
-        for root, dirs, filenames in os.walk(source)
-        for filename in filenames)
+    for feature in (f for f in FEATURES if not f.blacklisted):
+        feature.prepare()
+    prepared()
+
+    scheduler.run(
+        list(features),
+        lambda feature: feature.install if status(feature) else None,
+        jobs)
 
+    for feature in reversed([f for f in FEATURES if not f.blacklisted]):
+        feature.complete()
 
-def _ignored(filename: str, ignores: Set[str]) -> bool:
-    """Determines whether a file is ignored for the current system.
 
-    A file is ignored if it is matched by a glob pattern in ``ignores``.
+def _check(features: Sequence[Feature], jobs: Optional[int]) -> Set[str]:
+    """Checks the presence of features concurrently.
 
-    :param filename: The file name, relative to the source directory.
+    A feature is only checked once all its dependencies are known to be
+    present, since its checker may rely on them. Checkers are run in waves,
+    starting with features without dependencies.
 
-    :param ignores: A set of globs matching ignored files.
+    A checker that fails is ignored here; its failure is raised again, without
+    running the checker, when the presence of its feature is next requested.
 
-    :return: whether the file should be ignored
+    :param features: The features to check.
+
+    :param jobs: The maximum number of concurrent checks. If this is ``None``,
+        a default value is used.
+
+    :return: the names of the features found to be present
     """
-    return any(
-        fnmatch.fnmatch(filename, ignore)
-        for ignore in ignores)
+    def check(feature: Feature) -> bool:
+        try:
+            return feature.present
+        except BaseException:
+            return False
+
+    remaining = [f for f in features if not f.blacklisted]
+    present = set()
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        while remaining:
+            ready = [
+                feature
+                for feature in remaining
+                if all(d.name in present for d in feature.dependencies)]
+            if not ready:
+                break
+            for (feature, result) in zip(ready, executor.map(check, ready)):
+                if result:
+                    present.add(feature.name)
+            remaining = [f for f in remaining if f not in ready]
+
+    return present
+
+
+def _prefetch(
+        features: Sequence[Feature],
+        executor: concurrent.futures.Executor):
+    """Starts downloading the resources needed to install features.
+
+    The resources are downloaded into the download cache, from which the
+    installers later read them. They are transferred the same way as by the
+    installers, using :func:`dotfiles.features.curl.fetcher`.
+
+    :param features: The features that are about to be installed.
+
+    :param executor: The executor on which to download.
+    """
+    from .features import curl
+    downloads.prefetch(
+        (
+            artifact
+            for feature in features
+            for artifact in feature.artifacts),
+        executor,
+        curl.fetcher(curl.main, False))
 
 
-def _all_files(directory: str) -> Generator[str, None, None]:
-    """Generates files under ``directory``.
+def _copy(
+        copy_method: CopyMethod, filenames: Sequence[str], jobs: int,
+        manifest: Manifest, registry: Registry):
+    """Copies files known to have changed.
 
-    Directories with a name in ``IGNORED_DIRECTORIES`` are ignored.
+    Files not copied since the user declined to overwrite them are recorded
+    in :attr:`_DECLINED`.
 
-    :param directory: The root directory.
+    :param copy_method: The metod used to copy files.
+
+    :param filenames: The files to copy, relative to the source directory.
+
+    :param jobs: The maximum number of worker threads. If this is ``None``, a
+        default value is used.
+
+    :param manifest: The manifest of copied files.
+
+    :param registry: The registry of installed files.
+    """
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        copies = []
+        for filename in filenames:
+            if os.path.lexists(os.path.join(TARGET, filename)):
+                if not copy_method.copy(
+                        SOURCE, TARGET, filename, manifest, registry):
+                    _DECLINED.append(filename)
+            else:
+                copies.append((filename, executor.submit(
+                    copy_method.copy, SOURCE, TARGET, filename, manifest,
+                    registry)))
+        for (filename, copy) in copies:
+            if not copy.result():
+                _DECLINED.append(filename)
+
+
+def _remove(link: str, registry: Registry):
+    """Removes a stale file after asking the user.
+
+    If the file is not removed, it is recorded in :attr:`_DECLINED`.
+
+    :param link: The absolute path of the stale file.
+
+    :param registry: The registry of installed files.
+    """
+    response = query(
+        'Remove {} from computer?'.format(link),
+        'yes', 'no')
+    if response == 'yes':
+        os.unlink(link)
+        registry.forget(link)
+        return
+    elif response is None:
+        print('  Not removing as we are not running in a terminal.')
+    _DECLINED.append(link)
+
+
+def _complete():
+    """Terminates the process with a failure status if any operation was
+    declined.
+
+    The installer script only records the installed commit after a successful
+    run, so declined operations are offered again on the next run.
+    """
+    if _DECLINED:
+        print('Not all files were updated; run again to update {}'.format(
+            ', '.join(_DECLINED)))
+        sys.exit(1)
+
+
+def _changes(previous: Optional[str]) -> Optional[Tuple[Set[str], Set[str]]]:
+    """Determines which source files have changed since a previously
+    installed commit.
+
+    :param previous: The previously installed commit, if known.
+
+    :return: the tuple ``(updated, removed)``, or ``None`` if all files must be
+        inspected
     """
-    for (root, dirs, files) in os.walk(directory):
-        dirs[:] = [
-            d
-            for d in dirs
-            if not any(
-                fnmatch.fnmatch(
-                    os.path.relpath(os.path.join(root, d), directory),
-                    i)
-                for i in IGNORED_DIRECTORIES)]
-        yield from (os.path.join(root, f) for f in files)
+    if not previous:
+        return None
+
+    # The local configuration is not tracked, so any modification since the
+    # last installation may affect all files
+    try:
+        if os.stat(LOCAL_CONFIGURATION_FILE).st_mtime \
+                > os.stat(TRACKER_FILE).st_mtime:
+            return None
+    except FileNotFoundError as e:
+        if e.filename == TRACKER_FILE:
+            return None
+
+    return changes.between(
+        ROOT, previous, os.path.relpath(SOURCE, ROOT), ('configuration.conf',))
+
+
+def _collect_files(
+        source: str, ignores: patterns.Matcher) -> Sequence[str]:
+    """Returns a list of all files under ``source``.
+
+    The file names are relative to ``source``. Directories where all files are
+    ignored are not listed; instead, the directory name with a trailing ``/``
+    is returned.
+
+    :param source: The source directory.
+
+    :param ignores: A matcher for ignored files.
+
+    :return: a sorted list of file names
+    """
+    result = []
+    for root, dirs, filenames in os.walk(source):
+        relative = os.path.relpath(root, source)
+        for d in list(dirs):
+            path = os.path.normpath(os.path.join(relative, d))
+            if ignores.prunes(path):
+                dirs.remove(d)
+                result.append(path + '/')
+        result.extend(
+            os.path.normpath(os.path.join(relative, filename))
+            for filename in filenames)
+    return sorted(result)
+
+
+def _collect_trees(
+        sources: Sequence[str], ignores: patterns.Matcher,
+        trees: patterns.Matcher,
+        filenames: Optional[Sequence[str]] = None
+) -> Tuple[Sequence[str], Sequence[str]]:
+    """Replaces files in directories that can be linked as a whole with their
+    directory.
+
+    A directory can be linked as a whole if it is matched by ``trees``, it
+    contains no ignored files, and the target directory is missing, already
+    linked or contains only links to the source directory. Only the topmost
+    such directory is returned.
+
+    Directories must be explicitly listed in ``trees``, since any file later
+    written to a linked directory by another application ends up in this
+    repository.
+
+    A directory that is linked as a whole, but can no longer be, is replaced
+    by its files when they are copied; all files in it are therefore included
+    in the result. Nothing is modified by this function.
+
+    :param sources: A sorted list of all file names, relative to the source
+        directory, as returned by :func:`_collect_files`.
+
+    :param ignores: A matcher for ignored files.
+
+    :param trees: A matcher for directories that may be linked as a whole.
+
+    :param filenames: A sorted list of the file names to consider, which must
+        be a subset of ``sources``. If this is ``None``, all of ``sources``
+        are considered.
+
+    :return: the tuple ``(names, unlinked)``, where ``names`` is a sorted list
+        of directory and file names, and ``unlinked`` a list of the
+        directories linked as a whole that can no longer be
+    """
+    # Directories containing ignored files must be handled file by file
+    blocked = set()
+    for filename in sources:
+        if filename.endswith('/') or ignores.match(filename):
+            parent = filename.rstrip('/')
+            while parent:
+                blocked.add(parent)
+                parent = os.path.dirname(parent)
+
+    unlinked = []
+
+    def linkable(directory: str) -> bool:
+        source = os.path.abspath(os.path.join(SOURCE, directory))
+        target = os.path.abspath(os.path.join(TARGET, directory))
+        eligible = directory not in blocked and trees.match(directory)
+        if os.path.islink(target):
+            linked = os.readlink(target) == source
+            if linked and not eligible:
+                unlinked.append(directory)
+            return linked and eligible
+        elif not eligible:
+            return False
+        elif any(directory.startswith(d + '/') for d in unlinked):
+            # The target is removed along with the link to its parent
+            return True
+        elif os.path.isdir(target):
+            return owned(source, target)
+        else:
+            return not os.path.lexists(target)
+
+    cache = {}
+
+    def collapse(names: Sequence[str]) -> List[str]:
+        result = []
+        for filename in names:
+            if result and filename.startswith(result[-1] + '/'):
+                continue
+            parts = filename.rstrip('/').split('/')
+            for i in range(1, len(parts)):
+                directory = '/'.join(parts[:i])
+                if directory not in cache:
+                    cache[directory] = linkable(directory)
+                if cache[directory]:
+                    result.append(directory)
+                    break
+            else:
+                result.append(filename)
+        return result
+
+    result = collapse(sources if filenames is None else filenames)
+    if unlinked and filenames is not None:
+        # Every file in a directory that is no longer linked must be copied
+        result = collapse(sorted(set(filenames) | {
+            filename
+            for filename in sources
+            if any(filename.startswith(d + '/') for d in unlinked)}))
+
+    return (result, unlinked)
 
 
 def _dotfile_links(
     target_pattern: str,
-    files: Sequence[str],
-) -> Generator[str, None, None]:
-    """Filters a sequence of files so that only those that are links to targets
-    matching ``target_pattern`` remain.
+    directory: str,
+    pruned: patterns.Matcher,
+) -> Generator[Tuple[str, str], None, None]:
+    """Generates all links under ``directory`` to targets matching
+    ``target_pattern``.
 
     :param target_pattern: The file glob to find relevant targets.
-    :param files: A sequence of file names.
+
+    :param directory: The root directory.
+
+    :param pruned: A matcher for directories not to scan.
+
+    :return: a generator of the tuples ``(link, target)``
     """
     yield from (
         (link, target)
-        for (link, target) in (
-            (f, os.readlink(f))
-            for f in (
-                f
-                for f in files
-                if os.path.islink(f)))
+        for (link, target) in walk.links(directory, pruned)
         if fnmatch.fnmatch(target, target_pattern))
 
 
@@ -231,14 +765,62 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Installs features and dotfiles')
 
+    parser.add_argument(
+        'command',
+        help='The command to run. Valid values are "install", which will '
+        'install all files and features, "plan", which will compute and save '
+        'the operations required without performing them, and "apply", which '
+        'will perform the operations of a saved plan. The default value is '
+        '"install".',
+        nargs='?',
+        choices=('install', 'plan', 'apply'),
+        default='install')
+
+    parser.add_argument(
+        '--plan-file',
+        help='The file to which to write a plan, or from which to read it.',
+        default=PLAN_FILE)
+
     parser.add_argument(
         '--copy-method',
         help='The method to use to copy files. Valid values are "link", which '
-        'will create symlinks and "copy", which will copy the files. The '
+        'will create symlinks, "tree", which will create symlinks to entire '
+        'directories where possible, "copy", which will copy the files, '
+        '"reflink", which will copy the files sharing data with the source '
+        'where supported, and "hardlink", which will create hard links. The '
         'default value is "link".',
         type=CopyMethod,
         default=CopyMethod.LINK)
 
+    parser.add_argument(
+        '--jobs',
+        help='The maximum number of files to check and copy, and features to '
+        'check and install, concurrently. The default value depends on the '
+        'number of processors.',
+        type=int,
+        default=None)
+
+    parser.add_argument(
+        '--deep-clean',
+        help='Scan the entire home directory for stale links instead of only '
+        'checking installed files. This recovers links not in the registry.',
+        action='store_true',
+        default=False)
+
+    parser.add_argument(
+        '--previous-commit',
+        help='The previously installed commit. If this is specified, only '
+        'files changed since this commit are inspected, unless the working '
+        'tree contains uncommitted changes.',
+        default=None)
+
+    parser.add_argument(
+        '--recheck',
+        help='Check the presence of all features instead of reusing the '
+        'results of previous checks.',
+        action='store_true',
+        default=False)
+
     parser.add_argument(
         '--no-install-features',
         help='Do not install features.',
@@ -256,3 +838,4 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         print()
         print('Cancelled')
+        sys.exit(1)
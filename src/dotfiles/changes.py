@@ -0,0 +1,85 @@
+"""
+Repository changes
+------------------
+
+This module contains functions to determine which files have been modified in
+the repository since a previous installation.
+
+Whenever the result cannot be trusted, for example because the working tree
+contains uncommitted changes or the previous commit is unknown, ``None`` is
+returned to signal that a full scan is required.
+"""
+import subprocess
+
+from typing import Optional, Sequence, Set, Tuple
+
+
+def between(
+        root: str, previous: str, directory: str,
+        dependencies: Sequence[str] = ()
+) -> Optional[Tuple[Set[str], Set[str]]]:
+    """Lists the files under a directory changed since a previous commit.
+
+    :param root: The root of the repository.
+
+    :param previous: The previously installed commit.
+
+    :param directory: The directory to inspect, relative to ``root``.
+
+    :param dependencies: Files, relative to ``root``, that affect how all files
+        under ``directory`` are handled. If any of these have changed, ``None``
+        is returned.
+
+    :return: the tuple ``(updated, removed)``, where ``updated`` contains files
+        added or modified and ``removed`` files deleted, relative to
+        ``directory``, or ``None`` if a full scan is required
+    """
+    paths = (directory,) + tuple(dependencies)
+    try:
+        if _git(root, 'status', '--porcelain', '--', *paths).strip():
+            return None
+        fields = _git(
+            root, 'diff', '--name-status', '--no-renames', '--relative', '-z',
+            previous, 'HEAD', '--', *paths).split('\0')[:-1]
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    prefix = directory.rstrip('/') + '/'
+    updated, removed = set(), set()
+    for (status, path) in zip(fields[0::2], fields[1::2]):
+        if not path.startswith(prefix):
+            return None
+        elif status == 'D':
+            removed.add(path[len(prefix):])
+        else:
+            updated.add(path[len(prefix):])
+
+    return (updated, removed)
+
+
+def head(root: str) -> Optional[str]:
+    """Determines the current commit.
+
+    :param root: The root of the repository.
+
+    :return: the commit ID, or ``None`` if it cannot be determined
+    """
+    try:
+        return _git(root, 'rev-parse', 'HEAD').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _git(root: str, *args: str) -> str:
+    """Runs a git command in a repository and returns its output.
+
+    :param root: The root of the repository.
+
+    :param args: The git command and its arguments.
+
+    :return: the command output
+    """
+    return subprocess.check_output(
+        ('git', '-C', root) + args,
+        stdin=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL).decode('utf-8')
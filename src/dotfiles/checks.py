@@ -0,0 +1,156 @@
+"""
+The feature check cache
+-----------------------
+
+This module contains :class:`Checks`, a persistent record of features found to
+be present.
+
+Checking whether a feature is present may require running several commands.
+Instead, the result of a previous check is reused as long as the configuration
+is unchanged, the result is not older than a time to live, and none of the
+paths watched by the feature have been touched.
+
+Only features found to be present are recorded; missing features are always
+checked again.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from typing import Any, List, Optional, Sequence
+
+from . import state
+from .features.configuration import Configuration
+from .manifest import HASH, stamp
+
+
+class Checks:
+    def __init__(
+            self, filename: str, configuration: Configuration, ttl: float,
+            recheck: bool = False):
+        """Initialises a check cache.
+
+        If ``filename`` cannot be read, the cache starts out empty.
+
+        A check cache may be used concurrently from several threads.
+
+        :param filename: The file used to persist the cache.
+
+        :param configuration: The current configuration. Entries recorded for
+            a different configuration are ignored.
+
+        :param ttl: The time, in seconds, for which an entry is valid.
+
+        :param recheck: Whether to ignore all existing entries. New entries are
+            still recorded.
+        """
+        self._filename = filename
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._fingerprint = fingerprint(configuration)
+        self._ttl = ttl
+        data = state.load(filename)
+        self._entries = (
+            data.get('features', {})
+            if data.get('configuration') == self._fingerprint
+            and not recheck else
+            {})
+
+    def present(
+            self, name: str, watched: Optional[Sequence[str]] = None) -> bool:
+        """Determines whether a feature is known to be present.
+
+        :param name: The name of the feature.
+
+        :param watched: The paths currently watched by the feature. If this is
+            not specified, the paths watched when the entry was recorded are
+            used, so that the feature module need not be imported.
+
+        :return: whether the feature is known to be present
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            return False
+        elif not 0 <= time.time() - entry['time'] < self._ttl:
+            return False
+        elif watched is None:
+            return entry['watched'] == _stamps(
+                [path for (path, _) in entry['watched']])
+        else:
+            return entry['watched'] == _stamps(watched)
+
+    def record(self, name: str, watched: Sequence[str]):
+        """Records that a feature is present.
+
+        :param name: The name of the feature.
+
+        :param watched: The paths currently watched by the feature.
+        """
+        entry = {'time': time.time(), 'watched': _stamps(watched)}
+        with self._lock:
+            self._entries[name] = entry
+            self._dirty = True
+
+    def forget(self, name: str):
+        """Removes a feature from the cache.
+
+        :param name: The name of the feature.
+        """
+        with self._lock:
+            if self._entries.pop(name, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        """Writes the cache to disk if it has been modified.
+        """
+        with self._lock:
+            if self._dirty and state.save(self._filename, {
+                    'configuration': self._fingerprint,
+                    'features': self._entries}):
+                self._dirty = False
+
+
+def fingerprint(configuration: Configuration) -> str:
+    """Generates a fingerprint for a configuration.
+
+    Only the configuration values and the distribution specific values that
+    can be represented as strings are taken into account.
+
+    :param configuration: The configuration.
+
+    :return: a hex digest
+    """
+    def serialize(o: Any) -> Any:
+        return sorted(o) if isinstance(o, (set, frozenset)) else str(o)
+
+    data = {
+        section: (
+            {
+                key: value
+                for (key, value) in values.items()
+                if not key.startswith('_') and not callable(value)}
+            if section == Configuration.ENV_SECTION else
+            values)
+        for (section, values) in configuration.items()}
+    return hashlib.new(HASH, json.dumps(
+        data, sort_keys=True, default=serialize).encode('utf-8')).hexdigest()
+
+
+def _stamps(paths: Sequence[str]) -> List[List[Any]]:
+    """Generates stamps for watched paths.
+
+    :param paths: The watched paths.
+
+    :return: a list of the lists ``[path, stamp]``, where ``stamp`` is
+        ``None`` for missing paths
+    """
+    def stat(path: str) -> Optional[List[int]]:
+        try:
+            return stamp(os.stat(path))
+        except OSError:
+            return None
+
+    return [[path, stat(path)] for path in paths]
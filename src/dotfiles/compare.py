@@ -0,0 +1,141 @@
+"""
+File comparison
+---------------
+
+This module contains functions to compare files without reading them fully into
+memory.
+
+Files are compared block by block, and comparison stops at the first differing
+block. Binary files and large files are never diffed line by line; a summary of
+their sizes and hashes is generated instead.
+"""
+import difflib
+import hashlib
+
+from typing import Generator, Optional
+
+from .manifest import HASH
+
+
+#: The size of the blocks read when comparing files.
+BLOCK_SIZE = 1 << 16
+
+#: The number of bytes inspected when determining whether a file is binary.
+SNIFF_SIZE = 1 << 13
+
+#: The maximum size of files for which to generate a textual diff.
+MAX_DIFF_SIZE = 1 << 20
+
+
+def identical(source: str, target: str) -> Optional[str]:
+    """Compares the content of two files.
+
+    The files are read in blocks of :attr:`BLOCK_SIZE` bytes, and reading stops
+    as soon as a block differs.
+
+    :param source: The first file.
+
+    :param target: The second file.
+
+    :return: the content hash of the files if they are identical, otherwise
+        ``None``
+    """
+    h = hashlib.new(HASH)
+    with open(source, 'rb') as s:
+        with open(target, 'rb') as t:
+            while True:
+                sblock = s.read(BLOCK_SIZE)
+                if sblock != t.read(BLOCK_SIZE):
+                    return None
+                elif not sblock:
+                    return h.hexdigest()
+                h.update(sblock)
+
+
+def is_binary(filename: str) -> bool:
+    """Determines whether a file is binary.
+
+    A file is considered binary if its first :attr:`SNIFF_SIZE` bytes contain
+    a ``NUL`` character or are not valid UTF-8.
+
+    :param filename: The file to inspect.
+
+    :return: whether the file is binary
+    """
+    with open(filename, 'rb') as f:
+        data = f.read(SNIFF_SIZE)
+    if b'\0' in data:
+        return True
+    try:
+        data.decode('utf-8')
+        return False
+    except UnicodeDecodeError as e:
+        # A multi-byte character may have been cut at the end of the sample
+        return e.start < len(data) - 3
+
+
+def summary(filename: str) -> str:
+    """Generates a one line summary of a file.
+
+    :param filename: The file to summarise.
+
+    :return: a string containing the size and hash of the file
+    """
+    h = hashlib.new(HASH)
+    size = 0
+    try:
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                h.update(block)
+                size += len(block)
+    except FileNotFoundError:
+        # The file may be an invalid link
+        return '{}: missing'.format(filename)
+    return '{}: {} bytes, {} {}'.format(filename, size, HASH, h.hexdigest())
+
+
+def diff(source: str, target: str) -> Generator[str, None, None]:
+    """Generates a description of the differences between two files.
+
+    For text files smaller than :attr:`MAX_DIFF_SIZE`, this is a unified diff.
+    For other files, only a summary of each file is generated.
+
+    :param source: The source file.
+
+    :param target: The target file.
+
+    :return: a generator of lines, without line endings
+    """
+    if _diffable(source) and _diffable(target):
+        with open(source, encoding='utf-8', errors='replace') as f:
+            sdata = f.readlines()
+        try:
+            with open(target, encoding='utf-8', errors='replace') as f:
+                tdata = f.readlines()
+        except FileNotFoundError:
+            # The target file may be an invalid link
+            tdata = []
+        yield from (
+            line.rstrip()
+            for line in difflib.unified_diff(
+                sdata, tdata, fromfile=source, tofile=target))
+    else:
+        yield '--- {}'.format(summary(source))
+        yield '+++ {}'.format(summary(target))
+
+
+def _diffable(filename: str) -> bool:
+    """Determines whether a textual diff can be generated for a file.
+
+    :param filename: The file to inspect.
+
+    :return: whether the file is a small text file or does not exist
+    """
+    try:
+        with open(filename, 'rb') as f:
+            f.seek(0, 2)
+            if f.tell() > MAX_DIFF_SIZE:
+                return False
+        return not is_binary(filename)
+    except FileNotFoundError:
+        return True
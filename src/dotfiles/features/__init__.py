@@ -5,15 +5,24 @@ Features
 Features are components that are added to the system, but are not simple files.
 This includes applications and services. Some may need administrative
 privileges to apply.
+
+Feature modules are not imported up front. Instead, :func:`discover` registers
+a :class:`Placeholder` for every feature listed in the feature index, and the
+module defining a feature is imported only once the feature is needed.
 """
+import asyncio
+import contextlib
+import importlib
 import os
 import re
 import shlex
 import subprocess
 import sys
+import threading
 import types
 
-from typing import Callable, Optional, Set, Union
+from typing import (
+    Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union)
 
 from .configuration import Configuration
 
@@ -40,12 +49,125 @@ MODULE_RE = re.compile(r'[a-zA-Z][a-zA-Z0-9_]*?\.py')
 #: The regex used to extract interpolation tokens.
 TOKEN_RE = re.compile(r'\${([^}]+)}')
 
+
+class FeatureList(list):
+    """The list of registered features.
+
+    In addition to the list, a mapping of features by name is maintained, and a
+    generation counter that is incremented whenever the features or their
+    configuration change. Features use the counter to know when values they
+    derive from other features must be recalculated.
+
+    Only :meth:`append`, :meth:`insert` and :meth:`remove` may be used to
+    modify the list.
+    """
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.RLock()
+        self._index = {}
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """The current generation of the list.
+        """
+        return self._generation
+
+    def invalidate(self):
+        """Invalidates all values derived from registered features.
+        """
+        self._generation += 1
+
+    def append(self, feature: 'Feature'):
+        """Registers a feature.
+
+        If a placeholder for the feature is registered, the feature replaces it
+        in place, and the placeholder is bound to the feature.
+        """
+        with self._lock:
+            existing = self._index.get(feature.name, feature)
+            if isinstance(existing, Placeholder) and existing is not feature:
+                super().__setitem__(self.index(existing), feature)
+                existing.bind(feature)
+            elif existing is not feature:
+                raise RuntimeError('Feature "{}" added twice'.format(
+                    feature.name))
+            else:
+                super().append(feature)
+            self._index[feature.name] = feature
+            self.invalidate()
+
+    def insert(self, index: int, feature: 'Feature'):
+        with self._lock:
+            if self._index.get(feature.name, feature) is not feature:
+                raise RuntimeError('Feature "{}" added twice'.format(
+                    feature.name))
+            super().insert(index, feature)
+            self._index[feature.name] = feature
+            self.invalidate()
+
+    def remove(self, feature: 'Feature'):
+        with self._lock:
+            super().remove(feature)
+            del self._index[feature.name]
+            self.invalidate()
+
+    def get(self, name: str) -> Optional['Feature']:
+        """Looks up a feature by name.
+
+        :param name: The name of the feature.
+
+        :return: the feature, or ``None`` if it is not registered
+        """
+        return self._index.get(name)
+
+    def resolve(
+            self, feature: 'Feature', names: Iterable[str]) -> List['Feature']:
+        """Looks up the dependencies of a feature.
+
+        :param feature: The feature whose dependencies to look up.
+
+        :param names: The names of the dependencies.
+
+        :return: a list of features
+
+        :raises RuntimeError: if any dependency is not registered
+        """
+        try:
+            return [self._index[name] for name in names]
+        except KeyError:
+            raise RuntimeError(
+                    'Feature {} has unmet dependencies: {} '
+                    '(available features: {})'.format(
+                    str(feature),
+                    ', '.join(n for n in names if n not in self._index),
+                    ', '.join(f.name for f in self)))
+
+
 #: The registered features.
-FEATURES = []
+FEATURES = FeatureList()
+
+#: A lock held while running commands that need the terminal.
+TERMINAL = threading.RLock()
+
+#: A lock held while importing feature modules.
+_IMPORT_LOCK = threading.RLock()
 
 #: A function to determine whether a feature is already present.
 PresentCallback = Callable[['self'], None]
 
+#: A function listing paths that are modified when the feature is installed or
+#: removed.
+WatchCallback = Callable[['self'], Iterable[str]]
+
+#: A function listing the resources downloaded when the feature is installed,
+#: either as URLs or as the tuples ``(url, sha256)``.
+DownloadCallback = Callable[
+    ['self'], Iterable[Union[str, Tuple[str, Optional[str]]]]]
+
+#: A function to install several features sharing it at once.
+BatchCallback = Callable[[Sequence['Feature']], None]
+
 #: A function to prepare the feature for being installed.
 PrepareCallback = Callable[['self'], None]
 
@@ -56,12 +178,29 @@ InstallCallback = Callable[['self'], None]
 CompleteCallback = Callable[['self'], None]
 
 
+class CommandFailed(RuntimeError):
+    """Raised when a command run by a feature fails.
+    """
+    def __init__(
+            self, feature: 'Feature', args: Sequence[str], timeout: bool):
+        super().__init__('Command {} for {} {}'.format(
+            ' '.join(args),
+            feature.name,
+            'timed out' if timeout else 'failed'))
+        self.feature = feature
+        self.command = list(args)
+        self.timeout = timeout
+
+
 class Feature:
     def __init__(
             self, installer: InstallCallback, name: str, description: str,
             dependencies: Set[str]):
         self._installer = types.MethodType(installer, self)
         self._checker = types.MethodType(lambda *_: False, self)
+        self._watcher = types.MethodType(lambda *_: (), self)
+        self._downloader = types.MethodType(lambda *_: (), self)
+        self._batcher = None
         self._preparer = types.MethodType(lambda *_: None, self)
         self._completer = types.MethodType(lambda *_: None, self)
 
@@ -71,13 +210,14 @@ class Feature:
 
         self._configuration = Configuration()
         self._present = None
+        self._failure = None
 
-        if any(feature.name == name for feature in FEATURES):
-            raise RuntimeError('Feature "{}" added twice'.format(
-                name,
-                str(self)))
-        else:
-            FEATURES.append(self)
+        # Values derived from other features, with the list generation for
+        # which they were calculated
+        self._resolved = (None, None)
+        self._blacklisted = (None, None)
+
+        FEATURES.append(self)
 
     def __str__(self):
         return '{} - {}'.format(self.name, self.description)
@@ -85,10 +225,45 @@ class Feature:
     def checker(self, checker: PresentCallback) -> PresentCallback:
         """A decorator to mark a callable as the availability checker for this
         feature.
+
+        Checkers of different features run concurrently. Commands run by a
+        checker should pass ``interactive=False`` to :meth:`run`, since
+        interactive commands hold the terminal and therefore run one at a
+        time.
         """
         self._checker = types.MethodType(checker, self)
         return checker
 
+    def watcher(self, watcher: WatchCallback) -> WatchCallback:
+        """A decorator to mark a callable as the watcher for this feature.
+
+        The watcher lists paths that are modified when this feature is
+        installed or removed. A cached result of the availability checker is
+        only used as long as none of these paths have been touched.
+        """
+        self._watcher = types.MethodType(watcher, self)
+        return watcher
+
+    def downloader(self, downloader: DownloadCallback) -> DownloadCallback:
+        """A decorator to mark a callable as the downloader for this feature.
+
+        The downloader lists the resources that the installer downloads, so
+        that they can be prefetched while other features are installed.
+        """
+        self._downloader = types.MethodType(downloader, self)
+        return downloader
+
+    def batcher(self, batcher: BatchCallback) -> BatchCallback:
+        """A decorator to mark a callable as the batch installer for this
+        feature.
+
+        Features sharing a batch installer that are ready to be installed at
+        the same time are installed by a single call to it; see
+        :func:`install_batch`.
+        """
+        self._batcher = batcher
+        return batcher
+
     def preparer(self, preparer: PrepareCallback) -> PrepareCallback:
         """A decorator to mark a callable as the preparer callback for this
         feature.
@@ -121,28 +296,32 @@ class Feature:
             self.name)
 
     @property
-    def dependencies(self):
+    def batch(self) -> Optional[BatchCallback]:
+        """The batch installer of this feature, if any.
+        """
+        return self._batcher
+
+    @property
+    def dependencies(self) -> List['Feature']:
         """The dependencies of this feature.
+
+        The dependencies are resolved once per list generation.
         """
-        try:
-            return [
-                next(
-                    f
-                    for f in FEATURES
-                    if f.name == dependency)
-                for dependency in self._dependencies]
-        except StopIteration:
-            raise RuntimeError(
-                    'Feature {} has unmet dependencies: {} '
-                    '(available features: {})'.format(
-                    str(self),
-                    ', '.join(
-                        n
-                        for n in self._dependencies
-                        if not any(
-                            f.name == n
-                            for f in FEATURES)),
-                    ', '.join(f.name for f in FEATURES)))
+        (generation, dependencies) = self._resolved
+        if generation != FEATURES.generation:
+            dependencies = FEATURES.resolve(self, sorted(self._dependencies))
+            self._resolved = (FEATURES.generation, dependencies)
+        return dependencies
+
+    def require(self, dependency: Union[str, 'Feature']):
+        """Adds a dependency to this feature.
+
+        :param dependency: The feature, or the name of the feature, on which
+            this feature depends.
+        """
+        self._dependencies = self._dependencies | {
+            dependency.name if isinstance(dependency, Feature) else dependency}
+        FEATURES.invalidate()
 
     @property
     def configuration(self) -> Configuration:
@@ -154,6 +333,7 @@ class Feature:
     def configuration(self, value: Configuration):
         self.configuration.clear()
         self.configuration.update(value.items())
+        FEATURES.invalidate()
 
     @property
     def present(self) -> bool:
@@ -161,26 +341,75 @@ class Feature:
 
         Once this method is called, the value is only updated after
         :meth:`install` has been called.
+
+        If the checker fails, the same error is raised again on every access
+        without running the checker again, so that a failure is only reported
+        once.
+
+        The value may be set when it is known from a previous check, or reset
+        to ``None`` to check again.
         """
         if self._present is None:
-            self._present = self._checker()
+            if self._failure is not None:
+                raise self._failure
+            try:
+                self._present = self._checker()
+            except (Exception, SystemExit) as e:
+                self._failure = e
+                raise
         return self._present
 
+    @present.setter
+    def present(self, value: Optional[bool]):
+        self._present = value
+        self._failure = None
+
+    @property
+    def watched(self) -> Sequence[str]:
+        """The paths modified when this feature is installed or removed.
+
+        The source file of the availability checker is always included, so
+        that modifying the feature invalidates previous checks.
+        """
+        return [self._checker.__func__.__code__.co_filename] \
+            + list(self._watcher())
+
+    @property
+    def artifacts(self) -> List[Tuple[str, Optional[str]]]:
+        """The resources downloaded when this feature is installed, as the
+        tuples ``(url, sha256)``, where ``sha256`` is the expected hash, or
+        ``None`` if unknown.
+        """
+        return [
+            (artifact, None) if isinstance(artifact, str) else tuple(artifact)
+            for artifact in self._downloader()]
+
     @property
     def blacklisted(self) -> bool:
         """Whether this feature is blacklisted for the current distribution.
+
+        The value is calculated once per list generation.
         """
-        return self.name in self.configuration.get('blacklist', set()) or any(
-            dependency.blacklisted
-            for dependency in self.dependencies)
+        (generation, blacklisted) = self._blacklisted
+        if generation != FEATURES.generation:
+            blacklisted = self.name in self.configuration.get(
+                'blacklist', set()) or any(
+                    dependency.blacklisted
+                    for dependency in self.dependencies)
+            self._blacklisted = (FEATURES.generation, blacklisted)
+        return blacklisted
 
     def install(self):
         """Installs this feature.
 
         This method does not check whether this feature is already installed.
+        Since it may have installed executables, the executable indexes of
+        :mod:`dotfiles.features.system` are marked as possibly outdated.
         """
+        from . import system
         self._installer()
-        self._present = None
+        self.present = None
+        system.invalidate()
 
     def prepare(self):
         """Prepares this feature for being installed.
@@ -201,13 +430,58 @@ class Feature:
     def run(
             self, *args, check=False, capture=False, interactive=True,
             silent=False, **kwargs) -> Union[bool, str]:
-        """Runs a command.
+        """Runs a command, terminating the process if it fails.
+
+        This is a synchronous wrapper around :meth:`run_async`, accepting the
+        same arguments. It must not be called from a running event loop.
+
+        Unless ``check`` is ``True``, a failure is printed and the process
+        exits by calling :func:`sys.exit`; callers that need to handle the
+        failure must use :meth:`call` instead.
+
+        :returns: whether the command succeeded if ``capture`` is ``False``,
+            otherwise the command output
+        """
+        try:
+            return self.call(
+                *args,
+                check=check,
+                capture=capture,
+                interactive=interactive,
+                silent=silent,
+                **kwargs)
+        except CommandFailed as e:
+            # We failed; terminate the process
+            print(e)
+            sys.exit(1)
+
+    def call(self, *args, **kwargs) -> Union[bool, str]:
+        """Runs a command, raising an exception if it fails.
+
+        This is a synchronous wrapper around :meth:`run_async`, accepting the
+        same arguments. It must not be called from a running event loop.
+
+        :returns: whether the command succeeded if ``capture`` is ``False``,
+            otherwise the command output
+
+        :raises CommandFailed: if the command fails and ``check`` is not true
+        """
+        return asyncio.run(self.run_async(*args, **kwargs))
+
+    async def run_async(
+            self, *args, check=False, capture=False, interactive=True,
+            silent=False, output: Optional[Callable[[str], None]] = None,
+            timeout: Optional[float] = None,
+            **kwargs) -> Union[bool, str]:
+        """Runs a command asynchronously.
+
+        Interactive commands, and commands run with ``sudo``, may prompt the
+        user, so only one such command runs at a time.
 
-        Unless ``check`` is ``True``, this method will call :func:`sys.exit` if
-        the command fails.
+        If the task running this coroutine is cancelled, the command is killed.
 
         :param check: Whether to capture errors and return ``False`` instead of
-            aborting the process.
+            raising :class:`CommandFailed`.
 
         :param capture: Whether to capture output. If this is true, this
             function will return the output data.
@@ -218,13 +492,24 @@ class Feature:
 
         :param silent: Whether to suppress all output.
 
+        :param output: A callback invoked with every line of output, without
+            the line terminator, as soon as it is written. The output is not
+            displayed.
+
+        :param timeout: The maximum time, in seconds, to let the command run.
+            A command that times out is killed and considered failed.
+
         :param args: The command and arguments as a sequence of strings.
 
         :param kwargs: Any token values used as replacements for strings on the
-            form ``'${token_name}'``.
+            form ``'${token_name}'``. A value may be a list of strings, in
+            which case an argument consisting only of the token is replaced by
+            one argument per item.
 
         :returns: whether the command succeeded if ``capture`` is ``False``,
             otherwise the command output
+
+        :raises CommandFailed: if the command fails and ``check`` is not true
         """
         assert not (check and capture)
         assert not (capture and silent)
@@ -236,35 +521,229 @@ class Feature:
             if not interactive else
             None)
 
-        # Allow reading stdout if capturing, hide if silent, otherwise just
-        # display it
+        # Allow reading stdout if capturing or streaming, hide if silent,
+        # otherwise just display it; errors are only displayed in the latter
+        # case
         outs = (
             subprocess.PIPE
-            if capture else
+            if capture or output is not None else
             subprocess.DEVNULL
             if silent else
             None)
+        errs = (
+            subprocess.DEVNULL
+            if capture or silent else
+            None)
 
-        # Perform string interpolation on kwargs for all command arguments
+        # Perform string interpolation on kwargs for all command arguments; an
+        # argument consisting only of a token for a list is replaced by the
+        # items
         args = [
-            TOKEN_RE.sub(
-                lambda m: (
-                    shlex.quote(kwargs[m.group(1)])
-                    if m.group(1) in kwargs else
-                    m.group(0)),
-                arg)
-            for arg in args]
-
-        p = subprocess.Popen(args, stdin=ins, stdout=outs, stderr=outs)
-        stdout, _ = p.communicate()
-        if p.returncode == 0:
-            return stdout.decode('utf-8') if capture else True
+            value
+            for arg in args
+            for value in _interpolate(arg, kwargs)]
+
+        async with _terminal(interactive or args[0] == 'sudo'):
+            p = await asyncio.create_subprocess_exec(
+                *args, stdin=ins, stdout=outs, stderr=errs)
+            try:
+                stdout = await asyncio.wait_for(
+                    _communicate(p, output), timeout)
+            except asyncio.TimeoutError:
+                await _kill(p)
+                stdout = None
+            except BaseException:
+                await asyncio.shield(_kill(p))
+                raise
+
+        if p.returncode == 0 and stdout is not None:
+            return stdout if capture else True
         elif check:
             return False
+        else:
+            raise CommandFailed(self, args, stdout is None)
+
+
+class Placeholder(Feature):
+    """A feature whose module has not yet been imported.
+
+    The name, description and dependencies of a placeholder are read from the
+    feature index, so features can be listed, ordered and found to be
+    blacklisted without importing their modules. Once anything else is
+    required, the module is imported; the feature it defines then replaces the
+    placeholder in :attr:`FEATURES`, and the placeholder delegates to it.
+    """
+    def __init__(
+            self, module: str, name: str, description: Optional[str],
+            dependencies: Iterable[str], hooks: Iterable[str] = ()):
+        """Registers a placeholder.
 
-        # We failed; terminate the process
-        print('Command {} for {} failed'.format(' '.join(args), self.name))
-        sys.exit(1)
+        :param module: The name of the module defining the feature.
+
+        :param name: The name of the feature.
+
+        :param description: The description of the feature.
+
+        :param dependencies: The names of the features on which the feature
+            depends.
+
+        :param hooks: The callbacks other than the installer and checker
+            registered by the feature that must run even when the feature is
+            not installed, as the names of the decorators used; see
+            :data:`dotfiles.features.index.HOOKS`.
+        """
+        self._module = module
+        self._hooks = set(hooks)
+        self._target = None
+        super().__init__(
+            lambda *_: None, name, description, set(dependencies))
+
+    @property
+    def target(self) -> Feature:
+        """The feature for which this is a placeholder.
+
+        Reading this property imports the module defining the feature.
+
+        :raises RuntimeError: if the module does not define the feature
+        """
+        if self._target is None:
+            with _IMPORT_LOCK:
+                importlib.import_module('{}.{}'.format(
+                    __name__, self._module))
+            if self._target is None:
+                raise RuntimeError('Module {} does not define {}'.format(
+                    self._module, self.name))
+        return self._target
+
+    def bind(self, feature: Feature):
+        """Binds this placeholder to the feature it represents.
+
+        The configuration, dependencies added with :meth:`require` and any
+        public attributes set on this placeholder are copied to the feature.
+
+        :param feature: The feature.
+        """
+        feature.configuration = self.configuration
+        for dependency in self._dependencies:
+            feature.require(dependency)
+        for (key, value) in vars(self).items():
+            if not key.startswith('_'):
+                setattr(feature, key, value)
+        if self._present is not None and feature._present is None:
+            feature._present = self._present
+        self._target = feature
+
+    @property
+    def batch(self) -> Optional[BatchCallback]:
+        return self.target.batch
+
+    def require(self, dependency: Union[str, Feature]):
+        super().require(dependency)
+        if self._target is not None:
+            self._target.require(dependency)
+
+    @property
+    def configuration(self) -> Configuration:
+        return self._configuration
+
+    @configuration.setter
+    def configuration(self, value: Configuration):
+        Feature.configuration.fset(self, value)
+        if self._target is not None:
+            self._target.configuration = value
+
+    @property
+    def present(self) -> bool:
+        if self._target is None and self._present is not None:
+            return self._present
+        else:
+            return self.target.present
+
+    @present.setter
+    def present(self, value: Optional[bool]):
+        if self._target is None:
+            self._present = value
+        else:
+            self._target.present = value
+
+    @property
+    def watched(self) -> Sequence[str]:
+        return self.target.watched
+
+    @property
+    def artifacts(self) -> List[Tuple[str, Optional[str]]]:
+        return self.target.artifacts
+
+    def install(self):
+        self.target.install()
+
+    def prepare(self):
+        if 'preparer' in self._hooks:
+            self.target.prepare()
+
+    def complete(self):
+        if 'completer' in self._hooks:
+            self.target.complete()
+
+    def run(self, *args, **kwargs) -> Union[bool, str]:
+        return self.target.run(*args, **kwargs)
+
+    def call(self, *args, **kwargs) -> Union[bool, str]:
+        return self.target.call(*args, **kwargs)
+
+    async def run_async(self, *args, **kwargs) -> Union[bool, str]:
+        return await self.target.run_async(*args, **kwargs)
+
+
+def discover(filename: str) -> Sequence[str]:
+    """Registers placeholders for all features in the feature modules.
+
+    Features are read from the feature index, which is cached in
+    ``filename``. Modules whose features cannot be determined without running
+    them are not registered; they must be imported using :func:`load` once the
+    configuration of all registered features has been set, since they may
+    inspect other features.
+
+    :param filename: The file used to cache the feature index.
+
+    :return: the names of the modules that must be imported
+    """
+    from . import index
+    (features, dynamic) = index.load(FEATURE_PATH, filename)
+    for feature in features:
+        if FEATURES.get(feature['name']) is None:
+            Placeholder(**feature)
+    return dynamic
+
+
+def load(modules: Iterable[str]):
+    """Imports feature modules.
+
+    :param modules: The names of the modules.
+    """
+    with _IMPORT_LOCK:
+        for module in modules:
+            importlib.import_module('{}.{}'.format(__name__, module))
+
+
+def install_batch(features: Sequence[Feature]):
+    """Installs several features at once.
+
+    All features must share the same batch installer, which is called once
+    with all features. If a single feature is passed, it is installed normally.
+
+    This function does not check whether the features are already installed.
+
+    :param features: The features to install.
+    """
+    from . import system
+    if len(features) == 1:
+        features[0].install()
+    else:
+        features[0].batch(features)
+        for feature in features:
+            feature.present = None
+        system.invalidate()
 
 
 def feature(
@@ -297,3 +776,78 @@ def feature(
             d.main.name if isinstance(d, types.ModuleType) else
             d
             for d in dependencies})
+
+
+def _interpolate(
+        arg: str, kwargs: Dict[str, Union[str, Sequence[str]]]) -> List[str]:
+    """Performs string interpolation on a command argument.
+
+    :param arg: The argument.
+
+    :param kwargs: The token values.
+
+    :return: a list of arguments
+    """
+    m = TOKEN_RE.fullmatch(arg)
+    if m and isinstance(kwargs.get(m.group(1)), (list, tuple)):
+        return [shlex.quote(value) for value in kwargs[m.group(1)]]
+    else:
+        return [TOKEN_RE.sub(
+            lambda m: (
+                shlex.quote(kwargs[m.group(1)])
+                if m.group(1) in kwargs else
+                m.group(0)),
+            arg)]
+
+
+@contextlib.asynccontextmanager
+async def _terminal(needed: bool):
+    """Holds :attr:`TERMINAL` without blocking the event loop.
+
+    :param needed: Whether the terminal is needed. If this is false, the lock
+        is not acquired.
+    """
+    if not needed:
+        yield
+        return
+    while not TERMINAL.acquire(blocking=False):
+        await asyncio.sleep(0.05)
+    try:
+        yield
+    finally:
+        TERMINAL.release()
+
+
+async def _communicate(
+        p: asyncio.subprocess.Process,
+        output: Optional[Callable[[str], None]]) -> str:
+    """Reads the output of a process and waits for it to terminate.
+
+    :param p: The process.
+
+    :param output: A callback invoked with every line of output.
+
+    :return: the output, or an empty string if output is not piped
+    """
+    lines = []
+    if p.stdout is not None:
+        async for line in p.stdout:
+            line = line.decode('utf-8')
+            lines.append(line)
+            if output is not None:
+                output(line.rstrip('\r\n'))
+    await p.wait()
+    return ''.join(lines)
+
+
+async def _kill(p: asyncio.subprocess.Process):
+    """Kills a process, unless it has already terminated, and waits for it.
+
+    :param p: The process.
+    """
+    if p.returncode is None:
+        try:
+            p.kill()
+        except ProcessLookupError:
+            pass
+        await p.wait()
@@ -0,0 +1,353 @@
+"""
+The download cache
+------------------
+
+This module contains :class:`Cache`, a persistent cache of downloaded
+resources.
+
+Downloaded files are stored by the hash of their content. For every URL, the
+hash of the last downloaded content is recorded together with the validators
+returned by the server, which are used to revalidate the content before it is
+used again. If an expected hash is known, a file with that content is used
+without contacting the server at all.
+
+The cache is bounded in size; the least recently used files are removed first.
+
+Resources may be downloaded ahead of time using :func:`prefetch`; a resource
+downloaded or revalidated once is not revalidated again by the same process.
+
+A download that fails is kept, so that a fetcher able to resume transfers, such
+as :func:`fetch`, can continue where it left off.
+"""
+import concurrent.futures
+import hashlib
+import http.client
+import os
+import shutil
+import threading
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .. import state
+from ..manifest import HASH, digest
+from . import transfer
+
+
+#: The default cache directory.
+DIRECTORY = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'dotfiles',
+    'downloads')
+
+#: The default maximum total size, in bytes, of cached files.
+LIMIT = 1024 * 1024 * 1024
+
+#: The HTTP status indicating that cached content is still valid.
+NOT_MODIFIED = 304
+
+#: The maximum number of concurrent downloads when prefetching.
+CONNECTIONS = 4
+
+#: The name of the file into which a resource is downloaded, in a directory
+#: specific to its URL.
+CONTENT = 'content'
+
+#: A function transferring a resource to a file. It is passed the URL, the
+#: target file name and additional request headers, and returns the tuple
+#: ``(status, headers, digest)`` of the final response, with lower case header
+#: names, where ``digest`` is the hash of the content, if calculated while
+#: transferring it, or ``None``.
+#:
+#: The target file is only written for successful responses. It may contain
+#: part of the resource from an earlier failed attempt, which the fetcher may
+#: resume or overwrite. Other files may be stored in the same directory.
+FetchCallback = Callable[
+    [str, str, Dict[str, str]],
+    Tuple[int, Dict[str, str], Optional[str]]]
+
+
+class DownloadFailed(RuntimeError):
+    """Raised when a resource cannot be downloaded.
+    """
+    pass
+
+
+class Cache:
+    def __init__(self, directory: str = DIRECTORY, limit: int = LIMIT):
+        """Initialises a download cache.
+
+        A download cache may be used concurrently from several threads and
+        processes.
+
+        :param directory: The cache directory. It is created when the first
+            file is stored.
+
+        :param limit: The maximum total size, in bytes, of cached files.
+        """
+        self._directory = directory
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._fresh = {}
+
+    def get(
+            self, url: str, fetch: FetchCallback,
+            sha256: Optional[str] = None) -> str:
+        """Retrieves a resource.
+
+        If ``sha256`` is specified and content with that hash is cached, it is
+        returned immediately. Otherwise, any previously downloaded content is
+        revalidated, and downloaded again if it has changed.
+
+        If revalidation fails, for example because the network is down, the
+        previously downloaded content is returned.
+
+        Only one thread at a time retrieves a given URL, and content that has
+        been downloaded or revalidated by this cache is not revalidated again.
+
+        :param url: The URL of the resource.
+
+        :param fetch: The function used to transfer the resource.
+
+        :param sha256: The expected hash of the content, if known.
+
+        :return: the path to the cached file; this file must not be modified
+
+        :raises DownloadFailed: if the resource cannot be downloaded, or its
+            content does not match ``sha256``
+        """
+        if sha256 is not None:
+            sha256 = sha256.lower()
+            if self._touch(sha256):
+                return self._blob(sha256)
+
+        with self._lock:
+            lock = self._locks.setdefault(url, threading.Lock())
+        with lock:
+            fresh = self._fresh.get(url)
+            if fresh is None or sha256 not in (None, fresh) \
+                    or not self._touch(fresh):
+                fresh = self._fresh[url] = self._download(url, fetch, sha256)
+            return self._blob(fresh)
+
+    def evict(self, keep: Iterable[str] = ()):
+        """Removes the least recently used files until the cache is within its
+        size limit.
+
+        :param keep: The hashes of files never to remove.
+        """
+        keep = set(keep)
+        directory = os.path.join(self._directory, 'blobs')
+        with self._lock:
+            try:
+                with os.scandir(directory) as entries:
+                    files = [
+                        (entry.stat().st_mtime_ns, entry.stat().st_size,
+                            entry.name)
+                        for entry in entries
+                        if entry.is_file()]
+            except OSError:
+                return
+            total = sum(size for (_, size, _) in files)
+            for (_, size, name) in sorted(files):
+                if total <= self._limit:
+                    break
+                elif name in keep:
+                    continue
+                try:
+                    os.unlink(os.path.join(directory, name))
+                    total -= size
+                except OSError:
+                    pass
+
+    def _download(
+            self, url: str, fetch: FetchCallback,
+            sha256: Optional[str]) -> str:
+        """Revalidates a resource, and downloads it if it has changed.
+
+        :param url: The URL of the resource.
+
+        :param fetch: The function used to transfer the resource.
+
+        :param sha256: The expected hash of the content, if known.
+
+        :return: the hash of the content
+
+        :raises DownloadFailed: if the resource cannot be downloaded, or its
+            content does not match ``sha256``
+        """
+        entry = state.load(self._entry(url))
+        cached = entry.get('hash')
+        if cached is not None and not self._touch(cached):
+            cached = None
+        headers = {}
+        if cached is not None and sha256 in (None, cached):
+            if 'etag' in entry:
+                headers['If-None-Match'] = entry['etag']
+            if 'last-modified' in entry:
+                headers['If-Modified-Since'] = entry['last-modified']
+        else:
+            cached = None
+
+        partial = self._partial(url)
+        for name in ('blobs', 'urls'):
+            os.makedirs(os.path.join(self._directory, name), exist_ok=True)
+        os.makedirs(partial, exist_ok=True)
+        temporary = os.path.join(partial, CONTENT)
+        try:
+            (status, response, content) = fetch(url, temporary, headers)
+        except DownloadFailed:
+            # Keep the partial download for the next attempt
+            if cached is None:
+                raise
+            return cached
+
+        try:
+            if status == NOT_MODIFIED and cached is not None:
+                return cached
+            elif not 200 <= status < 300:
+                if cached is None:
+                    raise DownloadFailed('{} returned status {}'.format(
+                        url, status))
+                return cached
+
+            if content is None:
+                content = digest(temporary)
+            if sha256 is not None and content != sha256:
+                raise DownloadFailed('{} has hash {}, expected {}'.format(
+                    url, content, sha256))
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, self._blob(content))
+        finally:
+            shutil.rmtree(partial, ignore_errors=True)
+
+        state.save(self._entry(url), dict(
+            {
+                key: response[key]
+                for key in ('etag', 'last-modified')
+                if key in response},
+            url=url,
+            hash=content))
+        self.evict((content,))
+        return content
+
+    def _blob(self, content: str) -> str:
+        """Generates the path of a cached file.
+
+        :param content: The hash of the content.
+
+        :return: a path
+        """
+        return os.path.join(self._directory, 'blobs', content.lower())
+
+    def _partial(self, url: str) -> str:
+        """Generates the path of the directory into which a URL is downloaded.
+
+        :param url: The URL.
+
+        :return: a path
+        """
+        return os.path.join(self._directory, 'partial', _key(url))
+
+    def _entry(self, url: str) -> str:
+        """Generates the path of the file describing the last download of a
+        URL.
+
+        :param url: The URL.
+
+        :return: a path
+        """
+        return os.path.join(self._directory, 'urls', _key(url))
+
+    def _touch(self, content: str) -> bool:
+        """Marks a cached file as recently used.
+
+        :param content: The hash of the content.
+
+        :return: whether the file is cached
+        """
+        try:
+            os.utime(self._blob(content))
+            return True
+        except OSError:
+            return False
+
+
+def fetch(
+        url: str, target: str, headers: Dict[str, str],
+        progress: Optional[transfer.ProgressCallback] = None
+) -> Tuple[int, Dict[str, str], Optional[str]]:
+    """Transfers a resource to a file in process.
+
+    This is a :data:`FetchCallback` that does not rely on any external
+    command. Connections are shared through :attr:`transfer.POOL`, and
+    interrupted transfers are resumed.
+
+    :param url: The source URL.
+
+    :param target: The target file name.
+
+    :param headers: Additional request headers.
+
+    :param progress: A callback invoked as data is received.
+
+    :return: the tuple ``(status, headers, digest)``
+
+    :raises DownloadFailed: if the transfer fails
+    """
+    try:
+        return transfer.POOL.fetch(url, target, headers, progress)
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        raise DownloadFailed('{}: {}'.format(url, e))
+
+
+def prefetch(
+        artifacts: Iterable[Tuple[str, Optional[str]]],
+        executor: concurrent.futures.Executor,
+        fetch: FetchCallback = fetch,
+        cache: Optional[Cache] = None) -> List[concurrent.futures.Future]:
+    """Starts downloading resources into a cache.
+
+    Every resource is downloaded once, even if listed several times. Failures
+    are ignored, since the resource is downloaded again when it is actually
+    needed, and the error reported then.
+
+    :param artifacts: The resources to download, as the tuples ``(url,
+        sha256)``, where ``sha256`` is the expected hash, or ``None``.
+
+    :param executor: The executor on which to download. Its number of workers
+        limits the number of concurrent connections.
+
+    :param fetch: The function used to transfer resources.
+
+    :param cache: The cache into which to download. If this is ``None``,
+        :attr:`CACHE` is used.
+
+    :return: a future for every download, resolving to the path to the cached
+        file, or ``None`` if the download failed
+    """
+    cache = cache if cache is not None else CACHE
+
+    def download(url: str, sha256: Optional[str]) -> Optional[str]:
+        try:
+            return cache.get(url, fetch, sha256)
+        except (DownloadFailed, OSError):
+            return None
+
+    return [
+        executor.submit(download, url, sha256)
+        for (url, sha256) in dict(artifacts).items()]
+
+
+def _key(url: str) -> str:
+    """Generates the file name used for data about a URL.
+
+    :param url: The URL.
+
+    :return: a file name
+    """
+    return hashlib.new(HASH, url.encode('utf-8')).hexdigest()
+
+
+#: The default download cache.
+CACHE = Cache()
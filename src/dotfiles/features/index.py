@@ -0,0 +1,431 @@
+"""
+The feature index
+-----------------
+
+This module contains functions to list the features defined by feature modules
+without importing them.
+
+Feature modules are parsed, and features defined using the
+:func:`~dotfiles.features.feature` decorator, or one of the helper functions
+in :attr:`FACTORIES`, are extracted from the module level statements. The
+result is cached for every module, keyed on the state of its file. The whole
+cache is discarded when the parser changes; see :func:`fingerprint`.
+
+A module is *dynamic* if its features cannot be determined without running it,
+for example because it defines features conditionally. Dynamic modules must be
+imported to learn their features.
+"""
+import ast
+import hashlib
+import os
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .. import state
+from ..manifest import HASH, stamp
+
+
+#: The version of the index format. This must be incremented when the parser
+#: is modified; changes to :attr:`FACTORIES` and :attr:`HOOKS` are detected
+#: automatically.
+VERSION = 1
+
+#: Helper functions defining a feature when called, mapping ``(module,
+#: function)`` to the tuple ``(parameters, name, descriptions, dependencies)``.
+#:
+#: ``parameters`` are the names of the positional parameters; any additional
+#: positional arguments are dependencies. ``name`` is the parameter containing
+#: the feature name, and the description is the value of the first parameter
+#: in ``descriptions`` that is not ``None``. ``dependencies`` are modules whose
+#: main feature is always a dependency.
+FACTORIES = {
+    ('pip', 'package'): (
+        ('name', 'description'), 'name', ('description', 'name'), ('pip',)),
+    ('rust', 'binary'): (
+        ('name', 'crate', 'description'), 'name', ('description',),
+        ('rust',)),
+    ('rust', 'component'): (
+        ('name', 'description'), 'name', ('description',), ('rust',)),
+    ('system', 'package'): (
+        ('package', 'binary', 'description'), 'package',
+        ('description', 'binary', 'package'), ()),
+}
+
+#: The decorators of features that register callbacks that must run even when
+#: a feature is not installed.
+HOOKS = ('preparer', 'completer')
+
+
+class Dynamic(Exception):
+    """Raised when the features of a module cannot be determined statically.
+    """
+    pass
+
+
+def load(
+        directory: str, filename: str
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Lists the features defined by all feature modules in a directory.
+
+    :param directory: The directory containing feature modules.
+
+    :param filename: The file used to cache the index.
+
+    :return: the tuple ``(features, dynamic)``, where ``features`` is a list of
+        keyword arguments for :class:`~dotfiles.features.Placeholder`, and
+        ``dynamic`` the names of modules that must be imported
+    """
+    version = fingerprint()
+    cache = state.load(filename)
+    cached = cache.get('modules', {}) if cache.get('version') == version \
+        else {}
+    modules = {}
+    for name in sorted(os.listdir(directory)):
+        (module, extension) = os.path.splitext(name)
+        if extension != '.py' or module[0] in '._':
+            continue
+        path = os.path.join(directory, name)
+        try:
+            current = stamp(os.stat(path))
+        except OSError:
+            continue
+        entry = cached.get(module)
+        if entry is None or entry['stamp'] != current:
+            entry = dict(parse(path, module), stamp=current)
+        modules[module] = entry
+
+    if modules != cached:
+        state.save(filename, {'version': version, 'modules': modules})
+
+    return resolve(modules)
+
+
+def fingerprint() -> str:
+    """Generates a fingerprint of the parser.
+
+    The fingerprint covers :attr:`VERSION`, :attr:`FACTORIES` and
+    :attr:`HOOKS`, so that cached entries are discarded whenever the way
+    modules are parsed changes.
+
+    :return: a hex digest
+    """
+    return hashlib.new(HASH, repr((
+        VERSION,
+        sorted(FACTORIES.items()),
+        HOOKS)).encode('utf-8')).hexdigest()
+
+
+def resolve(
+        modules: Dict[str, Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Resolves module dependencies of parsed modules to feature names.
+
+    A module depending on a dynamic module is itself dynamic.
+
+    :param modules: A mapping from module name to the value returned by
+        :func:`parse`.
+
+    :return: the tuple ``(features, dynamic)`` as returned by :func:`load`
+    """
+    dynamic = {
+        module
+        for (module, entry) in modules.items()
+        if entry['dynamic']}
+
+    def main(module: str) -> Optional[str]:
+        entry = modules.get(module)
+        if entry is None or module in dynamic:
+            return None
+        return entry['main']
+
+    # Dynamic modules propagate to modules depending on them
+    while True:
+        found = {
+            module
+            for (module, entry) in modules.items()
+            if module not in dynamic
+            and any(
+                kind == 'module' and main(value) is None
+                for feature in entry['features']
+                for (kind, value) in feature['dependencies'])}
+        if not found:
+            break
+        dynamic.update(found)
+
+    features = [
+        {
+            'module': module,
+            'name': feature['name'],
+            'description': feature['description'],
+            'dependencies': sorted(
+                main(value) if kind == 'module' else value
+                for (kind, value) in feature['dependencies']),
+            'hooks': feature['hooks'],
+        }
+        for (module, entry) in sorted(modules.items())
+        if module not in dynamic
+        for feature in entry['features']]
+    return (features, sorted(dynamic))
+
+
+def parse(path: str, module: str) -> Dict[str, Any]:
+    """Extracts the features defined by a feature module.
+
+    :param path: The path of the module file.
+
+    :param module: The name of the module.
+
+    :return: a mapping with the keys ``'dynamic'``, whether the features cannot
+        be determined statically, ``'main'``, the name of the feature bound to
+        ``main``, and ``'features'``, a list of the mappings ``{'name',
+        'description', 'dependencies', 'hooks'}``, where every dependency is
+        the list ``[kind, value]`` and ``kind`` is either ``'feature'`` or
+        ``'module'``
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), path)
+        return _Parser(module).parse(tree)
+    except (Dynamic, OSError, SyntaxError, ValueError):
+        return {'dynamic': True, 'main': None, 'features': []}
+
+
+class _Parser:
+    def __init__(self, module: str):
+        """Initialises a parser for a feature module.
+
+        :param module: The name of the module.
+        """
+        self._module = module
+        self._constants = {}
+        self._imports = set()
+        self._features = {}
+        self._order = []
+
+    def parse(self, tree: ast.Module) -> Dict[str, Any]:
+        """Extracts the features from a parsed module.
+
+        :param tree: The module.
+
+        :return: the value returned by :func:`parse`
+
+        :raises Dynamic: if the features cannot be determined statically
+        """
+        for (i, node) in enumerate(tree.body):
+            if isinstance(node, ast.ImportFrom):
+                if node.level == 1 and node.module is None:
+                    self._imports.update(
+                        alias.asname or alias.name for alias in node.names)
+            elif isinstance(node, (ast.Import, ast.ClassDef)):
+                pass
+            elif isinstance(node, ast.Expr) and i == 0 \
+                    and isinstance(node.value, ast.Constant):
+                pass
+            elif isinstance(node, ast.Assign):
+                self._assign(node)
+            elif isinstance(node, ast.FunctionDef):
+                self._function(node)
+            else:
+                raise Dynamic(node)
+
+        main = self._features.get('main')
+        return {
+            'dynamic': False,
+            'main': main['name'] if main is not None else None,
+            'features': [self._features[name] for name in self._order]}
+
+    def _assign(self, node: ast.Assign):
+        """Handles an assignment at module level.
+
+        :param node: The assignment.
+
+        :raises Dynamic: if the assignment may define features that cannot be
+            determined
+        """
+        targets = [
+            target.id
+            for target in node.targets
+            if isinstance(target, ast.Name)]
+        value = node.value
+        if isinstance(value, ast.Constant) and isinstance(value.value, str):
+            self._constants.update((target, value.value) for target in targets)
+        elif isinstance(value, ast.Call) \
+                and isinstance(value.func, ast.Attribute) \
+                and isinstance(value.func.value, ast.Name) \
+                and value.func.value.id in self._imports:
+            key = (value.func.value.id, value.func.attr)
+            if key not in FACTORIES or len(targets) != len(node.targets):
+                raise Dynamic(node)
+            feature = self._factory(value, *FACTORIES[key])
+            for target in targets:
+                self._define(target, feature)
+
+    def _function(self, node: ast.FunctionDef):
+        """Handles a function definition at module level.
+
+        :param node: The function definition.
+
+        :raises Dynamic: if the function is decorated in a way that may define
+            features that cannot be determined
+        """
+        for decorator in node.decorator_list:
+            if isinstance(decorator, ast.Call) \
+                    and isinstance(decorator.func, ast.Name) \
+                    and decorator.func.id == 'feature':
+                if len(node.decorator_list) != 1:
+                    raise Dynamic(node)
+                self._define(node.name, self._decorator(node, decorator))
+            elif isinstance(decorator, ast.Attribute) \
+                    and isinstance(decorator.value, ast.Name) \
+                    and decorator.value.id in self._features:
+                if decorator.attr in HOOKS:
+                    self._features[decorator.value.id]['hooks'].append(
+                        decorator.attr)
+            elif any(
+                    isinstance(n, ast.Name) and (
+                        n.id in self._imports or n.id in self._features)
+                    for n in ast.walk(decorator)):
+                raise Dynamic(node)
+
+    def _decorator(
+            self, node: ast.FunctionDef, call: ast.Call) -> Dict[str, Any]:
+        """Extracts a feature defined by the feature decorator.
+
+        :param node: The decorated function.
+
+        :param call: The decorator call.
+
+        :return: a feature
+        """
+        arguments = self._arguments(
+            call, ('description', 'dependencies', 'name'))
+        name = self._value(arguments.get('name')) or (
+            self._module if node.name == 'main' else node.name)
+        return {
+            'name': name,
+            'description': self._value(arguments.get('description')),
+            'dependencies': self._dependencies(arguments.get('dependencies')),
+            'hooks': []}
+
+    def _factory(
+            self, call: ast.Call, parameters: Sequence[str], name: str,
+            descriptions: Sequence[str],
+            dependencies: Sequence[str]) -> Dict[str, Any]:
+        """Extracts a feature defined by a helper function.
+
+        :param call: The call to the helper function.
+
+        :param parameters: The names of the positional parameters.
+
+        :param name: The parameter containing the name.
+
+        :param descriptions: The parameters that may contain the description.
+
+        :param dependencies: The modules on which the feature always depends.
+
+        :return: a feature
+        """
+        if any(isinstance(arg, ast.Starred) for arg in call.args):
+            raise Dynamic(call)
+        arguments = self._arguments(call, parameters)
+        values = {
+            key: self._value(arguments.get(key))
+            for key in parameters}
+        return {
+            'name': values[name],
+            'description': next(
+                (values[key] for key in descriptions if values[key]),
+                None),
+            'dependencies': [
+                ['module', module] for module in dependencies] + [
+                self._dependency(arg)
+                for arg in call.args[len(parameters):]],
+            'hooks': []}
+
+    def _define(self, variable: str, feature: Dict[str, Any]):
+        """Records a feature bound to a module level variable.
+
+        :param variable: The name of the variable.
+
+        :param feature: The feature.
+        """
+        if not isinstance(feature['name'], str):
+            raise Dynamic(variable)
+        self._features[variable] = feature
+        self._order.append(variable)
+
+    def _arguments(
+            self, call: ast.Call,
+            parameters: Sequence[str]) -> Dict[str, ast.AST]:
+        """Maps the arguments of a call to parameter names.
+
+        :param call: The call.
+
+        :param parameters: The names of the positional parameters.
+
+        :return: a mapping from parameter name to argument
+        """
+        result = dict(zip(parameters, call.args))
+        for keyword in call.keywords:
+            if keyword.arg is None:
+                raise Dynamic(call)
+            result[keyword.arg] = keyword.value
+        return result
+
+    def _value(self, node: Optional[ast.AST]) -> Optional[str]:
+        """Evaluates a string argument.
+
+        :param node: The argument.
+
+        :return: the value
+
+        :raises Dynamic: if the argument is not a constant, a module level
+            string constant or the module name
+        """
+        if node is None:
+            return None
+        elif isinstance(node, ast.Constant) \
+                and isinstance(node.value, (str, type(None))):
+            return node.value
+        elif isinstance(node, ast.Name) and node.id in self._constants:
+            return self._constants[node.id]
+        elif ast.unparse(node) in (
+                "__name__.rsplit('.')[-1]", "__name__.rsplit('.', 1)[-1]"):
+            return self._module
+        else:
+            raise Dynamic(node)
+
+    def _dependencies(self, node: Optional[ast.AST]) -> List[List[str]]:
+        """Evaluates a set of dependencies.
+
+        :param node: The argument.
+
+        :return: a list of dependencies
+
+        :raises Dynamic: if the argument is not a set literal or an empty set
+        """
+        if node is None:
+            return []
+        elif isinstance(node, ast.Set):
+            return [self._dependency(element) for element in node.elts]
+        elif isinstance(node, ast.Call) and ast.unparse(node) == 'set()':
+            return []
+        else:
+            raise Dynamic(node)
+
+    def _dependency(self, node: ast.AST) -> List[str]:
+        """Evaluates a single dependency.
+
+        :param node: The dependency.
+
+        :return: the list ``[kind, value]``
+
+        :raises Dynamic: if the dependency is not a feature name, a feature
+            defined in the module or an imported module
+        """
+        if isinstance(node, ast.Name) and node.id in self._features:
+            return ['feature', self._features[node.id]['name']]
+        elif isinstance(node, ast.Name) and node.id in self._imports:
+            return ['module', node.id]
+        else:
+            return ['feature', self._value(node)]
@@ -0,0 +1,151 @@
+"""
+The feature scheduler
+---------------------
+
+This module contains functions to order features by their dependencies, and to
+install independent features concurrently.
+
+Features are ordered topologically; among features whose dependencies are
+satisfied, the registration order is kept. Commands that need the terminal are
+serialised by :meth:`dotfiles.features.Feature.run`, so concurrently installed
+features never compete for user input.
+
+Features sharing a batch installer that become ready at the same time are
+installed together, using :func:`dotfiles.features.install_batch`.
+"""
+import concurrent.futures
+
+from typing import Callable, List, Optional, Sequence, Set
+
+from . import Feature, install_batch
+
+
+#: A function called when all dependencies of a feature have completed. It
+#: returns the work to perform for the feature on a worker thread, or ``None``.
+StartCallback = Callable[[Feature], Optional[Callable[[], None]]]
+
+
+def order(features: Sequence[Feature]) -> List[Feature]:
+    """Orders features so that every feature follows its dependencies.
+
+    The sort is stable: every feature is placed at its position in
+    ``features``, preceded only by those of its dependencies not already
+    placed, so features that already follow their dependencies keep their
+    order.
+
+    Dependencies not in ``features`` are ignored.
+
+    :param features: The features to order.
+
+    :return: the ordered features
+
+    :raises RuntimeError: if the dependencies contain a cycle
+    """
+    positions = {feature.name: i for (i, feature) in enumerate(features)}
+    result = []
+    done = set()
+
+    def place(feature: Feature, path: List[str]):
+        if feature.name in done:
+            return
+        elif feature.name in path:
+            raise RuntimeError('Features have cyclic dependencies: {}'.format(
+                ' -> '.join(
+                    path[path.index(feature.name):] + [feature.name])))
+        for dependency in sorted(
+                (d for d in feature.dependencies if d.name in positions),
+                key=lambda d: positions[d.name]):
+            place(features[positions[dependency.name]], path + [feature.name])
+        done.add(feature.name)
+        result.append(feature)
+
+    for feature in features:
+        place(feature, [])
+
+    return result
+
+
+def dependencies(feature: Feature) -> Set[str]:
+    """Lists the names of all direct and indirect dependencies of a feature.
+
+    :param feature: The feature.
+
+    :return: a set of feature names
+    """
+    result = set()
+    stack = list(feature.dependencies)
+    while stack:
+        dependency = stack.pop()
+        if dependency.name not in result:
+            result.add(dependency.name)
+            stack.extend(dependency.dependencies)
+    return result
+
+
+def run(
+        features: Sequence[Feature], start: StartCallback,
+        jobs: Optional[int] = None):
+    """Runs work for features concurrently, in dependency order.
+
+    ``start`` is called on the calling thread, in dependency order, once all
+    dependencies of a feature have completed. The work it returns is run on a
+    pool of worker threads.
+
+    If work is returned for several features sharing a batch installer that
+    are started at the same time, the work is replaced by a single call to
+    :func:`dotfiles.features.install_batch` for all of them.
+
+    If any work fails, no more features are started, and the error is raised
+    once all running work has completed.
+
+    :param features: The features for which to run work.
+
+    :param start: A callback returning the work to run for a feature.
+
+    :param jobs: The maximum number of concurrent workers. If this is
+        ``None``, a default value is used.
+
+    :raises RuntimeError: if the dependencies contain a cycle
+    """
+    pending = order(features)
+    names = {feature.name for feature in pending}
+    done = set()
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        while pending or running:
+            started = False
+            batches = {}
+            for feature in list(pending):
+                if not all(
+                        d.name in done or d.name not in names
+                        for d in feature.dependencies):
+                    continue
+                pending.remove(feature)
+                started = True
+                work = start(feature)
+                if work is None:
+                    done.add(feature.name)
+                elif feature.batch is not None:
+                    batches.setdefault(feature.batch, []).append(
+                        (feature, work))
+                else:
+                    running[executor.submit(work)] = [feature]
+            for batch in batches.values():
+                if len(batch) == 1:
+                    ((feature, work),) = batch
+                    running[executor.submit(work)] = [feature]
+                else:
+                    features = [feature for (feature, _) in batch]
+                    running[executor.submit(install_batch, features)] = \
+                        features
+            if started and not running:
+                continue
+
+            (finished, _) = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                features = running.pop(future)
+                if future.exception() is not None:
+                    concurrent.futures.wait(running)
+                    future.result()
+                done.update(feature.name for feature in features)
@@ -0,0 +1,111 @@
+"""
+Staged installation
+-------------------
+
+This module contains functions to put downloaded artifacts in place without
+leaving a partially installed target behind.
+
+Everything is first written to a staging path next to the target, on the same
+file system, and then renamed into place. If writing fails, the previous
+target is left untouched.
+"""
+import os
+import shutil
+import tarfile
+import tempfile
+
+
+#: The permissions of installed directories.
+DIRECTORY_MODE = 0o755
+
+#: The default permissions of installed files.
+FILE_MODE = 0o644
+
+
+def extract(source: str, target: str):
+    """Extracts an archive into a directory, replacing it.
+
+    The archive is read once, as a stream, and may be compressed using any
+    method supported by :mod:`tarfile`. Members that would be written outside
+    of the target are rejected when supported by the Python version.
+
+    The contents of the target are replaced by the contents of the archive.
+
+    :param source: The archive file.
+
+    :param target: The target directory.
+
+    :raises tarfile.TarError: if the archive is invalid
+    """
+    parent = os.path.dirname(os.path.abspath(target))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(
+        dir=parent, prefix='.{}.'.format(os.path.basename(target)))
+    try:
+        with open(source, 'rb') as f, \
+                tarfile.open(fileobj=f, mode='r|*') as archive:
+            if hasattr(tarfile, 'data_filter'):
+                archive.extractall(staging, filter='data')
+            else:
+                archive.extractall(staging)
+        os.chmod(staging, DIRECTORY_MODE)
+        swap(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def install(source: str, target: str, mode: int = FILE_MODE):
+    """Copies a file into place, replacing any existing file atomically.
+
+    :param source: The source file.
+
+    :param target: The target file. Its directory is created if it does not
+        exist.
+
+    :param mode: The permissions of the installed file.
+    """
+    parent = os.path.dirname(os.path.abspath(target))
+    os.makedirs(parent, exist_ok=True)
+    (fd, staging) = tempfile.mkstemp(
+        dir=parent, prefix='.{}.'.format(os.path.basename(target)))
+    try:
+        with open(source, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.chmod(staging, mode)
+        os.replace(staging, target)
+    except BaseException:
+        try:
+            os.unlink(staging)
+        except OSError:
+            pass
+        raise
+
+
+def swap(staging: str, target: str):
+    """Replaces a directory by another on the same file system.
+
+    Directories cannot be replaced by a single rename, so the target is first
+    renamed out of the way. It is only absent for the time between two
+    renames, and restored if the second rename fails.
+
+    :param staging: The new directory.
+
+    :param target: The directory to replace.
+    """
+    if not os.path.lexists(target):
+        os.rename(staging, target)
+        return
+
+    parent = os.path.dirname(os.path.abspath(target))
+    previous = tempfile.mkdtemp(
+        dir=parent, prefix='.{}.old.'.format(os.path.basename(target)))
+    backup = os.path.join(previous, 'target')
+    os.rename(target, backup)
+    try:
+        os.rename(staging, target)
+    except BaseException:
+        os.rename(backup, target)
+        os.rmdir(previous)
+        raise
+    shutil.rmtree(previous, ignore_errors=True)
@@ -1,8 +1,47 @@
+import os
 import shlex
+import subprocess
+import sys
+import threading
+
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 from . import Feature, feature
 
 
+#: The names of installed packages, or ``None`` if not yet known.
+_PACKAGES = None
+
+#: A lock held while listing installed packages.
+_PACKAGES_LOCK = threading.Lock()
+
+#: Directories searched for executables after those in ``$PATH``.
+#:
+#: These contain executables installed by features that may not yet be in
+#: ``$PATH`` when the process is started, for example from a git hook.
+EXTRA_PATH = tuple(
+    os.path.expanduser(path)
+    for path in ('~/.cargo/bin', '~/.local/bin')) + (
+        (os.path.join(os.environ['PREFIX'], 'bin'),)
+        if 'PREFIX' in os.environ else
+        ('/opt/homebrew/bin', '/usr/local/bin')
+        if sys.platform == 'darwin' else
+        ())
+
+#: Indexes of the entries in the directories searched for executables, by
+#: search path, as the tuples ``(stamps, index)``, where ``stamps`` are the
+#: modification times of the directories when they were listed, and ``index``
+#: maps every entry name to the directories containing it, in search order.
+_EXECUTABLES = {}
+
+#: The search paths whose index has been validated since executables were last
+#: installed.
+_VALIDATED = set()
+
+#: A lock held while indexing directories searched for executables.
+_EXECUTABLES_LOCK = threading.Lock()
+
+
 def package(package: str, binary: str=None, description: str=None) -> Feature:
     """Defines a package feature.
 
@@ -20,16 +59,29 @@ def package(package: str, binary: str=None, description: str=None) -> Feature:
 
     @installer.checker
     def is_installed(env: Feature) -> bool:
+        name = env.configuration.get('package_names', {}).get(
+            package, package)
+        installed = packages(env) if binary is None else None
         if binary is not None:
             return present(env, binary)
+        elif installed is not None:
+            return name in installed
         else:
             return env.run(
                     *shlex.split(env.configuration['commands']['package_check']),
                     interactive=False,
                     silent=True,
                     check=True,
-                    name=env.configuration.get('package_names', {}).get(
-                        package, package))
+                    name=name)
+
+    installer.batcher(install_packages)
+
+    @installer.watcher
+    def watched(env: Feature) -> Sequence[str]:
+        if binary is not None:
+            return which(binary)
+        else:
+            return database(env)
 
     return installer
 
@@ -41,9 +93,103 @@ def install_package(env: Feature, name: str):
 
     :param name: The generic name of the package.
     """
+    global _PACKAGES
     env.run(
         *shlex.split(env.configuration['commands']['package_install']),
         name=env.configuration.get('package_names', {}).get(name, name))
+    with _PACKAGES_LOCK:
+        _PACKAGES = None
+
+
+def install_packages(features: Sequence[Feature]):
+    """Installs the packages of several package features in one transaction.
+
+    The packages are installed using the ``package_install_many`` command,
+    where the token ``${names}`` is replaced by the package names. If this
+    command is not configured, or it fails, the packages are installed one by
+    one instead.
+
+    :param features: The package features to install.
+    """
+    global _PACKAGES
+    env = features[0]
+    names = [
+        env.configuration.get('package_names', {}).get(f.name, f.name)
+        for f in features]
+    command = env.configuration['commands'].get('package_install_many')
+    installed = command is not None and env.run(
+        *shlex.split(command),
+        check=True,
+        names=names)
+    with _PACKAGES_LOCK:
+        _PACKAGES = None
+    if not installed:
+        for feature in features:
+            install_package(feature, feature.name)
+
+
+def packages(env: Feature) -> Optional[Set[str]]:
+    """Lists the names of all installed packages.
+
+    The packages are listed once and then cached until a package is installed.
+    They are read from the *dpkg* status file named by the ``package_status``
+    command configuration if present, and otherwise from the output of the
+    ``package_list`` command, which must print one package name per line.
+
+    If neither is configured, or the packages cannot be read, the
+    ``package_check`` command must be used for every package instead.
+
+    :param env: The currently handled feature.
+
+    :return: a set of package names, or ``None`` if the installed packages
+        cannot be listed on this platform
+    """
+    global _PACKAGES
+    with _PACKAGES_LOCK:
+        if _PACKAGES is None:
+            commands = env.configuration['commands']
+            if 'package_status' in commands:
+                try:
+                    _PACKAGES = dpkg(os.path.expandvars(
+                        commands['package_status']))
+                except OSError:
+                    return None
+            elif 'package_list' in commands:
+                try:
+                    output = subprocess.check_output(
+                        shlex.split(commands['package_list']),
+                        stdin=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL).decode('utf-8')
+                except (OSError, subprocess.CalledProcessError):
+                    return None
+                _PACKAGES = {
+                    line.strip()
+                    for line in output.splitlines()
+                    if line.strip()}
+        return _PACKAGES
+
+
+def dpkg(filename: str) -> Set[str]:
+    """Lists the names of all installed packages in a *dpkg* status file.
+
+    :param filename: The status file.
+
+    :return: a set of package names
+
+    :raises OSError: if the file cannot be read
+    """
+    result = set()
+    name = None
+    with open(filename, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line.startswith('Package:'):
+                name = line[len('Package:'):].strip()
+            elif line.startswith('Status:'):
+                if name is not None and line.split()[-1] == 'installed':
+                    result.add(name)
+            elif not line.strip():
+                name = None
+    return result
 
 
 def present(env: Feature, name: str) -> bool:
@@ -55,9 +201,125 @@ def present(env: Feature, name: str) -> bool:
 
     :returns: whether the binary exists
     """
-    r = env.run(
-        'which', name,
-        check=True,
-        interactive=False,
-        silent=True)
-    return r
+    return executable(name) is not None
+
+
+def which(name: str) -> Sequence[str]:
+    """Lists the path of a binary, for use as a feature watcher.
+
+    :param name: The binary name.
+
+    :return: a list containing the path to the binary if it is found, and
+        otherwise an empty list
+    """
+    path = executable(name)
+    return [path] if path is not None else []
+
+
+def executable(
+        name: str,
+        directories: Optional[Iterable[str]] = None) -> Optional[str]:
+    """Locates an executable.
+
+    The entries of all directories searched are indexed once. The index is
+    validated against the modification times of the directories only on the
+    first lookup after :func:`invalidate` has been called, so other lookups
+    only touch the file system for the executable found.
+
+    :param name: The executable name.
+
+    :param directories: The directories to search. If this is not specified,
+        the directories in ``$PATH`` followed by :attr:`EXTRA_PATH` are
+        searched.
+
+    :return: the absolute path of the first executable found, or ``None``
+    """
+    if directories is None:
+        directories = os.environ.get('PATH', os.defpath).split(os.pathsep) \
+            + list(EXTRA_PATH)
+    for directory in _index(
+            tuple(directory or os.curdir for directory in directories)).get(
+                name, ()):
+        path = os.path.abspath(os.path.join(directory, name))
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def invalidate():
+    """Marks the indexes of executables as possibly outdated.
+
+    The directories searched for executables are checked for modifications on
+    the next lookup. This is called whenever a feature has been installed.
+    """
+    with _EXECUTABLES_LOCK:
+        _VALIDATED.clear()
+
+
+def _index(directories: Tuple[str, ...]) -> Dict[str, List[str]]:
+    """Indexes the entries of the directories in a search path.
+
+    :param directories: The directories in the search path.
+
+    :return: a mapping from entry name to the directories containing it
+    """
+    with _EXECUTABLES_LOCK:
+        cached = _EXECUTABLES.get(directories)
+        if cached is not None and directories in _VALIDATED:
+            return cached[1]
+
+        stamps = [_mtime(directory) for directory in directories]
+        if cached is None or cached[0] != stamps:
+            index = {}
+            for directory in directories:
+                for name in _entries(directory):
+                    index.setdefault(name, []).append(directory)
+            cached = _EXECUTABLES[directories] = (stamps, index)
+        _VALIDATED.add(directories)
+        return cached[1]
+
+
+def _mtime(directory: str) -> Optional[int]:
+    """Determines the modification time of a directory.
+
+    :param directory: The directory.
+
+    :return: the modification time in nanoseconds, or ``None`` if the directory
+        does not exist
+    """
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _entries(directory: str) -> Set[str]:
+    """Lists the names of all entries in a directory.
+
+    :param directory: The directory.
+
+    :return: a set of names, which is empty if the directory cannot be read
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except OSError:
+        return set()
+
+
+def database(env: Feature) -> Sequence[str]:
+    """Lists the files of the package database, for use as a feature watcher.
+
+    The files are read from the ``package_database`` command configuration, as
+    a space separated list that may contain environment variables. If this is
+    not set, the *dpkg* status file named by ``package_status`` is used.
+
+    :param env: The currently handled feature.
+
+    :return: a list of paths
+    """
+    return [
+        os.path.expandvars(path)
+        for path in shlex.split(env.configuration['commands'].get(
+            'package_database',
+            env.configuration['commands'].get('package_status', '')))]
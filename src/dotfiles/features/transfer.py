@@ -0,0 +1,492 @@
+"""
+HTTP transfers
+--------------
+
+This module contains :class:`Pool`, an in-process HTTP client used to download
+resources without relying on external commands.
+
+Connections are kept alive and reused for later requests to the same host. An
+interrupted transfer leaves a partial file, which is resumed using a range
+request on the next attempt, as long as the resource has not changed. The
+content is hashed as it is received, so it can be verified without being read
+again.
+"""
+import hashlib
+import http.client
+import json
+import os
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from typing import Callable, Dict, Optional, Tuple
+
+from ..manifest import HASH
+
+
+#: The size of blocks read from responses.
+BLOCK_SIZE = 64 * 1024
+
+#: The timeout, in seconds, for network operations.
+TIMEOUT = 30
+
+#: The maximum number of redirects followed.
+REDIRECTS = 10
+
+#: The number of times an interrupted transfer is resumed before giving up.
+RETRIES = 3
+
+#: The HTTP statuses that redirect to another location.
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+#: The HTTP status of a partial response to a range request.
+PARTIAL_CONTENT = 206
+
+#: The HTTP status of a range request that cannot be satisfied.
+RANGE_NOT_SATISFIABLE = 416
+
+#: The suffix of the file next to a partial download recording the validator
+#: of the resource.
+VALIDATOR_SUFFIX = '.validator'
+
+#: A function called while a transfer progresses with the number of bytes
+#: received so far and the total size, or ``None`` if unknown.
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+class Pool:
+    def __init__(self, timeout: float = TIMEOUT):
+        """Initialises an empty connection pool.
+
+        A pool may be used concurrently from several threads; a connection is
+        only used by one thread at a time.
+
+        :param timeout: The timeout, in seconds, for network operations.
+        """
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._context = None
+
+    def fetch(
+            self, url: str, target: str, headers: Dict[str, str],
+            progress: Optional[ProgressCallback] = None
+    ) -> Tuple[int, Dict[str, str], Optional[str]]:
+        """Transfers a resource to a file.
+
+        If ``target`` contains a partial download from an earlier attempt, the
+        transfer is resumed if the resource has not changed; otherwise the
+        file is overwritten. A transfer interrupted by a network error is
+        resumed up to :attr:`RETRIES` times. If it still fails, the partial
+        file is kept for the next attempt.
+
+        This is a :data:`~dotfiles.features.downloads.FetchCallback`.
+
+        :param url: The source URL.
+
+        :param target: The target file name.
+
+        :param headers: Additional request headers.
+
+        :param progress: A callback invoked as data is received.
+
+        :return: the tuple ``(status, headers, digest)``, where ``digest`` is
+            the hash of the content written to ``target``, or ``None`` if
+            nothing was written
+
+        :raises OSError: if the transfer fails
+        :raises http.client.HTTPException: if the server responds incorrectly
+        """
+        for attempt in range(RETRIES + 1):
+            try:
+                return self._fetch(url, target, headers, progress)
+            except (OSError, http.client.HTTPException):
+                if attempt == RETRIES or not _resumable(target):
+                    raise
+
+    def close(self):
+        """Closes all idle connections.
+        """
+        with self._lock:
+            idle = [c for cs in self._idle.values() for c in cs]
+            self._idle.clear()
+        for connection in idle:
+            connection.close()
+
+    def _fetch(
+            self, url: str, target: str, headers: Dict[str, str],
+            progress: Optional[ProgressCallback]
+    ) -> Tuple[int, Dict[str, str], Optional[str]]:
+        """Performs a single attempt at transferring a resource to a file.
+
+        :param url: The source URL.
+
+        :param target: The target file name.
+
+        :param headers: Additional request headers.
+
+        :param progress: A callback invoked as data is received.
+
+        :return: the tuple ``(status, headers, digest)``
+        """
+        offset = 0
+        request = headers
+        validator = _validator(target)
+        if validator is not None:
+            offset = os.path.getsize(target)
+            request = dict(headers, **{
+                'Range': 'bytes={}-'.format(offset),
+                'If-Range': validator})
+
+        (key, connection, response) = self._follow(url, request)
+        status = response.status
+        meta = {k.lower(): v for (k, v) in response.getheaders()}
+        if offset and (
+                status == RANGE_NOT_SATISFIABLE
+                or status == PARTIAL_CONTENT
+                and _range_start(meta) != offset):
+            # The partial file cannot be resumed, so start over
+            self._release(key, connection, response)
+            _discard(target)
+            return self._fetch(url, target, headers, progress)
+        elif status == PARTIAL_CONTENT and not offset:
+            connection.close()
+            raise http.client.HTTPException(
+                'Unexpected partial content for {}'.format(url))
+        elif not 200 <= status < 300:
+            self._release(key, connection, response)
+            return (status, meta, None)
+
+        try:
+            digest = _receive(
+                response, target,
+                offset if status == PARTIAL_CONTENT else 0,
+                meta, progress)
+        except BaseException:
+            connection.close()
+            raise
+        self._release(key, connection, response)
+        return (status, meta, digest)
+
+    def _follow(
+            self, url: str, headers: Dict[str, str]
+    ) -> Tuple[Tuple[str, str, int], http.client.HTTPConnection,
+               http.client.HTTPResponse]:
+        """Sends a request and follows redirects.
+
+        :param url: The URL.
+
+        :param headers: The request headers.
+
+        :return: the tuple ``(key, connection, response)`` for the final
+            response, whose body has not yet been read
+        """
+        for _ in range(REDIRECTS + 1):
+            (key, connection, response) = self._request(url, headers)
+            if response.status not in REDIRECT_STATUSES \
+                    or response.getheader('location') is None:
+                return (key, connection, response)
+            location = urllib.parse.urljoin(
+                url, response.getheader('location'))
+            self._release(key, connection, response)
+            url = location
+        raise http.client.HTTPException('Too many redirects for {}'.format(
+            url))
+
+    def _request(
+            self, url: str, headers: Dict[str, str]
+    ) -> Tuple[Tuple[str, str, int], http.client.HTTPConnection,
+               http.client.HTTPResponse]:
+        """Sends a single request, reusing an idle connection if possible.
+
+        A reused connection may have been closed by the server; the request is
+        then sent again on a new connection.
+
+        :param url: The URL.
+
+        :param headers: The request headers.
+
+        :return: the tuple ``(key, connection, response)``
+        """
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('Unsupported URL: {}'.format(url))
+        key = (
+            parts.scheme,
+            parts.hostname,
+            parts.port or (443 if parts.scheme == 'https' else 80))
+        target = urllib.parse.urlunsplit(
+            ('', '', parts.path or '/', parts.query, ''))
+        headers = dict(headers, **{'Accept-Encoding': 'identity'})
+
+        # Plain HTTP proxies expect the absolute URL
+        if parts.scheme == 'http' and _proxy(*key[:2]) is not None:
+            target = url
+
+        while True:
+            (connection, reused) = self._acquire(key)
+            try:
+                connection.request('GET', target, headers=headers)
+                return (key, connection, connection.getresponse())
+            except (ConnectionError, http.client.BadStatusLine):
+                connection.close()
+                if not reused:
+                    raise
+            except BaseException:
+                connection.close()
+                raise
+
+    def _acquire(
+            self, key: Tuple[str, str, int]
+    ) -> Tuple[http.client.HTTPConnection, bool]:
+        """Takes an idle connection from the pool, or opens a new one.
+
+        :param key: The tuple ``(scheme, host, port)``.
+
+        :return: the tuple ``(connection, reused)``
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return (idle.pop(), True)
+
+        (scheme, host, port) = key
+        proxy = _proxy(scheme, host)
+        if scheme == 'https':
+            if self._context is None:
+                self._context = ssl.create_default_context()
+            if proxy is not None:
+                connection = http.client.HTTPSConnection(
+                    proxy.hostname, proxy.port or 80,
+                    timeout=self._timeout, context=self._context)
+                connection.set_tunnel(host, port)
+            else:
+                connection = http.client.HTTPSConnection(
+                    host, port, timeout=self._timeout, context=self._context)
+        elif proxy is not None:
+            connection = http.client.HTTPConnection(
+                proxy.hostname, proxy.port or 80, timeout=self._timeout)
+        else:
+            connection = http.client.HTTPConnection(
+                host, port, timeout=self._timeout)
+        return (connection, False)
+
+    def _release(
+            self, key: Tuple[str, str, int],
+            connection: http.client.HTTPConnection,
+            response: http.client.HTTPResponse):
+        """Returns a connection to the pool once its response has been read.
+
+        Any unread body is discarded; a connection that the server will close
+        is closed instead.
+
+        :param key: The tuple ``(scheme, host, port)``.
+
+        :param connection: The connection.
+
+        :param response: The last response received on the connection.
+        """
+        try:
+            while response.read(BLOCK_SIZE):
+                pass
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            return
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                self._idle.setdefault(key, []).append(connection)
+
+
+def reporter(
+        label: str, interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic) -> ProgressCallback:
+    """Creates a progress callback printing the state of a transfer.
+
+    A line is printed at most once every ``interval`` seconds, and when the
+    transfer completes.
+
+    :param label: A description of the transfer.
+
+    :param interval: The minimum time, in seconds, between lines.
+
+    :param clock: The source of time.
+
+    :return: a progress callback
+    """
+    last = [None]
+
+    def progress(received: int, total: Optional[int]):
+        now = clock()
+        done = total is not None and received >= total
+        if not done and last[0] is not None and now - last[0] < interval:
+            return
+        last[0] = now
+        if total:
+            print('{}: {:.1f} of {:.1f} MiB ({}%)'.format(
+                label, received / 2 ** 20, total / 2 ** 20,
+                received * 100 // total))
+        else:
+            print('{}: {:.1f} MiB'.format(label, received / 2 ** 20))
+
+    return progress
+
+
+def _receive(
+        response: http.client.HTTPResponse, target: str, offset: int,
+        headers: Dict[str, str],
+        progress: Optional[ProgressCallback]) -> str:
+    """Writes a response body to a file while hashing it.
+
+    The validator of the resource is recorded while the transfer is in
+    progress, so that an interrupted transfer can be resumed.
+
+    :param response: The response.
+
+    :param target: The target file name.
+
+    :param offset: The number of bytes of ``target`` that the body follows, or
+        ``0`` to overwrite the file.
+
+    :param headers: The response headers.
+
+    :param progress: A callback invoked as data is received.
+
+    :return: the hash of the content of ``target``
+
+    :raises http.client.IncompleteRead: if the body is shorter than announced
+    """
+    h = hashlib.new(HASH)
+    total = _total(headers, offset)
+    with open(target, 'r+b' if offset else 'wb') as f:
+        if offset:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                h.update(block)
+            f.truncate(offset)
+        _save_validator(
+            target, headers.get('etag') or headers.get('last-modified'))
+        received = offset
+        if progress is not None:
+            progress(received, total)
+        for block in iter(lambda: response.read(BLOCK_SIZE), b''):
+            f.write(block)
+            h.update(block)
+            received += len(block)
+            if progress is not None:
+                progress(received, total)
+    if total is not None and received < total:
+        raise http.client.IncompleteRead(b'', total - received)
+    _save_validator(target, None)
+    return h.hexdigest()
+
+
+def _proxy(
+        scheme: str, host: str) -> Optional[urllib.parse.SplitResult]:
+    """Determines the proxy to use for a host, as configured in the
+    environment.
+
+    :param scheme: The URL scheme.
+
+    :param host: The host name.
+
+    :return: the parsed proxy URL, or ``None`` if no proxy is used
+    """
+    proxy = urllib.request.getproxies().get(scheme)
+    if proxy is None or urllib.request.proxy_bypass(host):
+        return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    return urllib.parse.urlsplit(proxy)
+
+
+def _range_start(headers: Dict[str, str]) -> Optional[int]:
+    """Reads the first byte position of a partial response.
+
+    :param headers: The response headers.
+
+    :return: the position, or ``None`` if unknown
+    """
+    try:
+        (unit, spec) = headers['content-range'].split(' ', 1)
+        return int(spec.split('-', 1)[0]) if unit == 'bytes' else None
+    except (KeyError, ValueError):
+        return None
+
+
+def _total(headers: Dict[str, str], offset: int) -> Optional[int]:
+    """Calculates the total size of a resource.
+
+    :param headers: The response headers.
+
+    :param offset: The size of the partial content already received.
+
+    :return: the size, or ``None`` if unknown
+    """
+    try:
+        return offset + int(headers['content-length'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _validator(target: str) -> Optional[str]:
+    """Reads the validator of a partial download.
+
+    :param target: The target file name.
+
+    :return: the validator to send in an ``If-Range`` header, or ``None`` if
+        the partial file cannot be resumed
+    """
+    try:
+        if os.path.getsize(target) == 0:
+            return None
+        with open(target + VALIDATOR_SUFFIX, encoding='utf-8') as f:
+            return json.load(f)['validator']
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _resumable(target: str) -> bool:
+    """Determines whether a partial download can be resumed.
+
+    :param target: The target file name.
+
+    :return: whether a validator is recorded for a non-empty partial file
+    """
+    return _validator(target) is not None
+
+
+def _save_validator(target: str, validator: Optional[str]):
+    """Records, or removes, the validator of a partial download.
+
+    :param target: The target file name.
+
+    :param validator: The validator, or ``None`` to remove it.
+    """
+    filename = target + VALIDATOR_SUFFIX
+    try:
+        if validator is None:
+            os.unlink(filename)
+        else:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump({'validator': validator}, f)
+    except OSError:
+        pass
+
+
+def _discard(target: str):
+    """Removes a partial download.
+
+    :param target: The target file name.
+    """
+    _save_validator(target, None)
+    try:
+        os.unlink(target)
+    except OSError:
+        pass
+
+
+#: The default connection pool.
+POOL = Pool()
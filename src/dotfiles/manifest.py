@@ -0,0 +1,147 @@
+"""
+The file manifest
+-----------------
+
+This module contains :class:`Manifest`, a persistent record of the state of
+copied files.
+
+For every target file known to be identical to its source, the manifest stores
+the size, modification time and inode of both files, as well as a hash of the
+content. As long as neither file has been touched, the files can be considered
+identical without reading them.
+"""
+import hashlib
+import os
+import threading
+
+from typing import Optional, Sequence
+
+from . import state
+
+
+#: The hash algorithm used for file content.
+HASH = 'sha256'
+
+
+class Manifest:
+    def __init__(self, filename: str):
+        """Initialises a manifest.
+
+        If ``filename`` cannot be read, the manifest starts out empty.
+
+        A manifest may be used concurrently from several threads.
+
+        :param filename: The file used to persist the manifest.
+        """
+        self._filename = filename
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = state.load(filename)
+
+    def unchanged(self, source: str, target: str) -> bool:
+        """Determines whether a target file is known to be identical to its
+        source.
+
+        If only the source file has been touched since the entry was recorded,
+        its content is hashed and compared with the recorded hash; the target
+        file is never read.
+
+        :param source: The absolute path of the source file.
+
+        :param target: The absolute path of the target file.
+
+        :return: whether the files are known to be identical
+        """
+        entry = self._entries.get(target)
+        if entry is None or entry.get('source_path') != source:
+            return False
+        try:
+            sstamp = stamp(os.stat(source))
+            tstamp = stamp(os.lstat(target))
+        except OSError:
+            return False
+
+        if tstamp != entry['target']:
+            return False
+        elif sstamp == entry['source']:
+            return True
+        elif sstamp[0] != tstamp[0] or entry['hash'] is None:
+            return False
+        elif digest(source) == entry['hash']:
+            self.record(source, target, entry['hash'])
+            return True
+        else:
+            return False
+
+    def record(
+            self, source: str, target: str,
+            content_hash: Optional[str] = None):
+        """Records that a target file is identical to its source.
+
+        :param source: The absolute path of the source file.
+
+        :param target: The absolute path of the target file.
+
+        :param content_hash: The hash of the content of the files, as returned
+            by :func:`digest`. If this is not known, the entry is only valid as
+            long as neither file is touched.
+        """
+        try:
+            entry = {
+                'source_path': source,
+                'source': stamp(os.stat(source)),
+                'target': stamp(os.lstat(target)),
+                'hash': content_hash}
+        except OSError:
+            return self.forget(target)
+        with self._lock:
+            self._entries[target] = entry
+            self._dirty = True
+
+    def forget(self, target: str):
+        """Removes the entry for a target file.
+
+        :param target: The absolute path of the target file.
+        """
+        with self._lock:
+            if self._entries.pop(target, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        """Writes the manifest to disk if it has been modified.
+
+        The file is replaced atomically. Failing to write the manifest is not an
+        error; it only means that files will be compared again on the next run.
+        """
+        with self._lock:
+            if self._dirty and state.save(self._filename, self._entries):
+                self._dirty = False
+
+
+def stamp(st: os.stat_result) -> Sequence[int]:
+    """Generates the part of a stat result used to detect file modifications.
+
+    :param st: The stat result.
+
+    :return: the list ``[size, mtime_ns, inode]``
+    """
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+def digest(filename: str, data: Optional[bytes] = None) -> str:
+    """Calculates the content hash of a file.
+
+    :param filename: The file to hash.
+
+    :param data: The content of the file, if already read.
+
+    :return: a hex digest
+    """
+    if data is not None:
+        return hashlib.new(HASH, data).hexdigest()
+    else:
+        h = hashlib.new(HASH)
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                h.update(block)
+        return h.hexdigest()
@@ -0,0 +1,155 @@
+"""
+File patterns
+-------------
+
+This module contains :class:`Matcher`, a collection of file patterns compiled
+into a single regular expression.
+
+Two kinds of patterns are supported:
+
+1. **Globs**, as understood by :func:`fnmatch.fnmatch`. These are matched
+   against the full relative path, and ``*`` matches any character, including
+   ``/``.
+2. **Git ignore rules**, as understood by ``.gitignore`` files. A rule without
+   a ``/`` other than a trailing one matches at any depth, while other rules
+   are anchored at the root. ``*`` does not match ``/``, but ``**`` does.
+   Negated rules, starting with ``!``, are not supported.
+
+Globs without wildcards, and globs matching everything under a literal
+directory, such as ``.local/lib/*``, are indexed separately. They are matched
+with set lookups, and allow entire directories to be skipped using
+:meth:`Matcher.prunes`.
+"""
+import fnmatch
+import re
+
+from typing import Iterable
+
+
+#: The regular expression matching globs that match everything under a literal
+#: directory.
+SUBTREE_RE = re.compile(r'^([^*?[]+)/\*+$')
+
+#: The characters with special meaning in globs.
+MAGIC = '*?['
+
+
+class Matcher:
+    def __init__(self, globs: Iterable[str] = (), rules: Iterable[str] = ()):
+        """Compiles a matcher.
+
+        :param globs: Glob patterns.
+
+        :param rules: Git ignore rules.
+        """
+        self._literals = set()
+        self._subtrees = set()
+        expressions = []
+        for glob in globs:
+            m = SUBTREE_RE.match(glob)
+            if m:
+                self._subtrees.add(m.group(1))
+            elif not any(c in glob for c in MAGIC):
+                self._literals.add(glob)
+            else:
+                expressions.append(fnmatch.translate(glob))
+        expressions.extend(gitignore(rule) for rule in rules)
+        self._regex = re.compile('|'.join(
+            '(?:{})'.format(expression)
+            for expression in expressions)) if expressions else None
+
+    def __bool__(self) -> bool:
+        return bool(self._regex or self._literals or self._subtrees)
+
+    def match(self, path: str) -> bool:
+        """Determines whether a path is matched by any pattern.
+
+        :param path: The path to match, relative to the root.
+
+        :return: whether the path is matched
+        """
+        if path in self._literals or self._in_subtree(path):
+            return True
+        else:
+            return self._regex is not None \
+                and self._regex.match(path) is not None
+
+    def prunes(self, directory: str) -> bool:
+        """Determines whether all paths under a directory are matched.
+
+        Only globs matching everything under a literal directory are taken into
+        account, so this method may return ``False`` even if all paths are in
+        fact matched.
+
+        :param directory: The directory, relative to the root.
+
+        :return: whether all paths under the directory are known to be matched
+        """
+        directory = directory.rstrip('/')
+        return directory in self._subtrees or self._in_subtree(directory)
+
+    def _in_subtree(self, path: str) -> bool:
+        """Determines whether any parent directory of a path is in the subtree
+        index.
+
+        :param path: The path to check, relative to the root.
+
+        :return: whether the path is under an indexed subtree
+        """
+        if not self._subtrees:
+            return False
+        i = path.find('/')
+        while i >= 0:
+            if path[:i] in self._subtrees:
+                return True
+            i = path.find('/', i + 1)
+        return False
+
+
+def gitignore(rule: str) -> str:
+    """Translates a git ignore rule to a regular expression.
+
+    The returned expression matches paths relative to the root without leading
+    or trailing ``/``. Since trailing ``/`` is removed, rules intended to match
+    only directories also match files.
+
+    :param rule: The rule to translate.
+
+    :return: a regular expression
+    """
+    if rule.startswith('!'):
+        raise ValueError('negated rules are not supported: {}'.format(rule))
+    rule = rule.strip().rstrip('/')
+    anchored = '/' in rule
+    rule = rule.lstrip('/')
+
+    i, n = 0, len(rule)
+    result = ''
+    while i < n:
+        if rule.startswith('**/', i):
+            result += '(?:.*/)?'
+            i += 3
+        elif rule.startswith('/**', i) and i + 3 == n:
+            result += '/.*'
+            i += 3
+        elif rule.startswith('**', i):
+            result += '.*'
+            i += 2
+        elif rule[i] == '*':
+            result += '[^/]*'
+            i += 1
+        elif rule[i] == '?':
+            result += '[^/]'
+            i += 1
+        elif rule[i] == '[' and rule.find(']', i + 2) > 0:
+            end = rule.find(']', i + 2)
+            chars = rule[i + 1:end]
+            if chars[0] == '!':
+                chars = '^' + chars[1:]
+            result += '[{}]'.format(chars.replace('\\', '\\\\'))
+            i = end + 1
+        else:
+            result += re.escape(rule[i])
+            i += 1
+
+    return '{}{}\\Z'.format('' if anchored else '(?:.*/)?', result)
@@ -0,0 +1,117 @@
+"""
+Installation plans
+------------------
+
+This module contains :class:`Plan`, a precomputed list of the operations
+required to bring the home directory up to date.
+
+A plan records the commit it was computed for and fingerprints of all files it
+will touch. Before a plan is applied, these are compared with the current
+state, and the plan is rejected if anything has changed.
+"""
+import os
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import state
+from .manifest import stamp
+
+
+class Plan:
+    def __init__(
+            self, commit: str, copy_method: str,
+            files: Sequence[str] = (),
+            features: Sequence[str] = (),
+            stale: Sequence[Tuple[str, str]] = (),
+            fingerprints: Optional[Dict[str, Optional[List[int]]]] = None):
+        """Initialises a plan.
+
+        :param commit: The commit for which the plan was computed.
+
+        :param copy_method: The value of the copy method used to copy files.
+
+        :param files: The files to copy, relative to the source directory.
+
+        :param features: The names of the features to install.
+
+        :param stale: The stale files to remove, as the tuples ``(target,
+            reason)``.
+
+        :param fingerprints: Fingerprints of the files touched by the plan.
+        """
+        self.commit = commit
+        self.copy_method = copy_method
+        self.files = list(files)
+        self.features = list(features)
+        self.stale = [tuple(item) for item in stale]
+        self.fingerprints = dict(fingerprints or {})
+
+    @classmethod
+    def load(cls, filename: str) -> 'Plan':
+        """Loads a plan from a file.
+
+        :param filename: The file to read.
+
+        :return: a plan
+
+        :raises ValueError: if the file does not contain a plan
+        """
+        data = state.load(filename)
+        try:
+            return cls(**data)
+        except TypeError:
+            raise ValueError('{} does not contain a plan'.format(filename))
+
+    def save(self, filename: str):
+        """Saves this plan to a file.
+
+        :param filename: The file to write.
+
+        :raises OSError: if the file cannot be written
+        """
+        if not state.save(filename, {
+                'commit': self.commit,
+                'copy_method': self.copy_method,
+                'files': self.files,
+                'features': self.features,
+                'stale': self.stale,
+                'fingerprints': self.fingerprints}):
+            raise OSError('failed to write {}'.format(filename))
+
+    def fingerprint(self, path: str):
+        """Records the current state of a file touched by this plan.
+
+        :param path: The absolute path of the file.
+        """
+        self.fingerprints[path] = _fingerprint(path)
+
+    def invalid(self, commit: str) -> Optional[str]:
+        """Determines whether this plan can no longer be applied.
+
+        :param commit: The current commit.
+
+        :return: a description of why the plan is invalid, or ``None`` if it is
+            still valid
+        """
+        if commit != self.commit:
+            return 'the plan was computed for commit {}'.format(self.commit)
+        for (path, fingerprint) in sorted(self.fingerprints.items()):
+            if _fingerprint(path) != fingerprint:
+                return '{} has been modified'.format(path)
+        return None
+
+
+def _fingerprint(path: str) -> Optional[List[int]]:
+    """Generates a fingerprint for a file.
+
+    Links are not followed.
+
+    :param path: The absolute path of the file.
+
+    :return: a fingerprint, or ``None`` if the file does not exist
+    """
+    try:
+        st = os.lstat(path)
+        return [st.st_mode] + stamp(st)
+    except OSError:
+        return None
@@ -53,7 +53,7 @@ class Version:
             raise ValueError(s)
 
     def __str__(self):
-        return '.'.join(self._version)
+        return '.'.join(str(p) for p in self._version)
 
     def __eq__(self, o):
         return str(self) == str(o)
@@ -0,0 +1,116 @@
+"""
+The installed file registry
+---------------------------
+
+This module contains :class:`Registry`, a persistent record of all links and
+copies installed into the target directory.
+
+The registry allows stale files to be found without scanning the entire target
+directory.
+"""
+import os
+import threading
+
+from typing import Sequence, Tuple
+
+from . import state
+
+
+class Registry:
+    def __init__(self, filename: str):
+        """Initialises a registry.
+
+        If ``filename`` cannot be read, the registry starts out empty.
+
+        A registry may be used concurrently from several threads.
+
+        :param filename: The file used to persist the registry.
+        """
+        self._filename = filename
+        self._lock = threading.Lock()
+        self._dirty = False
+        data = state.load(filename)
+        self._scanned = data.get('scanned', False)
+        self._entries = data.get('files', {})
+
+    @property
+    def scanned(self) -> bool:
+        """Whether the target directory has been scanned for installed files.
+
+        Files installed before the registry was created are only known once a
+        scan has been made.
+        """
+        return self._scanned
+
+    @scanned.setter
+    def scanned(self, value: bool):
+        with self._lock:
+            self._dirty = self._dirty or value != self._scanned
+            self._scanned = value
+
+    def add(self, target: str, source: str, link: bool):
+        """Registers an installed file.
+
+        :param target: The absolute path of the installed file.
+
+        :param source: The absolute path of the source file.
+
+        :param link: Whether the installed file is a symlink to the source
+            file, rather than a copy of it.
+        """
+        entry = {'source': source, 'link': link}
+        with self._lock:
+            if self._entries.get(target) != entry:
+                self._entries[target] = entry
+                self._dirty = True
+
+    def forget(self, target: str):
+        """Removes an installed file from the registry.
+
+        :param target: The absolute path of the installed file.
+        """
+        with self._lock:
+            if self._entries.pop(target, None) is not None:
+                self._dirty = True
+
+    def items(self) -> Sequence[Tuple[str, str]]:
+        """Lists all registered files.
+
+        :return: a sorted list of tuples ``(target, source)``
+        """
+        with self._lock:
+            return sorted(
+                (target, entry['source'])
+                for (target, entry) in self._entries.items())
+
+    def owns(self, target: str) -> bool:
+        """Determines whether a registered file is still the one that was
+        installed.
+
+        A link is owned if it still points to its source, and a copy if it is
+        still a regular file.
+
+        :param target: The absolute path of the installed file.
+
+        :return: whether the file is registered and still installed
+        """
+        with self._lock:
+            entry = self._entries.get(target)
+        if entry is None:
+            return False
+        elif entry['link']:
+            try:
+                return os.readlink(target) == entry['source']
+            except OSError:
+                return False
+        else:
+            return os.path.isfile(target) and not os.path.islink(target)
+
+    def save(self):
+        """Writes the registry to disk if it has been modified.
+        """
+        with self._lock:
+            if self._dirty and state.save(self._filename, {
+                    'scanned': self._scanned,
+                    'files': self._entries}):
+                self._dirty = False
@@ -0,0 +1,56 @@
+"""
+Persistent state
+----------------
+
+This module contains helpers to persist state between runs.
+
+State is stored as JSON in files next to the tracker file in the git directory.
+Failing to read or write state is never an error: missing state only means that
+more work has to be done on the next run.
+"""
+import json
+import os
+
+from typing import Any, Dict
+
+
+def load(filename: str) -> Dict[str, Any]:
+    """Loads state from a file.
+
+    :param filename: The file to read.
+
+    :return: the stored mapping, or an empty mapping if the file cannot be read
+    """
+    try:
+        with open(filename, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return data
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def save(filename: str, data: Dict[str, Any]) -> bool:
+    """Saves state to a file.
+
+    The file is replaced atomically.
+
+    :param filename: The file to write.
+
+    :param data: The mapping to store.
+
+    :return: whether the file was written
+    """
+    temporary = '{}.{}'.format(filename, os.getpid())
+    try:
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temporary, filename)
+        return True
+    except OSError:
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+        return False
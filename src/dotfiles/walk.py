@@ -0,0 +1,69 @@
+"""
+Directory walking
+-----------------
+
+This module contains functions to walk large directory trees using as few
+system calls as possible.
+
+Directories are listed with :func:`os.scandir`, and the file type reported by
+the directory listing is used whenever possible, so no additional ``stat`` calls
+are made for most entries.
+"""
+import os
+
+from typing import Generator, Tuple
+
+from .patterns import Matcher
+
+
+def files(
+        directory: str, pruned: Matcher
+) -> Generator[os.DirEntry, None, None]:
+    """Generates all non-directory entries under a directory.
+
+    Symlinks to directories are not followed, and are generated like any other
+    file.
+
+    :param directory: The root directory.
+
+    :param pruned: A matcher for directories, relative to ``directory``, whose
+        content should not be listed.
+    """
+    stack = ['']
+    while stack:
+        relative = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(directory, relative))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                path = relative + entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    yield entry
+                elif not pruned.match(path):
+                    stack.append(path + '/')
+
+
+def links(
+        directory: str, pruned: Matcher
+) -> Generator[Tuple[str, str], None, None]:
+    """Generates all symlinks under a directory.
+
+    :param directory: The root directory.
+
+    :param pruned: A matcher for directories, relative to ``directory``, whose
+        content should not be listed.
+
+    :return: a generator of the tuples ``(link, target)``
+    """
+    for entry in files(directory, pruned):
+        if entry.is_symlink():
+            try:
+                yield (entry.path, os.readlink(entry.path))
+            except OSError:
+                pass
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from dotfiles import CopyMethod, Manifest
+
+
+class CopyMethodTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, 'source')
+        self.target = os.path.join(self.directory.name, 'target')
+        os.mkdir(self.source)
+        os.mkdir(self.target)
+        self.write(self.source, 'file', 'content')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, directory: str, filename: str, data: str):
+        with open(os.path.join(directory, filename), 'w') as f:
+            f.write(data)
+
+    def changed(self, method: CopyMethod, manifest=None) -> bool:
+        return method.changed(self.source, self.target, 'file', manifest)
+
+    def copy(self, method: CopyMethod, manifest=None):
+        method.copy(self.source, self.target, 'file', manifest)
+
+    def test_link_to_hardlink(self):
+        self.copy(CopyMethod.LINK)
+        self.assertFalse(self.changed(CopyMethod.LINK))
+        self.assertTrue(self.changed(CopyMethod.HARDLINK))
+
+    def test_hardlink(self):
+        self.assertTrue(self.changed(CopyMethod.HARDLINK))
+        self.copy(CopyMethod.HARDLINK)
+        target = os.path.join(self.target, 'file')
+        self.assertFalse(os.path.islink(target))
+        self.assertTrue(os.path.samefile(
+            os.path.join(self.source, 'file'), target))
+        self.assertFalse(self.changed(CopyMethod.HARDLINK))
+        self.assertTrue(self.changed(CopyMethod.LINK))
+
+    def test_reflink(self):
+        manifest = Manifest(os.path.join(self.directory.name, 'manifest'))
+        self.copy(CopyMethod.REFLINK, manifest)
+        target = os.path.join(self.target, 'file')
+        self.assertFalse(os.path.samefile(
+            os.path.join(self.source, 'file'), target))
+        self.assertFalse(self.changed(CopyMethod.REFLINK, manifest))
+        self.write(self.source, 'file', 'modified')
+        self.assertTrue(self.changed(CopyMethod.REFLINK, manifest))
+
+    def test_copy_modified(self):
+        self.copy(CopyMethod.COPY)
+        self.assertFalse(self.changed(CopyMethod.COPY))
+        self.write(self.target, 'file', 'other!!')
+        self.assertTrue(self.changed(CopyMethod.COPY))
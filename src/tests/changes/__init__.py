@@ -0,0 +1,77 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from dotfiles import changes
+
+
+class BetweenTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        self.git('init', '--quiet')
+        self.write('home/a')
+        self.write('home/b')
+        self.write('configuration.conf')
+        self.previous = self.commit()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def git(self, *args: str) -> str:
+        return subprocess.check_output(
+            (
+                'git', '-C', self.root,
+                '-c', 'user.name=test', '-c', 'user.email=test@example.com')
+            + args).decode('utf-8')
+
+    def write(self, filename: str, data: str = ''):
+        path = os.path.join(self.root, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def commit(self) -> str:
+        self.git('add', '--all')
+        self.git('commit', '--quiet', '--allow-empty', '--message', 'commit')
+        return changes.head(self.root)
+
+    def between(self):
+        return changes.between(
+            self.root, self.previous, 'home', ('configuration.conf',))
+
+    def test_unchanged(self):
+        self.assertEqual((set(), set()), self.between())
+
+    def test_changes(self):
+        self.write('home/a', 'modified')
+        self.write('home/new file\nwith newline')
+        os.unlink(os.path.join(self.root, 'home', 'b'))
+        self.write('other')
+        self.commit()
+        self.assertEqual(
+            ({'a', 'new file\nwith newline'}, {'b'}),
+            self.between())
+
+    def test_dependency_changed(self):
+        self.write('configuration.conf', 'modified')
+        self.commit()
+        self.assertIsNone(self.between())
+
+    def test_dirty(self):
+        self.write('home/a', 'modified')
+        self.assertIsNone(self.between())
+
+    def test_dirty_elsewhere(self):
+        self.write('other')
+        self.assertEqual((set(), set()), self.between())
+
+    def test_unknown_commit(self):
+        self.previous = '0' * 40
+        self.assertIsNone(self.between())
+
+    def test_not_repository(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(changes.between(directory, 'HEAD', 'home'))
+            self.assertIsNone(changes.head(directory))
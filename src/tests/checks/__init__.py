@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from dotfiles.checks import Checks
+from dotfiles.features.configuration import Configuration
+
+
+class ChecksTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'checks')
+        self.watched = os.path.join(self.directory.name, 'watched')
+        with open(self.watched, 'w') as f:
+            f.write('1')
+        self.configuration = Configuration(distribution='test')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def checks(self, ttl=60, recheck=False, **values):
+        return Checks(
+            self.filename,
+            Configuration(**values) if values else self.configuration,
+            ttl,
+            recheck)
+
+    def record(self):
+        checks = self.checks()
+        checks.record('feature', [self.watched])
+        checks.save()
+
+    def test_unknown(self):
+        self.assertFalse(self.checks().present('feature', []))
+
+    def test_recorded(self):
+        self.record()
+        self.assertTrue(self.checks().present('feature', [self.watched]))
+
+    def test_watched_modified(self):
+        self.record()
+        with open(self.watched, 'w') as f:
+            f.write('22')
+        self.assertFalse(self.checks().present('feature', [self.watched]))
+
+    def test_recorded_watched(self):
+        self.record()
+        self.assertTrue(self.checks().present('feature'))
+        with open(self.watched, 'w') as f:
+            f.write('22')
+        self.assertFalse(self.checks().present('feature'))
+
+    def test_watched_changed(self):
+        self.record()
+        self.assertFalse(self.checks().present('feature', []))
+
+    def test_expired(self):
+        self.record()
+        self.assertFalse(self.checks(ttl=0).present(
+            'feature', [self.watched]))
+
+    def test_configuration_changed(self):
+        self.record()
+        self.assertFalse(self.checks(distribution='other').present(
+            'feature', [self.watched]))
+
+    def test_recheck(self):
+        self.record()
+        self.assertFalse(self.checks(recheck=True).present(
+            'feature', [self.watched]))
+
+    def test_forget(self):
+        self.record()
+        checks = self.checks()
+        checks.forget('feature')
+        checks.save()
+        self.assertFalse(self.checks().present('feature', [self.watched]))
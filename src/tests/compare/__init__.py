@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from dotfiles import compare
+
+
+class CompareTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name: str, data: bytes) -> str:
+        """Writes a file to the temporary directory.
+
+        :param name: The file name.
+
+        :param data: The file content.
+
+        :return: the full path of the file
+        """
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_identical(self):
+        data = os.urandom(compare.BLOCK_SIZE * 3 + 1)
+        self.assertIsNotNone(compare.identical(
+            self.write('a', data),
+            self.write('b', data)))
+
+    def test_different_last_block(self):
+        data = os.urandom(compare.BLOCK_SIZE * 3 + 1)
+        self.assertIsNone(compare.identical(
+            self.write('a', data),
+            self.write('b', data[:-1] + bytes([data[-1] ^ 1]))))
+
+    def test_is_binary(self):
+        self.assertTrue(compare.is_binary(self.write('a', b'text\0')))
+        self.assertTrue(compare.is_binary(self.write('b', b'\xff\xfe text')))
+        self.assertFalse(compare.is_binary(self.write('c', 'åäö'.encode())))
+
+    def test_diff_text(self):
+        self.assertEqual(
+            ['-a', '+b'],
+            [
+                line
+                for line in compare.diff(
+                    self.write('a', b'a\n'),
+                    self.write('b', b'b\n'))
+                if line[:1] in '+-' and line[:3] not in ('---', '+++')])
+
+    def test_diff_binary(self):
+        lines = list(compare.diff(
+            self.write('a', b'\0a\n'),
+            self.write('b', b'\0b\n')))
+        self.assertEqual(2, len(lines))
+        self.assertIn('3 bytes', lines[0])
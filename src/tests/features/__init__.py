@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import io
+import unittest
+
+from dotfiles.features import FEATURES, CommandFailed, Feature, FeatureList
+
+
+class Stub:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class FeatureListTest(unittest.TestCase):
+    def test_list(self):
+        features = FeatureList()
+        a, b = Stub('a'), Stub('b')
+        features.append(a)
+        features.insert(0, b)
+        self.assertEqual([b, a], list(features))
+        self.assertIs(a, features.get('a'))
+        features.remove(a)
+        self.assertIsNone(features.get('a'))
+
+    def test_duplicate(self):
+        features = FeatureList()
+        features.append(Stub('a'))
+        with self.assertRaises(RuntimeError):
+            features.append(Stub('a'))
+
+    def test_generation(self):
+        features = FeatureList()
+        generation = features.generation
+        features.append(Stub('a'))
+        self.assertNotEqual(generation, features.generation)
+        generation = features.generation
+        features.invalidate()
+        self.assertNotEqual(generation, features.generation)
+
+    def test_resolve(self):
+        features = FeatureList()
+        a, b = Stub('a'), Stub('b')
+        features.append(a)
+        features.append(b)
+        self.assertEqual([b, a], features.resolve(a, ['b', 'a']))
+        with self.assertRaises(RuntimeError) as e:
+            features.resolve(a, ['b', 'c'])
+        self.assertIn('unmet dependencies: c', str(e.exception))
+
+
+class RunAsyncTest(unittest.TestCase):
+    def run_async(self, *args, **kwargs):
+        return asyncio.run(Feature.run_async(
+            Stub('stub'), *args, interactive=False, **kwargs))
+
+    def test_capture(self):
+        self.assertEqual(
+            'a b\n',
+            self.run_async('echo', '${value}', 'b', capture=True, value='a'))
+
+    def test_output(self):
+        lines = []
+        self.assertTrue(self.run_async(
+            'sh', '-c', 'echo a; echo b', output=lines.append))
+        self.assertEqual(['a', 'b'], lines)
+
+    def test_check(self):
+        self.assertFalse(self.run_async('false', check=True))
+
+    def test_failure(self):
+        with self.assertRaises(CommandFailed) as e:
+            self.run_async('false')
+        self.assertFalse(e.exception.timeout)
+        self.assertEqual(['false'], e.exception.command)
+
+    def test_timeout(self):
+        with self.assertRaises(CommandFailed) as e:
+            self.run_async('sleep', '10', timeout=0.1)
+        self.assertTrue(e.exception.timeout)
+
+
+class RunTest(unittest.TestCase):
+    def setUp(self):
+        self.feature = Feature(lambda env: None, 'run-test', None, set())
+
+    def tearDown(self):
+        FEATURES.remove(self.feature)
+
+    def test_call(self):
+        with self.assertRaises(CommandFailed):
+            self.feature.call('false', interactive=False)
+
+    def test_run(self):
+        with self.assertRaises(SystemExit), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.feature.run('false', interactive=False)
+
+
+class PresentTest(unittest.TestCase):
+    def setUp(self):
+        self.feature = Feature(lambda env: None, 'present-test', None, set())
+        self.checks = 0
+
+        @self.feature.checker
+        def is_installed(env):
+            self.checks += 1
+            return env.run('false', interactive=False)
+
+    def tearDown(self):
+        FEATURES.remove(self.feature)
+
+    def test_failure_reported_once(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for _ in range(2):
+                with self.assertRaises(SystemExit):
+                    self.feature.present
+        self.assertEqual(1, self.checks)
+        self.assertEqual(1, output.getvalue().count('false'))
+
+    def test_reset(self):
+        with contextlib.redirect_stdout(io.StringIO()), \
+                self.assertRaises(SystemExit):
+            self.feature.present
+        self.feature.present = None
+        with contextlib.redirect_stdout(io.StringIO()), \
+                self.assertRaises(SystemExit):
+            self.feature.present
+        self.assertEqual(2, self.checks)
@@ -0,0 +1,66 @@
+import functools
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from dotfiles.features import curl, downloads
+
+
+class FetchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = downloads.Cache(self.directory.name)
+        self.fetch = functools.partial(curl._fetch, curl.main)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_failure(self):
+        with self.assertRaises(downloads.DownloadFailed):
+            self.fetch(
+                'http://127.0.0.1:1/resource',
+                os.path.join(self.directory.name, 'target'),
+                {})
+
+    def test_offline(self):
+        def fetch(url, target, headers):
+            with open(target, 'wb') as f:
+                f.write(b'cached')
+            return (200, {}, None)
+
+        url = 'http://127.0.0.1:1/resource'
+        path = self.cache.get(url, fetch)
+        cache = downloads.Cache(self.directory.name)
+        self.assertEqual(path, cache.get(url, self.fetch))
+
+
+class FetcherTest(unittest.TestCase):
+    class Env:
+        name = 'env'
+
+        def __init__(self, downloader: str = None):
+            self.configuration = {'commands': {}}
+            if downloader is not None:
+                self.configuration['commands']['downloader'] = downloader
+
+    def fetch(self, env, executable: str = '/usr/bin/curl') -> str:
+        calls = []
+        with unittest.mock.patch.object(
+                curl.system, 'executable', lambda *args: executable), \
+                unittest.mock.patch.object(
+                    curl.downloads, 'fetch',
+                    lambda *args: calls.append('builtin')), \
+                unittest.mock.patch.object(
+                    curl, '_fetch', lambda *args: calls.append('curl')):
+            curl.fetcher(env, False)('http://example.com', 'target', {})
+        return calls[0]
+
+    def test_curl(self):
+        self.assertEqual('curl', self.fetch(self.Env()))
+
+    def test_builtin(self):
+        self.assertEqual('builtin', self.fetch(self.Env(curl.BUILTIN)))
+
+    def test_missing(self):
+        self.assertEqual('builtin', self.fetch(self.Env(), None))
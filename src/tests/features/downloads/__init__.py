@@ -0,0 +1,169 @@
+import concurrent.futures
+import functools
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+
+from dotfiles.features import downloads
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.restart()
+        self.requests = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def restart(self):
+        self.cache = downloads.Cache(self.directory.name, 1024)
+
+    def fetcher(self, data: bytes, status: int = 200, etag: str = '"1"'):
+        def fetch(url, target, headers):
+            self.requests.append(headers)
+            if status == 200:
+                with open(target, 'wb') as f:
+                    f.write(data)
+            return (status, {'etag': etag}, None)
+        return fetch
+
+    def read(self, path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        path = self.cache.get('http://host/a', self.fetcher(b'a'))
+        self.assertEqual(b'a', self.read(path))
+        self.assertEqual(sha256(b'a'), os.path.basename(path))
+        self.assertEqual([{}], self.requests)
+
+    def test_pinned(self):
+        self.cache.get('http://host/a', self.fetcher(b'a'))
+        path = self.cache.get(
+            'http://host/b', self.fetcher(b'b'), sha256(b'a'))
+        self.assertEqual(b'a', self.read(path))
+        self.assertEqual(1, len(self.requests))
+
+    def test_revalidated(self):
+        self.cache.get('http://host/a', self.fetcher(b'a'))
+        self.restart()
+        path = self.cache.get('http://host/a', self.fetcher(b'', 304))
+        self.assertEqual(b'a', self.read(path))
+        self.assertEqual({'If-None-Match': '"1"'}, self.requests[-1])
+
+    def test_fresh(self):
+        self.cache.get('http://host/a', self.fetcher(b'a'))
+        path = self.cache.get('http://host/a', self.fetcher(b'b'))
+        self.assertEqual(b'a', self.read(path))
+        self.assertEqual(1, len(self.requests))
+
+    def test_changed(self):
+        self.cache.get('http://host/a', self.fetcher(b'a'))
+        self.restart()
+        path = self.cache.get('http://host/a', self.fetcher(b'b'))
+        self.assertEqual(b'b', self.read(path))
+
+    def test_offline(self):
+        def fail(url, target, headers):
+            raise downloads.DownloadFailed(url)
+
+        self.cache.get('http://host/a', self.fetcher(b'a'))
+        self.restart()
+        path = self.cache.get('http://host/a', fail)
+        self.assertEqual(b'a', self.read(path))
+        with self.assertRaises(downloads.DownloadFailed):
+            self.cache.get('http://host/b', fail)
+
+    def test_mismatch(self):
+        with self.assertRaises(downloads.DownloadFailed):
+            self.cache.get(
+                'http://host/a', self.fetcher(b'a'), sha256(b'b'))
+        for name in ('blobs', 'urls'):
+            self.assertEqual(
+                [], os.listdir(os.path.join(self.directory.name, name)))
+
+    def test_evict(self):
+        first = self.cache.get('http://host/a', self.fetcher(b'a' * 600))
+        os.utime(first, (0, 0))
+        second = self.cache.get('http://host/b', self.fetcher(b'b' * 600))
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+
+
+class Handler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class PrefetchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, 'root')
+        os.mkdir(self.root)
+        for name in ('a', 'b'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(name.encode() * 100)
+        self.server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0),
+            functools.partial(Handler, directory=self.root))
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,)).start()
+        self.cache = downloads.Cache(
+            os.path.join(self.directory.name, 'cache'))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def url(self, name: str) -> str:
+        return 'http://127.0.0.1:{}/{}'.format(
+            self.server.server_address[1], name)
+
+    def prefetch(self, *artifacts):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            return [
+                future.result()
+                for future in downloads.prefetch(
+                    artifacts, executor, cache=self.cache)]
+
+    def test_prefetch(self):
+        def fail(url, target, headers):
+            raise AssertionError(url)
+
+        (a, b, missing) = self.prefetch(
+            (self.url('a'), None),
+            (self.url('b'), sha256(b'b' * 100)),
+            (self.url('missing'), None))
+        with open(a, 'rb') as f:
+            self.assertEqual(b'a' * 100, f.read())
+        with open(b, 'rb') as f:
+            self.assertEqual(b'b' * 100, f.read())
+        self.assertIsNone(missing)
+        self.assertEqual(a, self.cache.get(self.url('a'), fail))
+
+    def test_duplicates(self):
+        self.assertEqual(
+            1,
+            len(self.prefetch((self.url('a'), None), (self.url('a'), None))))
+
+    def test_revalidate(self):
+        self.prefetch((self.url('a'), None))
+        cache = downloads.Cache(os.path.join(self.directory.name, 'cache'))
+        statuses = []
+
+        def fetch(url, target, headers):
+            result = downloads.fetch(url, target, headers)
+            statuses.append(result[0])
+            return result
+
+        cache.get(self.url('a'), fetch)
+        self.assertEqual([downloads.NOT_MODIFIED], statuses)
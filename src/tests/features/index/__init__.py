@@ -0,0 +1,149 @@
+import os
+import tempfile
+import textwrap
+import unittest
+import unittest.mock
+
+from dotfiles.features import index
+
+
+class ParseTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def parse(self, source: str, module: str = 'module'):
+        path = os.path.join(self.directory.name, module + '.py')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(textwrap.dedent(source))
+        return index.parse(path, module)
+
+    def test_decorator(self):
+        self.assertEqual(
+            {
+                'dynamic': False,
+                'main': 'module',
+                'features': [{
+                    'name': 'module',
+                    'description': 'A description',
+                    'dependencies': [['module', 'curl'], ['feature', 'x']],
+                    'hooks': ['completer']}]},
+            self.parse('''
+                from . import Feature, curl, feature
+
+                DESCRIPTION = 'A description'
+
+                @feature(DESCRIPTION, {curl, 'x'})
+                def main(env: Feature):
+                    pass
+
+                @main.checker
+                def is_installed(env: Feature):
+                    return True
+
+                @main.completer
+                def complete(env: Feature):
+                    pass
+            '''))
+
+    def test_factory(self):
+        self.assertEqual(
+            {
+                'dynamic': False,
+                'main': 'module',
+                'features': [
+                    {
+                        'name': 'module',
+                        'description': 'module',
+                        'dependencies': [],
+                        'hooks': []},
+                    {
+                        'name': 'component',
+                        'description': 'A component',
+                        'dependencies': [
+                            ['module', 'rust'], ['module', 'other']],
+                        'hooks': []}]},
+            self.parse('''
+                from . import other, rust, system
+
+                main = system.package(__name__.rsplit('.')[-1])
+                component = rust.component('component', 'A component', other)
+            '''))
+
+    def test_dynamic(self):
+        self.assertTrue(self.parse('''
+            from . import FEATURES, system
+
+            if FEATURES:
+                main = system.package('a')
+            else:
+                main = system.package('b')
+        ''')['dynamic'])
+
+    def test_unknown_helper(self):
+        self.assertTrue(self.parse('''
+            from . import system
+
+            main = system.unknown('a')
+        ''')['dynamic'])
+
+
+class ResolveTest(unittest.TestCase):
+    def entry(self, main, *dependencies, dynamic=False):
+        return {
+            'dynamic': dynamic,
+            'main': main,
+            'features': [] if dynamic else [{
+                'name': main,
+                'description': None,
+                'dependencies': [list(d) for d in dependencies],
+                'hooks': []}]}
+
+    def test_modules(self):
+        (features, dynamic) = index.resolve({
+            'a': self.entry('a-feature', ('module', 'b')),
+            'b': self.entry('b-feature')})
+        self.assertEqual([], dynamic)
+        self.assertEqual(
+            ['b-feature'],
+            features[0]['dependencies'])
+
+    def test_dynamic_propagates(self):
+        (features, dynamic) = index.resolve({
+            'a': self.entry('a', ('module', 'b')),
+            'b': self.entry('b', ('module', 'c')),
+            'c': self.entry(None, dynamic=True),
+            'd': self.entry('d')})
+        self.assertEqual(['a', 'b', 'c'], dynamic)
+        self.assertEqual(['d'], [feature['name'] for feature in features])
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.modules = os.path.join(self.directory.name, 'features')
+        self.filename = os.path.join(self.directory.name, 'index')
+        os.mkdir(self.modules)
+        with open(os.path.join(self.modules, 'tool.py'), 'w') as f:
+            f.write(textwrap.dedent('''
+                from . import system
+
+                main = system.helper('tool')
+            '''))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def names(self):
+        (features, dynamic) = index.load(self.modules, self.filename)
+        return ([feature['name'] for feature in features], dynamic)
+
+    def test_factories_changed(self):
+        self.assertEqual(([], ['tool']), self.names())
+        factories = dict(index.FACTORIES)
+        factories[('system', 'helper')] = factories[('system', 'package')]
+        with unittest.mock.patch.object(index, 'FACTORIES', factories):
+            self.assertEqual((['tool'], []), self.names())
+        self.assertEqual(([], ['tool']), self.names())
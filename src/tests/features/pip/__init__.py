@@ -0,0 +1,74 @@
+import json
+import unittest
+import unittest.mock
+
+from dotfiles.features import pip
+
+
+class Env:
+    def __init__(self, name: str = 'env', packages=(), succeed: bool = True):
+        self.name = name
+        self.configuration = {'commands': {}}
+        self.packages = list(packages)
+        self.succeed = succeed
+        self.commands = []
+
+    def run(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+        if 'list' in args:
+            return json.dumps([{'name': name} for name in self.packages])
+        elif 'package' in kwargs:
+            self.packages.append(kwargs['package'])
+            return True
+        elif self.succeed:
+            self.packages.extend(kwargs['packages'])
+            return True
+        else:
+            return False
+
+    def listed(self) -> int:
+        return sum(1 for (args, _) in self.commands if 'list' in args)
+
+
+class InventoryTest(unittest.TestCase):
+    def setUp(self):
+        patch = unittest.mock.patch.object(pip, '_INVENTORY', None)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_normalize(self):
+        self.assertEqual('a-b-c', pip.normalize('A_b..C'))
+
+    def test_cached(self):
+        env = Env(packages=['Package_Name'])
+        self.assertTrue(pip.present(env, 'package.name'))
+        self.assertFalse(pip.present(env, 'other'))
+        self.assertEqual(1, env.listed())
+
+    def test_invalidated(self):
+        env = Env()
+        self.assertFalse(pip.present(env, 'package'))
+        pip.install_package(env, 'package')
+        self.assertTrue(pip.present(env, 'package'))
+        self.assertEqual(2, env.listed())
+
+    def test_batch(self):
+        env = Env()
+        pip.install_packages([env, Env('other')])
+        self.assertEqual(
+            [{'env', 'other'}],
+            [
+                set(kwargs['packages'])
+                for (_, kwargs) in env.commands
+                if 'packages' in kwargs])
+        self.assertTrue(pip.present(env, 'other'))
+
+    def test_batch_failure(self):
+        a, b = Env('a', succeed=False), Env('b', succeed=False)
+        pip.install_packages([a, b])
+        self.assertEqual(
+            ['a'],
+            [kwargs['package'] for (_, kwargs) in a.commands[1:]])
+        self.assertEqual(
+            ['b'],
+            [kwargs['package'] for (_, kwargs) in b.commands])
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from dotfiles.features import rust
+
+
+class Env:
+    def __init__(self, name: str = 'env', components=(), succeed=True):
+        self.name = name
+        self.components = list(components)
+        self.succeed = succeed
+        self.commands = []
+
+    def run(self, *args, **kwargs):
+        self.commands.append((args[1:], kwargs))
+        if 'list' in args:
+            return ''.join(
+                '{}\n'.format(component) for component in self.components)
+        elif 'names' in kwargs:
+            if self.succeed:
+                self.components.extend(kwargs['names'])
+            return self.succeed
+        else:
+            self.components.append(args[-1])
+            return True
+
+    def listed(self) -> int:
+        return sum(1 for (args, _) in self.commands if 'list' in args)
+
+
+class InventoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.crates = os.path.join(self.directory.name, '.crates2.json')
+        stack = [
+            unittest.mock.patch.object(rust, 'CRATES', self.crates),
+            unittest.mock.patch.object(rust, '_CRATES', None),
+            unittest.mock.patch.object(rust, '_COMPONENTS', None)]
+        for patch in stack:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, installs):
+        with open(self.crates, 'w') as f:
+            json.dump({'installs': installs}, f)
+
+    def test_crates(self):
+        self.write({
+            'ripgrep 13.0.0 (registry+https://example.com/)': {
+                'bins': ['rg']},
+            'invalid': {}})
+        self.assertEqual({'ripgrep': ('13.0.0', {'rg'})}, rust.crates())
+
+    def test_crates_missing(self):
+        self.assertEqual({}, rust.crates())
+
+    def test_crates_cached(self):
+        self.write({'a 1.0.0 (source)': {'bins': ['a']}})
+        self.assertIn('a', rust.crates())
+        self.write({})
+        self.assertIn('a', rust.crates())
+        rust._invalidate()
+        self.assertEqual({}, rust.crates())
+
+    def test_components(self):
+        components = {'rustfmt', 'rust-src', 'rustc'}
+        env = Env(components=sorted(components))
+        self.assertEqual(components, rust.components(env))
+        self.assertEqual(components, rust.components(env))
+        self.assertEqual(1, env.listed())
+
+    def test_add_components(self):
+        env = Env()
+        rust.add_components([env, Env('clippy')])
+        self.assertEqual({'env', 'clippy'}, rust.components(env))
+        self.assertEqual(
+            [(('component', 'add', '${names}'), ['env', 'clippy'])],
+            [
+                (args, kwargs['names'])
+                for (args, kwargs) in env.commands
+                if 'names' in kwargs])
+
+    def test_add_components_failure(self):
+        a, b = Env('a', succeed=False), Env('b', succeed=False)
+        rust.add_components([a, b])
+        self.assertEqual(
+            [('component', 'add', 'a')],
+            [args for (args, _) in a.commands[1:]])
+        self.assertEqual(
+            [('component', 'add', 'b')],
+            [args for (args, _) in b.commands])
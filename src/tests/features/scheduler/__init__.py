@@ -0,0 +1,139 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from dotfiles.features import Feature, scheduler
+
+
+class Stub:
+    def __init__(self, name: str, *dependencies: 'Stub'):
+        self.name = name
+        self.dependencies = list(dependencies)
+        self.batch = None
+        self._present = None
+
+    def __repr__(self):
+        return self.name
+
+
+class OrderTest(unittest.TestCase):
+    def test_registration_order(self):
+        a, b, c = Stub('a'), Stub('b'), Stub('c')
+        self.assertEqual([a, b, c], scheduler.order([a, b, c]))
+
+    def test_dependencies_first(self):
+        c = Stub('c')
+        b = Stub('b', c)
+        a = Stub('a', b)
+        self.assertEqual([c, b, a], scheduler.order([a, b, c]))
+
+    def test_ordered_unchanged(self):
+        x, y = Stub('x'), Stub('y')
+        a = Stub('a')
+        b = Stub('b', a)
+        c = Stub('c', x, b)
+        features = [x, a, y, b, c]
+        self.assertEqual(features, scheduler.order(features))
+
+    def test_earliest_position(self):
+        d = Stub('d')
+        c = Stub('c', d)
+        a, b = Stub('a', c), Stub('b')
+        self.assertEqual([d, c, a, b], scheduler.order([a, b, c, d]))
+
+    def test_unknown_dependencies(self):
+        a = Stub('a', Stub('x'))
+        self.assertEqual([a], scheduler.order([a]))
+
+    def test_cycle(self):
+        a, b, c = Stub('a'), Stub('b'), Stub('c')
+        a.dependencies.append(b)
+        b.dependencies.append(c)
+        c.dependencies.append(b)
+        with self.assertRaises(RuntimeError) as e:
+            scheduler.order([a, b, c])
+        self.assertIn('b -> c -> b', str(e.exception))
+
+    def test_dependencies(self):
+        c = Stub('c')
+        b = Stub('b', c)
+        a = Stub('a', b, c)
+        self.assertEqual({'b', 'c'}, scheduler.dependencies(a))
+
+
+class RunTest(unittest.TestCase):
+    def test_dependencies_complete_first(self):
+        c = Stub('c')
+        b = Stub('b', c)
+        a = Stub('a', b)
+        completed = []
+        scheduler.run(
+            [a, b, c],
+            lambda feature: lambda: completed.append(feature.name),
+            4)
+        self.assertEqual(['c', 'b', 'a'], completed)
+
+    def test_concurrent(self):
+        barrier = threading.Barrier(2, timeout=5)
+        a, b = Stub('a'), Stub('b')
+        scheduler.run([a, b], lambda feature: barrier.wait, 2)
+
+    def test_non_interactive_overlap(self):
+        # Every command waits for the other to start, so the features only
+        # complete if the commands run at the same time
+        a, b = Stub('a'), Stub('b')
+        with tempfile.TemporaryDirectory() as directory:
+            def start(feature):
+                other = a if feature is b else b
+
+                def work():
+                    asyncio.run(Feature.run_async(
+                        feature,
+                        'sh', '-c', 'touch "$0"; while [ ! -e "$1" ]; do '
+                        'sleep 0.01; done',
+                        os.path.join(directory, feature.name),
+                        os.path.join(directory, other.name),
+                        interactive=False,
+                        timeout=5))
+                return work
+
+            scheduler.run([a, b], start, 2)
+
+    def test_skipped(self):
+        b = Stub('b')
+        a = Stub('a', b)
+        started = []
+
+        def start(feature):
+            started.append(feature.name)
+            return None
+
+        scheduler.run([a, b], start)
+        self.assertEqual(['b', 'a'], started)
+
+    def test_failure(self):
+        b = Stub('b')
+        a = Stub('a', b)
+        started = []
+
+        def start(feature):
+            started.append(feature.name)
+
+            def work():
+                raise ValueError(feature.name)
+            return work
+
+        with self.assertRaises(ValueError):
+            scheduler.run([a, b], start)
+        self.assertEqual(['b'], started)
+
+    def test_batch(self):
+        batches = []
+        c = Stub('c')
+        a, b = Stub('a'), Stub('b', c)
+        for feature in (a, b, c):
+            feature.batch = batches.append
+        scheduler.run([a, b, c], lambda feature: lambda: None)
+        self.assertEqual([[a, c]], batches)
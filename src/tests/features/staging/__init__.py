@@ -0,0 +1,72 @@
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+from dotfiles.features import staging
+
+
+class StagingTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.target = os.path.join(self.directory.name, 'target')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.directory.name, *parts)
+
+    def write(self, path: str, data: bytes):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def archive(self, **files: bytes) -> str:
+        path = self.path('archive.tar.gz')
+        with tarfile.open(path, 'w:gz') as archive:
+            for (name, data) in files.items():
+                info = tarfile.TarInfo('bin/' + name)
+                info.size = len(data)
+                info.mode = 0o755
+                archive.addfile(info, io.BytesIO(data))
+        return path
+
+    def listing(self):
+        self.assertEqual(
+            sorted(
+                name
+                for name in os.listdir(self.directory.name)
+                if not name.startswith('.')),
+            sorted(os.listdir(self.directory.name)))
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.directory.name)
+            for (root, _, names) in os.walk(self.directory.name)
+            for name in names)
+
+    def test_extract(self):
+        os.mkdir(self.target)
+        self.write(self.path('target', 'old'), b'old')
+        staging.extract(self.archive(a=b'a', b=b'b'), self.target)
+        self.assertEqual(
+            ['archive.tar.gz', 'target/bin/a', 'target/bin/b'],
+            self.listing())
+        self.assertTrue(os.access(self.path('target', 'bin', 'a'), os.X_OK))
+        self.assertEqual(
+            staging.DIRECTORY_MODE, os.stat(self.target).st_mode & 0o777)
+
+    def test_extract_invalid(self):
+        os.mkdir(self.target)
+        self.write(self.path('target', 'old'), b'old')
+        self.write(self.path('archive.tar.gz'), b'invalid')
+        with self.assertRaises(tarfile.TarError):
+            staging.extract(self.path('archive.tar.gz'), self.target)
+        self.assertEqual(['archive.tar.gz', 'target/old'], self.listing())
+
+    def test_install(self):
+        self.write(self.path('source'), b'new')
+        target = self.path('lib', 'file')
+        staging.install(self.path('source'), target)
+        staging.install(self.path('source'), target, 0o600)
+        self.assertEqual(['lib/file', 'source'], self.listing())
+        self.assertEqual(0o600, os.stat(target).st_mode & 0o777)
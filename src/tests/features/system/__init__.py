@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from dotfiles.features import system
+
+
+def name(s: str) -> str:
+    """Generates the name of a file in this directory.
+
+    :param s: The file name, relative to this directory.
+
+    :return: a file name that may not necessarily exist
+    """
+    return os.path.join(os.path.dirname(__file__), s)
+
+
+class DpkgTest(unittest.TestCase):
+    def test_installed(self):
+        self.assertEqual(
+            {'curl', 'vim'},
+            system.dpkg(name('dpkg-status')))
+
+    def test_nonexisting(self):
+        with self.assertRaises(OSError):
+            system.dpkg(name('__invalid__'))
+
+
+class ExecutableTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create(self, name: str, mode: int = 0o755) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(path, mode)
+        return path
+
+    def test_found(self):
+        path = self.create('tool')
+        self.assertEqual(
+            path,
+            system.executable('tool', [self.directory.name]))
+
+    def test_not_executable(self):
+        self.create('tool', 0o644)
+        self.assertIsNone(system.executable('tool', [self.directory.name]))
+
+    def test_added(self):
+        self.assertIsNone(system.executable('tool', [self.directory.name]))
+        path = self.create('tool')
+        self.assertIsNone(system.executable('tool', [self.directory.name]))
+        system.invalidate()
+        self.assertEqual(
+            path,
+            system.executable('tool', [self.directory.name]))
+
+    def test_removed(self):
+        path = self.create('tool')
+        self.assertEqual(
+            path,
+            system.executable('tool', [self.directory.name]))
+        os.unlink(path)
+        self.assertIsNone(system.executable('tool', [self.directory.name]))
+
+    def test_validated_once(self):
+        system.executable('tool', [self.directory.name])
+        with unittest.mock.patch.object(
+                system.os, 'stat', side_effect=AssertionError):
+            self.assertIsNone(
+                system.executable('tool', [self.directory.name]))
+
+    def test_order(self):
+        path = self.create('tool')
+        self.assertEqual(
+            path,
+            system.executable('tool', [
+                os.path.join(self.directory.name, '__invalid__'),
+                self.directory.name]))
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from dotfiles.features import systemd_user_units
+
+
+class Env:
+    def __init__(self, source: str):
+        self.source = source
+        self.commands = []
+
+    def run(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+        return args[-1] == 'enabled.service'
+
+
+class CheckerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.env = Env(self.directory.name)
+        units = systemd_user_units.source(self.env)
+        os.makedirs(os.path.join(units, 'default.target.wants'))
+        for unit in ('enabled.service', 'disabled.service'):
+            with open(os.path.join(units, unit), 'w'):
+                pass
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_units(self):
+        self.assertEqual(
+            ['disabled.service', 'enabled.service'],
+            sorted(systemd_user_units.units(self.env)))
+
+    def test_enabled(self):
+        self.assertTrue(
+            systemd_user_units.enabled(self.env, 'enabled.service'))
+        self.assertFalse(
+            systemd_user_units.enabled(self.env, 'disabled.service'))
+
+    def test_not_interactive(self):
+        # Checkers run concurrently, and must not hold the terminal
+        systemd_user_units.enabled(self.env, 'enabled.service')
+        self.assertEqual(
+            [False],
+            [kwargs['interactive'] for (_, kwargs) in self.env.commands])
@@ -0,0 +1,139 @@
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+
+from dotfiles.features import transfer
+
+
+#: The content served.
+DATA = bytes(range(256)) * 64
+
+#: The entity tag of the content served.
+ETAG = '"data"'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers.items())))
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/data')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start = 0
+        if self.headers.get('Range') \
+                and self.headers.get('If-Range') == ETAG:
+            start = int(self.headers['Range'][len('bytes='):-1])
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(DATA) - 1, len(DATA)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(DATA) - start))
+        self.end_headers()
+        if self.server.interrupt:
+            self.server.interrupt = False
+            self.wfile.write(DATA[start:start + len(DATA) // 4])
+            self.close_connection = True
+        else:
+            self.wfile.write(DATA[start:])
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.target = os.path.join(self.directory.name, 'target')
+        self.server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), Handler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.interrupt = False
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,)).start()
+        self.pool = transfer.Pool(5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def url(self, path: str) -> str:
+        return 'http://127.0.0.1:{}{}'.format(
+            self.server.server_address[1], path)
+
+    def assertFetched(self, result):
+        (status, headers, digest) = result
+        self.assertIn(status, (200, 206))
+        self.assertEqual(ETAG, headers['etag'])
+        self.assertEqual(hashlib.sha256(DATA).hexdigest(), digest)
+        with open(self.target, 'rb') as f:
+            self.assertEqual(DATA, f.read())
+        self.assertFalse(os.path.exists(
+            self.target + transfer.VALIDATOR_SUFFIX))
+
+    def test_fetch(self):
+        self.assertFetched(self.pool.fetch(self.url('/data'), self.target, {}))
+
+    def test_keep_alive(self):
+        for _ in range(3):
+            self.assertFetched(
+                self.pool.fetch(self.url('/data'), self.target, {}))
+        self.assertEqual(1, self.server.connections)
+
+    def test_redirect(self):
+        self.assertFetched(
+            self.pool.fetch(self.url('/redirect'), self.target, {}))
+        self.assertEqual(
+            ['/redirect', '/data'],
+            [path for (path, _) in self.server.requests])
+
+    def test_resume(self):
+        self.server.interrupt = True
+        self.assertFetched(self.pool.fetch(self.url('/data'), self.target, {}))
+        self.assertEqual(
+            'bytes={}-'.format(len(DATA) // 4),
+            self.server.requests[-1][1]['Range'])
+
+    def test_changed(self):
+        with open(self.target, 'wb') as f:
+            f.write(b'old content')
+        with open(self.target + transfer.VALIDATOR_SUFFIX, 'w') as f:
+            f.write('{"validator": "\\"old\\""}')
+        self.assertFetched(self.pool.fetch(self.url('/data'), self.target, {}))
+
+    def test_progress(self):
+        reports = []
+        self.pool.fetch(
+            self.url('/data'), self.target, {},
+            lambda received, total: reports.append((received, total)))
+        self.assertEqual((0, len(DATA)), reports[0])
+        self.assertEqual((len(DATA), len(DATA)), reports[-1])
+
+    def test_not_modified(self):
+        class NotModified(Handler):
+            def do_GET(self):
+                self.send_response(304)
+                self.end_headers()
+
+        self.server.RequestHandlerClass = NotModified
+        (status, _, digest) = self.pool.fetch(
+            self.url('/data'), self.target, {'If-None-Match': ETAG})
+        self.assertEqual(304, status)
+        self.assertIsNone(digest)
+        self.assertFalse(os.path.exists(self.target))
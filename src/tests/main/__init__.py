@@ -0,0 +1,298 @@
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+import dotfiles.__main__ as dotfiles
+
+from dotfiles import patterns
+from dotfiles.manifest import Manifest
+from dotfiles.registry import Registry
+
+
+class MainTest(unittest.TestCase):
+    """A test case with a repository and a home directory in a temporary
+    directory.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.directory.name)
+        self.source = os.path.join(self.root, 'repository', 'home')
+        self.target = os.path.join(self.root, 'home')
+        os.makedirs(self.source)
+        os.makedirs(self.target)
+        os.makedirs(os.path.join(self.root, 'repository', '.git'))
+        stack = contextlib.ExitStack()
+        for (name, value) in {
+                'ROOT': os.path.join(self.root, 'repository'),
+                'ROOT_PATTERN': os.path.join(
+                    self.root, 'repository') + '/**',
+                'SOURCE': self.source,
+                'TARGET': self.target + '/',
+                'MANIFEST_FILE': self.state('manifest'),
+                'REGISTRY_FILE': self.state('registry'),
+                '_DECLINED': []}.items():
+            stack.enter_context(unittest.mock.patch.object(
+                dotfiles, name, value))
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        self.addCleanup(stack.close)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def state(self, name: str) -> str:
+        return os.path.join(
+            self.root, 'repository', '.git', 'dotfiles-' + name)
+
+    def write(self, filename: str, data: str = ''):
+        path = os.path.join(self.source, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(data)
+
+
+class CopyFilesTest(MainTest):
+    def test_copy(self):
+        self.write('a', 'a')
+        self.write('b/c', 'c')
+        self.assertEqual(
+            ['a', 'b/c'],
+            dotfiles.copy_files(
+                dotfiles.CopyMethod.COPY, patterns.Matcher(), 2))
+        with open(os.path.join(self.target, 'b', 'c')) as f:
+            self.assertEqual('c', f.read())
+        self.assertEqual(
+            [],
+            dotfiles.copy_files(
+                dotfiles.CopyMethod.COPY, patterns.Matcher(), 2))
+
+    def test_declined(self):
+        self.write('a', 'a')
+        self.write('b', 'b')
+        with open(os.path.join(self.target, 'a'), 'w') as f:
+            f.write('conflict')
+        with unittest.mock.patch('dotfiles.query', lambda *args: None):
+            self.assertEqual(
+                ['a', 'b'],
+                dotfiles.copy_files(
+                    dotfiles.CopyMethod.LINK, patterns.Matcher(), 2))
+        self.assertFalse(os.path.islink(os.path.join(self.target, 'a')))
+        self.assertTrue(os.path.islink(os.path.join(self.target, 'b')))
+        self.assertEqual(['a'], dotfiles._DECLINED)
+
+    def test_complete(self):
+        self.write('a')
+        dotfiles.copy_files(dotfiles.CopyMethod.LINK, patterns.Matcher(), 2)
+        dotfiles._complete()
+
+    def test_conflicts_on_calling_thread(self):
+        for filename in ('a', 'b', 'c', 'd'):
+            self.write(filename)
+        for filename in ('b', 'd'):
+            with open(os.path.join(self.target, filename), 'w') as f:
+                f.write('conflict')
+        copied = []
+
+        class Method:
+            def copy(self, source, target, filename, manifest, registry):
+                copied.append((filename, threading.current_thread()))
+                return True
+
+        dotfiles._copy(
+            Method(), ['a', 'b', 'c', 'd'], 4,
+            Manifest(self.state('manifest')),
+            Registry(self.state('registry')))
+        main = threading.current_thread()
+        self.assertEqual(
+            ['b', 'd'],
+            [filename for (filename, thread) in copied if thread is main])
+        self.assertEqual(
+            ['a', 'c'],
+            sorted(
+                filename
+                for (filename, thread) in copied
+                if thread is not main))
+
+
+class CleanTest(MainTest):
+    def setUp(self):
+        super().setUp()
+        self.write('a')
+        self.write('b')
+        dotfiles.copy_files(dotfiles.CopyMethod.LINK, patterns.Matcher(), 2)
+        self.response = 'yes'
+        stack = contextlib.ExitStack()
+        stack.enter_context(unittest.mock.patch.object(
+            dotfiles, 'query', lambda *args: self.response))
+        self.addCleanup(stack.close)
+
+        # The first run scans the target directory
+        dotfiles.clean(patterns.Matcher())
+
+    def test_registered(self):
+        self.assertEqual(
+            [os.path.join(self.target, 'a'), os.path.join(self.target, 'b')],
+            [target for (target, _) in Registry(
+                self.state('registry')).items()])
+
+    def test_removed(self):
+        os.unlink(os.path.join(self.source, 'a'))
+        self.assertEqual(
+            [(os.path.join(self.target, 'a'), 'a has been removed')],
+            dotfiles.clean(patterns.Matcher()))
+        self.assertFalse(os.path.lexists(os.path.join(self.target, 'a')))
+        self.assertTrue(os.path.lexists(os.path.join(self.target, 'b')))
+
+    def test_ignored(self):
+        self.assertEqual(
+            [(os.path.join(self.target, 'b'), 'b is ignored')],
+            dotfiles.clean(patterns.Matcher(['b']), dry_run=True))
+        self.assertTrue(os.path.lexists(os.path.join(self.target, 'b')))
+
+    def test_declined(self):
+        # A stale file is reported again until it is removed
+        link = os.path.join(self.target, 'a')
+        os.unlink(os.path.join(self.source, 'a'))
+        for response in ('no', None):
+            self.response = response
+            self.assertEqual(
+                [(link, 'a has been removed')],
+                dotfiles.clean(patterns.Matcher()))
+            self.assertTrue(os.path.lexists(link))
+        self.assertEqual([link, link], dotfiles._DECLINED)
+        with self.assertRaises(SystemExit):
+            dotfiles._complete()
+
+    def test_not_owned(self):
+        link = os.path.join(self.target, 'a')
+        os.unlink(link)
+        with open(link, 'w') as f:
+            f.write('replaced')
+        os.unlink(os.path.join(self.source, 'a'))
+        self.assertEqual([], dotfiles.clean(patterns.Matcher()))
+        self.assertTrue(os.path.isfile(link))
+        self.assertEqual(
+            [os.path.join(self.target, 'b')],
+            [target for (target, _) in Registry(
+                self.state('registry')).items()])
+
+    def test_scan(self):
+        # Links installed before the registry existed are found by scanning
+        os.unlink(self.state('registry'))
+        os.symlink(
+            os.path.join(self.source, 'c'), os.path.join(self.target, 'c'))
+        self.assertEqual(
+            [(os.path.join(self.target, 'c'), 'c has been removed')],
+            dotfiles.clean(patterns.Matcher()))
+        self.assertFalse(os.path.lexists(os.path.join(self.target, 'c')))
+        self.assertTrue(Registry(self.state('registry')).scanned)
+
+
+class ApplyTest(MainTest):
+    def setUp(self):
+        super().setUp()
+        self.plan = self.state('plan')
+
+    def plan_files(self, *filenames: str):
+        plan = dotfiles.Plan(
+            dotfiles.changes.head(dotfiles.ROOT),
+            dotfiles.CopyMethod.COPY.value,
+            files=filenames)
+        for filename in filenames:
+            plan.fingerprint(os.path.join(self.target, filename))
+        plan.save(self.plan)
+
+    def test_apply(self):
+        self.write('b', 'b')
+        self.plan_files('b')
+        dotfiles.apply(self.plan, None)
+        with open(os.path.join(self.target, 'b')) as f:
+            self.assertEqual('b', f.read())
+
+    def test_modified(self):
+        self.write('b', 'b')
+        self.plan_files('b')
+        with open(os.path.join(self.target, 'b'), 'w') as f:
+            f.write('created')
+        with self.assertRaises(SystemExit):
+            dotfiles.apply(self.plan, None)
+        with open(os.path.join(self.target, 'b')) as f:
+            self.assertEqual('created', f.read())
+
+    def test_invalid(self):
+        with open(self.plan, 'w') as f:
+            f.write('[]')
+        with self.assertRaises(SystemExit):
+            dotfiles.apply(self.plan, None)
+
+
+class CollectTreesTest(MainTest):
+    def setUp(self):
+        super().setUp()
+        self.write('.config/tmux/base')
+        self.write('.config/tmux/mouse')
+        self.ignores = patterns.Matcher(['.config/tmux/mouse'])
+        self.trees = patterns.Matcher(['.config/tmux'])
+        self.sources = dotfiles._collect_files(self.source, self.ignores)
+
+    def test_ignored(self):
+        self.assertEqual(
+            (['.config/tmux/base', '.config/tmux/mouse'], []),
+            dotfiles._collect_trees(self.sources, self.ignores, self.trees))
+
+    def test_ignored_changed(self):
+        self.assertEqual(
+            (['.config/tmux/base'], []),
+            dotfiles._collect_trees(
+                self.sources, self.ignores, self.trees,
+                ['.config/tmux/base']))
+
+    def test_linkable(self):
+        ignores = patterns.Matcher()
+        self.assertEqual(
+            (['.config/tmux'], []),
+            dotfiles._collect_trees(
+                self.sources, ignores, self.trees, ['.config/tmux/base']))
+
+    def test_incremental(self):
+        dotfiles.copy_files(
+            dotfiles.CopyMethod.TREE, self.ignores, None, None, self.trees)
+        dotfiles.copy_files(
+            dotfiles.CopyMethod.TREE, self.ignores, None,
+            {'.config/tmux/base'}, self.trees)
+        tmux = os.path.join(self.target, '.config', 'tmux')
+        self.assertFalse(os.path.islink(tmux))
+        self.assertEqual(['base'], os.listdir(tmux))
+
+    def test_plan(self):
+        ignores = patterns.Matcher()
+        self.assertEqual(
+            ['.config/tmux'],
+            dotfiles.copy_files(
+                dotfiles.CopyMethod.TREE, ignores, None, None, self.trees,
+                dry_run=True))
+        self.assertEqual([], os.listdir(self.target))
+
+    def test_unlinked(self):
+        dotfiles.copy_files(
+            dotfiles.CopyMethod.TREE, patterns.Matcher(), None, None,
+            self.trees)
+        tmux = os.path.join(self.target, '.config', 'tmux')
+        self.assertTrue(os.path.islink(tmux))
+
+        # Planning must not modify anything, but list all files
+        self.assertEqual(
+            ['.config/tmux/base'],
+            dotfiles.copy_files(
+                dotfiles.CopyMethod.TREE, self.ignores, None,
+                {'.config/tmux/base'}, self.trees, dry_run=True))
+        self.assertTrue(os.path.islink(tmux))
+
+        dotfiles.copy_files(
+            dotfiles.CopyMethod.TREE, self.ignores, None,
+            {'.config/tmux/base'}, self.trees)
+        self.assertFalse(os.path.islink(tmux))
+        self.assertEqual(['base'], os.listdir(tmux))
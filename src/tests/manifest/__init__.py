@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from dotfiles.manifest import Manifest, digest
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'manifest')
+        self.source = self.write('source', 'content')
+        self.target = self.write('target', 'content')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name: str, data: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        st = os.stat(path) if os.path.exists(path) else None
+        with open(path, 'w') as f:
+            f.write(data)
+        if st is not None:
+            # Make sure the modification is detected regardless of the time
+            # stamp resolution of the file system
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        return path
+
+    def test_round_trip(self):
+        manifest = Manifest(self.filename)
+        manifest.record(self.source, self.target, digest(self.source))
+        manifest.save()
+        self.assertTrue(os.path.isfile(self.filename))
+        self.assertTrue(
+            Manifest(self.filename).unchanged(self.source, self.target))
+
+    def test_missing(self):
+        manifest = Manifest(self.filename)
+        self.assertFalse(manifest.unchanged(self.source, self.target))
+        manifest.save()
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_other_source(self):
+        manifest = Manifest(self.filename)
+        manifest.record(self.source, self.target, digest(self.source))
+        other = self.write('other', 'content')
+        self.assertFalse(manifest.unchanged(other, self.target))
+
+    def test_forget(self):
+        manifest = Manifest(self.filename)
+        manifest.record(self.source, self.target)
+        manifest.forget(self.target)
+        self.assertFalse(manifest.unchanged(self.source, self.target))
+
+    def test_target_touched(self):
+        manifest = Manifest(self.filename)
+        manifest.record(self.source, self.target, digest(self.source))
+        self.write('target', 'content')
+        self.assertFalse(manifest.unchanged(self.source, self.target))
+
+    def test_source_touched(self):
+        manifest = Manifest(self.filename)
+        manifest.record(self.source, self.target, digest(self.source))
+        self.write('source', 'content')
+        self.assertTrue(manifest.unchanged(self.source, self.target))
+
+    def test_source_touched_without_hash(self):
+        manifest = Manifest(self.filename)
+        manifest.record(self.source, self.target)
+        self.write('source', 'content')
+        self.assertFalse(manifest.unchanged(self.source, self.target))
+
+    def test_source_modified(self):
+        manifest = Manifest(self.filename)
+        manifest.record(self.source, self.target, digest(self.source))
+        self.write('source', 'altered')
+        self.assertFalse(manifest.unchanged(self.source, self.target))
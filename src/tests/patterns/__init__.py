@@ -0,0 +1,70 @@
+import unittest
+
+from dotfiles import patterns
+
+
+class GitignoreTest(unittest.TestCase):
+    def assertMatches(self, rule: str, *paths: str):
+        matcher = patterns.Matcher(rules=[rule])
+        for path in paths:
+            self.assertTrue(matcher.match(path), path)
+
+    def assertNotMatches(self, rule: str, *paths: str):
+        matcher = patterns.Matcher(rules=[rule])
+        for path in paths:
+            self.assertFalse(matcher.match(path), path)
+
+    def test_unanchored(self):
+        self.assertMatches('.git', '.git', 'a/.git', 'a/b/.git')
+        self.assertNotMatches('.git', '.gitx', 'a/.git/b')
+
+    def test_anchored(self):
+        self.assertMatches('/.cargo', '.cargo')
+        self.assertNotMatches('/.cargo', 'a/.cargo')
+        self.assertMatches('.cache/pip', '.cache/pip')
+        self.assertNotMatches('.cache/pip', 'a/.cache/pip')
+
+    def test_directory(self):
+        self.assertMatches('node_modules/', 'node_modules', 'a/node_modules')
+
+    def test_wildcards(self):
+        self.assertMatches('*.tmp', 'a.tmp', 'a/b.tmp')
+        self.assertNotMatches('/a/*', 'a/b/c')
+        self.assertMatches('/a/**', 'a/b', 'a/b/c')
+        self.assertMatches('a/**/b', 'a/b', 'a/x/b', 'a/x/y/b')
+        self.assertMatches('file[0-9]', 'file1')
+        self.assertNotMatches('file[!0-9]', 'file1')
+
+    def test_negated(self):
+        with self.assertRaises(ValueError):
+            patterns.gitignore('!a')
+
+
+class MatcherTest(unittest.TestCase):
+    def test_empty(self):
+        self.assertFalse(patterns.Matcher())
+        self.assertFalse(patterns.Matcher().match('a'))
+
+    def test_globs(self):
+        matcher = patterns.Matcher(['.termux/*', 'a/**'])
+        self.assertTrue(matcher.match('.termux/a/b'))
+        self.assertTrue(matcher.match('a/b'))
+        self.assertFalse(matcher.match('b'))
+
+    def test_literals(self):
+        matcher = patterns.Matcher(['a/b'])
+        self.assertTrue(matcher.match('a/b'))
+        self.assertFalse(matcher.match('a/bc'))
+        self.assertFalse(matcher.match('a/b/c'))
+
+    def test_subtrees(self):
+        matcher = patterns.Matcher(['.local/lib/x/**', '.termux/*', 'c/*.x'])
+        self.assertTrue(matcher.match('.local/lib/x/a/b'))
+        self.assertTrue(matcher.match('.termux/a'))
+        self.assertFalse(matcher.match('.local/lib/x'))
+        self.assertTrue(matcher.prunes('.local/lib/x'))
+        self.assertTrue(matcher.prunes('.local/lib/x/y/'))
+        self.assertTrue(matcher.prunes('.termux'))
+        self.assertFalse(matcher.prunes('.local/lib'))
+        self.assertFalse(matcher.prunes('c'))
+        self.assertTrue(matcher.match('c/a.x'))
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from dotfiles.plan import Plan
+
+
+class PlanTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'plan')
+        self.file = os.path.join(self.directory.name, 'file')
+        with open(self.file, 'w') as f:
+            f.write('content')
+        self.plan = Plan(
+            'commit', 'copy',
+            files=['file'],
+            features=['feature'],
+            stale=[('/link', 'link is ignored')])
+        self.plan.fingerprint(self.file)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        self.plan.save(self.filename)
+        plan = Plan.load(self.filename)
+        self.assertEqual('commit', plan.commit)
+        self.assertEqual('copy', plan.copy_method)
+        self.assertEqual(['file'], plan.files)
+        self.assertEqual(['feature'], plan.features)
+        self.assertEqual([('/link', 'link is ignored')], plan.stale)
+        self.assertIsNone(plan.invalid('commit'))
+
+    def test_load_invalid(self):
+        with self.assertRaises(ValueError):
+            Plan.load(self.filename)
+
+    def test_commit(self):
+        self.assertIn('commit', self.plan.invalid('other'))
+
+    def test_modified(self):
+        st = os.stat(self.file)
+        with open(self.file, 'w') as f:
+            f.write('modified')
+        os.utime(self.file, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertEqual(
+            '{} has been modified'.format(self.file),
+            self.plan.invalid('commit'))
+
+    def test_created(self):
+        missing = os.path.join(self.directory.name, 'missing')
+        self.plan.fingerprint(missing)
+        self.assertIsNone(self.plan.invalid('commit'))
+        with open(missing, 'w'):
+            pass
+        self.assertEqual(
+            '{} has been modified'.format(missing),
+            self.plan.invalid('commit'))
+
+    def test_replaced_by_link(self):
+        os.unlink(self.file)
+        os.symlink(os.path.join(self.directory.name, 'plan'), self.file)
+        self.assertIsNotNone(self.plan.invalid('commit'))